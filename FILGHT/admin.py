@@ -9,8 +9,16 @@ class AirportAdmin(admin.ModelAdmin):
 
 @admin.register(Flight)
 class FlightAdmin(admin.ModelAdmin):
-    list_display = ('flight_number', 'origin', 'destination', 'departure_time', 'arrival_time', 'aircraft_type', 'airline', 'total_cost')
+    list_display = ('flight_number', 'origin', 'destination', 'departure_time', 'arrival_time', 'aircraft_type', 'airline', 'total_cost', 'operational_constraints')
     search_fields = ('flight_number', 'origin__code', 'destination__code', 'airline')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_airports().with_scores()
+
+    @admin.display(description='Constraints', ordering='operational_constraint_score')
+    def operational_constraints(self, flight):
+        return flight.get_operational_constraint_score()
+
 @admin.register(Route)
 class RouteAdmin(admin.ModelAdmin):
     list_display = ('name', 'origin', 'destination', 'total_distance', 'total_cost', 'complexity_score')
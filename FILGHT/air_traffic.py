@@ -0,0 +1,261 @@
+"""
+Shared snapshot of OpenSky state vectors.
+
+The ingest_air_traffic command polls OpenSky on an interval, parses the
+state vectors into a NumPy structured array as the response streams in, and
+publishes it atomically (write to a temporary file, then rename) at
+AIR_TRAFFIC_SNAPSHOT_PATH. Web workers load the newest snapshot when the file
+changes and answer lookups by ICAO24 and by spatial grid cell from in-memory
+indexes, without contacting OpenSky.
+"""
+import io
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import requests
+from django.conf import settings
+
+from . import upstream
+from .json_stream import iter_json_array
+
+STATES_PATH = "/api/states/all"
+GRID_DEGREES = 1.0
+GRID_COLUMNS = int(360 / GRID_DEGREES)
+PARSE_BATCH = 4096
+RELOAD_CHECK_SECONDS = 1.0
+MAX_SNAPSHOT_AGE = 300  # seconds after which a snapshot no longer counts as live
+
+STATE_DTYPE = np.dtype([
+    ('icao24', 'S6'),
+    ('callsign', 'S8'),
+    ('time_position', 'i8'),
+    ('last_contact', 'i8'),
+    ('longitude', 'f8'),
+    ('latitude', 'f8'),
+    ('baro_altitude', 'f4'),  # metres
+    ('on_ground', '?'),
+    ('velocity', 'f4'),  # m/s
+    ('true_track', 'f4'),
+    ('vertical_rate', 'f4'),  # m/s
+    ('geo_altitude', 'f4'),
+    ('squawk', 'S4'),
+])
+# Position of each STATE_DTYPE field in an OpenSky state vector
+STATE_INDEXES = (0, 1, 3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 14)
+STATE_DEFAULTS = (b'', b'', 0, 0, np.nan, np.nan, np.nan, False, np.nan, np.nan, np.nan, np.nan, b'')
+
+
+def snapshot_path():
+    return str(settings.AIR_TRAFFIC_SNAPSHOT_PATH)
+
+
+def grid_cells(latitudes, longitudes):
+    """Grid cell number of each position; -1 where the position is unknown"""
+    rows = np.floor((np.clip(latitudes, -90, 89.999) + 90) / GRID_DEGREES)
+    columns = np.floor((np.clip(longitudes, -180, 179.999) + 180) / GRID_DEGREES)
+    cells = rows * GRID_COLUMNS + columns
+    return np.where(np.isnan(cells), -1, cells).astype(np.int64)
+
+
+def _state_row(state):
+    values = []
+    for index, default in zip(STATE_INDEXES, STATE_DEFAULTS):
+        value = state[index] if index < len(state) else None
+        if value is None:
+            value = default
+        elif isinstance(value, str):
+            value = value.strip().encode('ascii', 'replace')
+        values.append(value)
+    return tuple(values)
+
+
+def parse_states(states):
+    """Turn an iterable of OpenSky state vectors into a STATE_DTYPE array, batch by batch"""
+    chunks = []
+    batch = []
+    for state in states:
+        batch.append(_state_row(state))
+        if len(batch) >= PARSE_BATCH:
+            chunks.append(np.array(batch, dtype=STATE_DTYPE))
+            batch = []
+    if batch:
+        chunks.append(np.array(batch, dtype=STATE_DTYPE))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=STATE_DTYPE)
+
+
+class _PrefixedReader:
+    """Text reader that replays already-consumed text before the rest of a stream"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if self._prefix:
+            text, self._prefix = self._prefix, ''
+            return text
+        return self._stream.read(size)
+
+
+STATES_KEY = re.compile(r'"states"\s*:\s*')
+TIME_KEY = re.compile(r'"time"\s*:\s*(\d+)')
+
+
+def read_states_response(stream, chunk_size=64 * 1024):
+    """Parse an OpenSky /states/all body from a text stream into (time, states array)"""
+    head = ''
+    while True:
+        match = STATES_KEY.search(head)
+        if match:
+            break
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise ValueError("OpenSky response has no states")
+        head += chunk
+    time_match = TIME_KEY.search(head, 0, match.start())
+    snapshot_time = int(time_match.group(1)) if time_match else int(time.time())
+    rest = head[match.end():]
+    if rest.lstrip().startswith('null'):
+        return snapshot_time, np.empty(0, dtype=STATE_DTYPE)
+    return snapshot_time, parse_states(iter_json_array(_PrefixedReader(rest, stream), chunk_size))
+
+
+class RateLimited(Exception):
+    """OpenSky refused the request; retry after ``seconds``"""
+
+    def __init__(self, seconds):
+        super().__init__(f"OpenSky rate limit, retry after {seconds}s")
+        self.seconds = seconds
+
+
+def fetch_states(bbox=None, auth=None):
+    """Download the current state vectors; bbox is (lamin, lomin, lamax, lomax)"""
+    params = dict(zip(('lamin', 'lomin', 'lamax', 'lomax'), bbox)) if bbox else None
+    response = upstream.get('opensky', upstream.url('opensky', STATES_PATH), params=params, auth=auth,
+                            timeout=(3.05, 30), retries=0, stream=True)
+    try:
+        retry_after = response.headers.get('X-Rate-Limit-Retry-After-Seconds')
+        if response.status_code == 429 and retry_after:
+            raise RateLimited(int(retry_after))
+        if response.status_code != 200:
+            raise requests.HTTPError(f"OpenSky API Error {response.status_code}", response=response)
+        response.raw.decode_content = True
+        stream = io.TextIOWrapper(response.raw, encoding=response.encoding or 'utf-8')
+        return read_states_response(stream)
+    finally:
+        response.close()
+
+
+def publish_snapshot(states, snapshot_time, path=None):
+    """Write a snapshot sorted by grid cell and swap it in atomically"""
+    path = path or snapshot_path()
+    order = np.argsort(grid_cells(states['latitude'], states['longitude']), kind='stable')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, states=states[order], time=np.array([snapshot_time, time.time()]))
+    os.replace(tmp_path, path)
+
+
+class TrafficSnapshot:
+    """One published set of state vectors with ICAO24 and grid indexes"""
+
+    def __init__(self, states, snapshot_time, published_at):
+        self.states = states
+        self.time = snapshot_time
+        self.published_at = published_at
+        self.cells = grid_cells(states['latitude'], states['longitude'])
+        # Rows are sorted by cell, so every cell is one contiguous slice
+        unique, starts = np.unique(self.cells, return_index=True)
+        ends = np.append(starts[1:], len(self.cells))
+        self.cell_slices = {int(cell): (int(start), int(end)) for cell, start, end in zip(unique, starts, ends)}
+        self.icao24_index = {icao24: row for row, icao24 in enumerate(states['icao24'].tolist())}
+
+    def __len__(self):
+        return len(self.states)
+
+    @property
+    def age(self):
+        return time.time() - self.published_at
+
+    def find(self, icao24):
+        """State vector row for an ICAO24 address, or None"""
+        row = self.icao24_index.get(icao24.lower().encode('ascii', 'replace'))
+        return None if row is None else self.states[row]
+
+    def _blocks(self, lamin, lomin, lamax, lomax):
+        """Rows inside a box that does not cross the antimeridian, one grid cell at a time"""
+        first = grid_cells(np.array([lamin, lamin]), np.array([lomin, lomax]))
+        last = grid_cells(np.array([lamax]), np.array([lomax]))[0]
+        for row_start in range(int(first[0]), int(last) + 1, GRID_COLUMNS):
+            for cell in range(row_start, row_start + int(first[1] - first[0]) + 1):
+                bounds = self.cell_slices.get(cell)
+                if bounds is None:
+                    continue
+                block = self.states[bounds[0]:bounds[1]]
+                yield block[(block['latitude'] >= lamin) & (block['latitude'] <= lamax)
+                            & (block['longitude'] >= lomin) & (block['longitude'] <= lomax)]
+
+    def in_box(self, lamin, lomin, lamax, lomax, limit=None):
+        """State vectors inside a latitude/longitude box, read cell by cell
+
+        A box whose western edge lies east of its eastern one crosses the
+        antimeridian and is read as two boxes, one on either side of it.
+        """
+        boxes = [(lomin, lomax)] if lomin <= lomax else [(lomin, 180.0), (-180.0, lomax)]
+        rows = []
+        count = 0
+        for west, east in boxes:
+            for block in self._blocks(lamin, west, lamax, east):
+                rows.append(block)
+                count += len(block)
+                if limit is not None and count >= limit:
+                    return np.concatenate(rows)[:limit]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=STATE_DTYPE)
+
+    def positioned(self):
+        """State vectors with a finite latitude and longitude"""
+        states = self.states
+        return states[np.isfinite(states['latitude']) & np.isfinite(states['longitude'])]
+
+
+_snapshot = None
+_snapshot_mtime = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def get_traffic_snapshot():
+    """Newest published snapshot, or None if the ingester has not published one"""
+    global _snapshot, _snapshot_mtime, _checked_at
+    if time.monotonic() - _checked_at < RELOAD_CHECK_SECONDS:
+        return _snapshot
+    with _snapshot_lock:
+        if time.monotonic() - _checked_at < RELOAD_CHECK_SECONDS:
+            return _snapshot
+        try:
+            mtime = os.stat(snapshot_path()).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is None:
+            _snapshot = None
+        elif mtime != _snapshot_mtime:
+            try:
+                with np.load(snapshot_path()) as data:
+                    snapshot_time, published_at = data['time']
+                    _snapshot = TrafficSnapshot(data['states'], int(snapshot_time), float(published_at))
+            except (OSError, ValueError, KeyError):
+                pass  # Keep serving the previous snapshot
+        _snapshot_mtime = mtime
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def get_live_snapshot():
+    """The snapshot if it is recent enough to report as live traffic"""
+    snapshot = get_traffic_snapshot()
+    if snapshot is None or snapshot.age > MAX_SNAPSHOT_AGE or len(snapshot) == 0:
+        return None
+    return snapshot
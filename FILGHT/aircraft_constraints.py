@@ -0,0 +1,120 @@
+"""
+Operational constraints of every aircraft, held in memory.
+
+Constraints change rarely but are read by every report. The whole
+AircraftProfile table is read with its constraints in one LEFT JOIN query,
+each aircraft's constraints are sorted into their report categories once,
+and lookups are then dictionary reads, for one hex code or a whole fleet.
+Saving or deleting a profile or constraint drops the cache in this process;
+other processes pick changes up after CONSTRAINTS_TTL.
+"""
+import threading
+import time
+
+from django.db.models.signals import post_delete, post_save
+
+from .models import AircraftProfile, OperationalConstraint
+
+CONSTRAINTS_TTL = 300  # seconds before the table is re-read, picking up other processes' changes
+# (category, terms any of which in the constraint type puts it there), checked in order
+CATEGORIES = [
+    ("Weight Limitations", ["Weight"]),
+    ("Runway Requirements", ["Runway"]),
+    ("Performance Specifications", ["Speed", "Ceiling", "Range", "Fuel"]),
+    ("Maintenance Schedule", ["Maintenance"]),
+]
+OTHER_CATEGORY = "Other Constraints"
+
+
+def category_of(constraint_type):
+    for category, terms in CATEGORIES:
+        if any(term in constraint_type for term in terms):
+            return category
+    return OTHER_CATEGORY
+
+
+def constraints_report(aircraft_info, constraints):
+    """The operational_constraints report section of one aircraft; None without constraints"""
+    if not constraints:
+        return None
+    grouped = {category: [] for category, _ in CATEGORIES}
+    grouped[OTHER_CATEGORY] = []
+    for constraint in constraints:
+        grouped[category_of(constraint["type"])].append(constraint)
+    return {
+        "aircraft_info": aircraft_info,
+        "constraints": [
+            {"category": category, "items": items} for category, items in grouped.items() if items
+        ],
+    }
+
+
+def load_constraints():
+    """{HEX CODE: report section or None} of every aircraft profile, from one query"""
+    rows = AircraftProfile.objects.order_by('id', 'operationalconstraint__id').values_list(
+        'hex_code', 'type', 'operator', 'registration', 'country',
+        'operationalconstraint__id', 'operationalconstraint__constraint_type', 'operationalconstraint__value',
+        'operationalconstraint__unit', 'operationalconstraint__notes',
+    )
+    profiles = {}
+    for hex_code, aircraft_type, operator, registration, country, constraint_id, constraint_type, value, unit, notes in rows:
+        info, constraints = profiles.setdefault(hex_code, ({
+            "hex_code": hex_code,
+            "type": aircraft_type,
+            "operator": operator,
+            "registration": registration,
+            "country": country,
+        }, []))
+        if constraint_id is not None:
+            constraints.append({
+                "type": constraint_type,
+                "value": value,
+                "unit": unit,
+                "notes": notes,
+                "formatted_value": f"{value} {unit}",
+            })
+    # Lookups ignore case, like hex_code__iexact did
+    return {hex_code.upper(): constraints_report(info, constraints) for hex_code, (info, constraints) in profiles.items()}
+
+
+_constraints = None
+_constraints_loaded_at = 0.0
+_constraints_lock = threading.Lock()
+
+
+def get_constraints():
+    """Process-wide {HEX CODE: report section or None}, reloaded after CONSTRAINTS_TTL or a change"""
+    global _constraints, _constraints_loaded_at
+    constraints = _constraints
+    if constraints is None or time.monotonic() - _constraints_loaded_at > CONSTRAINTS_TTL:
+        with _constraints_lock:
+            if _constraints is None or time.monotonic() - _constraints_loaded_at > CONSTRAINTS_TTL:
+                _constraints, _constraints_loaded_at = load_constraints(), time.monotonic()
+            constraints = _constraints
+    return constraints
+
+
+def invalidate_constraints(**kwargs):
+    global _constraints
+    _constraints = None
+
+
+def constraints_for(hex_codes):
+    """{hex code: report section} for many aircraft; sections are shared, treat them as read-only"""
+    constraints = get_constraints()
+    found = {}
+    for hex_code in hex_codes:
+        key = (hex_code or "").upper()
+        if key not in constraints:
+            found[hex_code] = {"error": f"Aircraft profile not found for hex code {hex_code}"}
+        elif constraints[key] is None:
+            found[hex_code] = {"error": f"No operational constraints found for aircraft {hex_code}"}
+        else:
+            found[hex_code] = constraints[key]
+    return found
+
+
+post_save.connect(invalidate_constraints, sender=AircraftProfile, dispatch_uid='constraints_profile_save')
+post_delete.connect(invalidate_constraints, sender=AircraftProfile, dispatch_uid='constraints_profile_delete')
+post_save.connect(invalidate_constraints, sender=OperationalConstraint, dispatch_uid='constraints_save')
+post_delete.connect(invalidate_constraints, sender=OperationalConstraint, dispatch_uid='constraints_delete')
@@ -0,0 +1,196 @@
+"""
+Compact columnar airport feed.
+
+The feed is a little-endian binary blob that the map and optimize pages
+decode with static/js/airport_feed.js:
+
+    header   magic b'APF1', uint32 row count, uint16 country count, uint16 type count
+    lat      float32[count]
+    lon      float32[count]
+    id       uint32[count]
+    country  uint16[count]   index into the countries table
+    type     uint8[count]    index into the types table (padded to 4 bytes)
+    strings  codes, names, cities, countries, types - each a uint32 byte
+             length followed by NUL-joined UTF-8 text
+
+It is built once per dataset version and kept pre-compressed in memory.
+The dataset version is a counter in the shared cache, bumped after every
+committed change to the Airport table; each worker reads it at most once per
+FEED_VERSION_CHECK_SECONDS, so serving the feed costs no database query.
+Bulk writes that send no signals must call bump_airport_feed_version().
+"""
+import gzip
+import hashlib
+import struct
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+
+from .models import Airport
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FEED_MAGIC = b'APF1'
+FEED_CONTENT_TYPE = 'application/vnd.flight.airports'
+FEED_VERSION_KEY = 'airport_feed:version'  # shared counter, bumped after every change to the table
+FEED_VERSION_CHECK_SECONDS = 5  # how long a worker trusts its last read of the counter
+
+_feed = None
+_feed_lock = threading.Lock()
+_dataset_version = None
+_dataset_version_read_at = 0.0
+
+
+def _string_table(values):
+    """Encode a list of strings as a length-prefixed, NUL-joined UTF-8 blob"""
+    blob = '\0'.join(values).encode('utf-8')
+    return struct.pack('<I', len(blob)) + blob
+
+
+def _dictionary_encode(values):
+    """Return (sorted distinct values, index array) for a column of strings"""
+    table = sorted(set(values))
+    lookup = {value: i for i, value in enumerate(table)}
+    return table, [lookup[value] for value in values]
+
+
+def serialize_airports(rows):
+    """Serialize (id, code, name, city, country, type, lat, lon) rows into the feed format"""
+    columns = list(zip(*rows)) or [()] * 8
+    ids, codes, names, cities, countries, types, lats, lons = columns
+    countries = [c or '' for c in countries]
+    types = [t or '' for t in types]
+    country_table, country_idx = _dictionary_encode(countries)
+    type_table, type_idx = _dictionary_encode(types)
+    count = len(ids)
+
+    parts = [
+        FEED_MAGIC,
+        struct.pack('<IHH', count, len(country_table), len(type_table)),
+        np.asarray(lats, dtype='<f4').tobytes(),
+        np.asarray(lons, dtype='<f4').tobytes(),
+        np.asarray(ids, dtype='<u4').tobytes(),
+        np.asarray(country_idx, dtype='<u2').tobytes(),
+        np.asarray(type_idx, dtype='u1').tobytes(),
+    ]
+    # Keep the string section 4-byte aligned so the client can use typed array views
+    padding = (-(count * 2 + count)) % 4
+    parts.append(b'\0' * padding)
+    for table in (codes, names, [c or '' for c in cities], country_table, type_table):
+        parts.append(_string_table(table))
+    return b''.join(parts)
+
+
+def _new_version():
+    """Start value of the counter; differs from any version a feed was built for before the cache was cleared"""
+    return time.time_ns()
+
+
+def current_dataset_version():
+    """The shared dataset version, read from the cache at most once per FEED_VERSION_CHECK_SECONDS"""
+    global _dataset_version, _dataset_version_read_at
+    if _dataset_version is None or time.monotonic() - _dataset_version_read_at > FEED_VERSION_CHECK_SECONDS:
+        version = cache.get(FEED_VERSION_KEY)
+        if version is None:
+            cache.add(FEED_VERSION_KEY, _new_version(), timeout=None)
+            version = cache.get(FEED_VERSION_KEY)
+        _dataset_version, _dataset_version_read_at = version, time.monotonic()
+    return _dataset_version
+
+
+def _build_feed(dataset_version):
+    rows = list(
+        Airport.objects.order_by('id').values_list(
+            'id', 'code', 'name', 'city', 'country', 'type', 'latitude', 'longitude'
+        )
+    )
+    raw = serialize_airports(rows)
+    version = hashlib.sha256(raw).hexdigest()[:16]
+    bodies = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(raw, quality=11)
+    return {
+        'dataset_version': dataset_version,
+        'version': version,
+        'count': len(rows),
+        'bodies': bodies,
+    }
+
+
+def get_airport_feed():
+    """Return the pre-serialized feed for the current dataset version, building it if needed"""
+    global _feed
+    dataset_version = current_dataset_version()
+    feed = _feed
+    if feed is not None and feed['dataset_version'] == dataset_version:
+        return feed
+    with _feed_lock:
+        if _feed is None or _feed['dataset_version'] != dataset_version:
+            _feed = _build_feed(dataset_version)
+        return _feed
+
+
+def bump_airport_feed_version():
+    """Make every worker rebuild the feed: this one at once, the others within FEED_VERSION_CHECK_SECONDS"""
+    global _dataset_version
+    # incr is atomic, so concurrent bumps all count
+    if not cache.add(FEED_VERSION_KEY, _new_version(), timeout=None):
+        try:
+            cache.incr(FEED_VERSION_KEY)
+        except ValueError:
+            # Expired or evicted between the two calls
+            cache.add(FEED_VERSION_KEY, _new_version(), timeout=None)
+    _dataset_version = None
+
+
+def _airport_changed(sender, using=None, **kwargs):
+    # After the commit, so other workers never rebuild from the data before the change
+    transaction.on_commit(bump_airport_feed_version, using=using)
+
+
+def feed_url(feed):
+    """Versioned feed URL; a new dataset version gets a new URL, so browsers may cache it forever"""
+    return f"{reverse('api_airport_feed')}?v={feed['version']}"
+
+
+def feed_etag(feed, encoding):
+    """Strong ETag for one encoded representation of the feed"""
+    if encoding == 'identity':
+        return f'"{feed["version"]}"'
+    return f'"{feed["version"]}-{encoding}"'
+
+
+def choose_encoding(feed, accept_encoding):
+    """Pick the best pre-compressed body the client accepts"""
+    accepted = {
+        token.split(';')[0].strip().lower()
+        for token in (accept_encoding or '').split(',')
+        if token.strip() and not token.strip().endswith('q=0')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted and encoding in feed['bodies']:
+            return encoding
+    return 'identity'
+
+
+def etag_matches(feed, if_none_match):
+    """True if any tag in an If-None-Match header names the current feed version"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    current = {feed_etag(feed, encoding) for encoding in ('identity', 'gzip', 'br')}
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return bool(current & tags)
+
+
+post_save.connect(_airport_changed, sender=Airport, dispatch_uid='airport_feed_save')
+post_delete.connect(_airport_changed, sender=Airport, dispatch_uid='airport_feed_delete')
@@ -0,0 +1,304 @@
+"""
+Precompiled, memory-mapped airport dataset.
+
+convert_json.py compiles airports_cleaned.json into airports_cleaned.bin:
+
+    header      64 bytes: magic b'APSTORE1', uint32 format version, uint32 row
+                count, uint32 hash slots, uint32 reserved, then uint64 offsets
+                of the sections below
+    latitude    float64[count]
+    longitude   float64[count]
+    string idx  uint32[count * 5 + 1] - offsets into the blob for the code,
+                name, city, country and type of every row
+    string blob UTF-8 text
+    hash table  int32[slots] - row index for a code (FNV-1a, linear probing),
+                -1 for an empty slot
+
+Workers open the file with mmap read-only and wrap the sections in NumPy
+views, so every process shares the same page-cache copy and nothing is parsed
+at startup.
+"""
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+STORE_MAGIC = b'APSTORE1'
+STORE_VERSION = 1
+HEADER = struct.Struct('<8sIIII5Q')
+STRING_FIELDS = ('code', 'name', 'city', 'country', 'type')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AIRPORTS_JSON_PATH = os.path.join(BASE_DIR, 'airports_cleaned.json')
+AIRPORTS_STORE_PATH = os.path.join(BASE_DIR, 'airports_cleaned.bin')
+
+
+def code_hash(code):
+    """32-bit FNV-1a hash of an airport code"""
+    h = 0x811c9dc5
+    for byte in code.encode('utf-8'):
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h
+
+
+def _record_strings(airport):
+    location = airport.get('location') or {}
+    return (
+        airport.get('code') or '',
+        airport.get('name') or '',
+        location.get('city') or '',
+        location.get('country') or '',
+        airport.get('type') or '',
+    )
+
+
+class AirportStoreWriter:
+    """Builds a store one airport at a time
+
+    Only the numeric columns, string offsets and codes are kept in memory; the
+    string blob is spooled to a temporary file, so large inputs can be compiled
+    while they are being streamed.
+    """
+
+    def __init__(self):
+        self._latitudes = array('d')
+        self._longitudes = array('d')
+        self._offsets = array('L', [0])
+        self._codes = []
+        self._blob = tempfile.TemporaryFile()
+        self._blob_size = 0
+
+    def __len__(self):
+        return len(self._codes)
+
+    def add(self, airport):
+        """Append one cleaned airport record"""
+        self._latitudes.append(float(airport['latitude']))
+        self._longitudes.append(float(airport['longitude']))
+        for value in _record_strings(airport):
+            encoded = value.encode('utf-8')
+            self._blob.write(encoded)
+            self._blob_size += len(encoded)
+            self._offsets.append(self._blob_size)
+        self._codes.append(airport['code'])
+
+    def _hash_table(self):
+        count = len(self._codes)
+        slots = 1
+        while slots < count * 2:
+            slots *= 2
+        table = np.full(slots, -1, dtype='<i4')
+        for row, code in enumerate(self._codes):
+            slot = code_hash(code) & (slots - 1)
+            # Later duplicates replace earlier ones, matching dict construction
+            while table[slot] != -1 and self._codes[table[slot]] != code:
+                slot = (slot + 1) & (slots - 1)
+            table[slot] = row
+        return table
+
+    def write_to(self, fp):
+        """Write the compiled store to a binary file object; returns the number of bytes written"""
+        count = len(self._codes)
+        hash_table = self._hash_table()
+        sections = [
+            np.asarray(self._latitudes, dtype='<f8').tobytes(),
+            np.asarray(self._longitudes, dtype='<f8').tobytes(),
+            np.asarray(self._offsets, dtype='<u4').tobytes(),
+            None,  # string blob, copied from the spool file
+            hash_table.tobytes(),
+        ]
+        # 8-byte align every section so NumPy views over the mapping are aligned
+        section_offsets = []
+        position = HEADER.size
+        for section in sections:
+            position += (-position) % 8
+            section_offsets.append(position)
+            position += self._blob_size if section is None else len(section)
+
+        fp.write(HEADER.pack(STORE_MAGIC, STORE_VERSION, count, len(hash_table), 0, *section_offsets))
+        position = HEADER.size
+        for offset, section in zip(section_offsets, sections):
+            fp.write(b'\0' * (offset - position))
+            if section is None:
+                self._blob.seek(0)
+                shutil.copyfileobj(self._blob, fp)
+                position = offset + self._blob_size
+            else:
+                fp.write(section)
+                position = offset + len(section)
+        return position
+
+    def save(self, path=AIRPORTS_STORE_PATH):
+        """Atomically replace the store file at ``path``; returns its size"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            size = self.write_to(f)
+        os.replace(tmp_path, path)
+        return size
+
+    def close(self):
+        self._blob.close()
+
+
+def compile_airport_store(airports):
+    """Compile cleaned airport records (as written to airports_cleaned.json) into store bytes"""
+    writer = AirportStoreWriter()
+    for airport in airports:
+        writer.add(airport)
+    buffer = io.BytesIO()
+    writer.write_to(buffer)
+    writer.close()
+    return buffer.getvalue()
+
+
+def write_airport_store(airports, path=AIRPORTS_STORE_PATH):
+    """Compile airports and atomically replace the store file at ``path``"""
+    writer = AirportStoreWriter()
+    for airport in airports:
+        writer.add(airport)
+    size = writer.save(path)
+    writer.close()
+    return size
+
+
+class AirportStore:
+    """Read-only view over a compiled airport store (an mmap or a bytes buffer)"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, count, slots, _, lat_off, lon_off, idx_off, blob_off, hash_off = HEADER.unpack_from(buffer, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            raise ValueError("Unsupported airport store format")
+        self.count = count
+        self.slots = slots
+        self.latitudes = np.frombuffer(buffer, dtype='<f8', count=count, offset=lat_off)
+        self.longitudes = np.frombuffer(buffer, dtype='<f8', count=count, offset=lon_off)
+        self._string_index = np.frombuffer(buffer, dtype='<u4', count=count * len(STRING_FIELDS) + 1, offset=idx_off)
+        self._blob_offset = blob_off
+        self._hash_table = np.frombuffer(buffer, dtype='<i4', count=slots, offset=hash_off)
+
+    @classmethod
+    def open(cls, path=AIRPORTS_STORE_PATH):
+        """Map a store file read-only"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped)
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, row, field):
+        i = row * len(STRING_FIELDS) + field
+        start = self._blob_offset + int(self._string_index[i])
+        end = self._blob_offset + int(self._string_index[i + 1])
+        return self._buffer[start:end].decode('utf-8')
+
+    def code_at(self, row):
+        return self._string(row, 0)
+
+    def find(self, code):
+        """Row index for an airport code, or None"""
+        if not code:
+            return None
+        mask = self.slots - 1
+        slot = code_hash(code) & mask
+        while True:
+            row = int(self._hash_table[slot])
+            if row == -1:
+                return None
+            if self.code_at(row) == code:
+                return row
+            slot = (slot + 1) & mask
+
+    def record(self, row):
+        """Airport record in the airports_cleaned.json shape"""
+        code, name, city, country, airport_type = (self._string(row, i) for i in range(len(STRING_FIELDS)))
+        return {
+            'name': name,
+            'code': code,
+            'latitude': float(self.latitudes[row]),
+            'longitude': float(self.longitudes[row]),
+            'type': airport_type,
+            'location': {'country': country, 'city': city},
+        }
+
+    def get(self, code, default=None):
+        row = self.find(code)
+        return default if row is None else self.record(row)
+
+    def codes(self):
+        return [self.code_at(row) for row in range(self.count)]
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield self.record(row)
+
+
+class AirportCoordinates(Mapping):
+    """code -> {'latitude', 'longitude', 'name'} mapping backed by an AirportStore
+
+    Without an explicit store it resolves the shared one on first access.
+    """
+
+    def __init__(self, store=None):
+        self._explicit_store = store
+
+    @property
+    def _store(self):
+        if self._explicit_store is not None:
+            return self._explicit_store
+        return get_airport_store()
+
+    def __getitem__(self, code):
+        row = self._store.find(code)
+        if row is None:
+            raise KeyError(code)
+        return {
+            'latitude': float(self._store.latitudes[row]),
+            'longitude': float(self._store.longitudes[row]),
+            'name': self._store._string(row, 1),
+        }
+
+    def __contains__(self, code):
+        return isinstance(code, str) and self._store.find(code) is not None
+
+    def __iter__(self):
+        for row in range(len(self._store)):
+            yield self._store.code_at(row)
+
+    def __len__(self):
+        return len(self._store)
+
+
+def load_airport_store(store_path=AIRPORTS_STORE_PATH, json_path=AIRPORTS_JSON_PATH):
+    """Open the compiled store, compiling it in memory from JSON if the file is missing"""
+    if os.path.exists(store_path):
+        return AirportStore.open(store_path)
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            airports = json.load(f)
+    except FileNotFoundError:
+        airports = []
+    return AirportStore(compile_airport_store(airports))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_airport_store():
+    """Process-wide AirportStore, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = load_airport_store()
+    return _store
@@ -1,11 +1,11 @@
 from django.shortcuts import render
-import requests
 from django.http import JsonResponse
 from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
-from .models import Airport, AircraftProfile, OperationalConstraint
+from .models import Airport
+from .airport_store import get_airport_store, AirportCoordinates
+from . import air_traffic, aircraft_constraints, fuel_model, geodesy, weather
 import json
-import math
 import numpy as np
 from datetime import datetime
 from django.utils.timezone import now
@@ -21,91 +21,64 @@ def compute_tilt_angle(velocity, vertical_rate):
     return angle_deg
 
 def fetch_aircraft_metrics():
-    """Fetch real-time aircraft metrics from OpenSky Network API"""
-    # Try multiple approaches to get aircraft data
-    urls_to_try = [
-        "https://opensky-network.org/api/states/all",  # General query
-        "https://opensky-network.org/api/states/all?icao24=60006b",  # Specific aircraft
-        "https://opensky-network.org/api/states/all?lamin=12&lomin=77&lamax=13&lomax=78"
-    ]
-    
-    for url in urls_to_try:
-        try:
-            response = requests.get(url, timeout=15)
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    
-                    if data and data.get("states") and len(data["states"]) > 0:
-                        # Use first available aircraft or find our specific one
-                        target_state = None
-                        
-                        for state in data["states"]:
-                            if state[0] == "60006b":  # Our specific aircraft
-                                target_state = state
-                                break
-                        
-                        # If specific aircraft not found, use first available
-                        if not target_state and len(data["states"]) > 0:
-                            target_state = data["states"][0]
-                        
-                        if target_state:
-                            velocity = target_state[9] if target_state[9] is not None else 0
-                            vertical_rate = target_state[11] if target_state[11] is not None else 0
-                            
-                            # Calculate vibration level
-                            vibration = round(np.std([velocity, vertical_rate]), 2) if velocity != 0 or vertical_rate != 0 else 0
-                            
-                            # Calculate tilt angle
-                            tilt_angle = compute_tilt_angle(velocity, vertical_rate)
-                            
-                            aircraft_id = target_state[0] or "Unknown"
-                            source_text = f"Real-time OpenSky data (Aircraft: {aircraft_id})"
-                            
-                            return [
-                                {
-                                    "factor": "Vibration Level",
-                                    "value": f"{vibration} m/s",
-                                    "score": round(vibration * 2, 2),
-                                    "risk_level": "High" if vibration > 2 else "Medium" if vibration > 1 else "Low",
-                                    "recommendation": "Inspect airframe for stress" if vibration > 2 else "Monitor vibration levels",
-                                    "source": source_text
-                                },
-                                {
-                                    "factor": "Tilt Angle",
-                                    "value": f"{tilt_angle}°",
-                                    "score": round(abs(tilt_angle) / 10, 2),
-                                    "risk_level": "High" if abs(tilt_angle) > 30 else "Medium" if abs(tilt_angle) > 15 else "Low",
-                                    "recommendation": "Check for abnormal climb/descent" if abs(tilt_angle) > 15 else "Normal flight attitude",
-                                    "source": source_text
-                                },
-                                {
-                                    "factor": "Ground Speed",
-                                    "value": f"{velocity} m/s" if velocity else "N/A",
-                                    "score": 0,
-                                    "risk_level": "Low",
-                                    "recommendation": "Speed within normal parameters",
-                                    "source": source_text
-                                },
-                                {
-                                    "factor": "Vertical Rate",
-                                    "value": f"{vertical_rate} m/s" if vertical_rate else "N/A",
-                                    "score": 0,
-                                    "risk_level": "Low", 
-                                    "recommendation": "Vertical movement normal",
-                                    "source": source_text
-                                }
-                            ]
-                            
-                except json.JSONDecodeError:
-                    continue  # Try next URL
-                    
-        except requests.RequestException:
-            continue  # Try next URL
-    
-    # If all URLs failed, return simulated data
-    return generate_simulated_safety_metrics("OpenSky API unavailable - using realistic simulation")
+    """Aircraft metrics from the shared OpenSky snapshot published by ingest_air_traffic"""
+    snapshot = air_traffic.get_live_snapshot()
+    if snapshot is not None:
+        # Our specific aircraft, or the first airborne one with a known speed
+        target_state = snapshot.find("60006b")
+        if target_state is None:
+            airborne = snapshot.states[~snapshot.states['on_ground'] & ~np.isnan(snapshot.states['velocity'])]
+            target_state = airborne[0] if len(airborne) else snapshot.states[0]
+
+        velocity = 0 if np.isnan(target_state['velocity']) else round(float(target_state['velocity']), 2)
+        vertical_rate = 0 if np.isnan(target_state['vertical_rate']) else round(float(target_state['vertical_rate']), 2)
+
+        # Calculate vibration level
+        vibration = round(np.std([velocity, vertical_rate]), 2) if velocity != 0 or vertical_rate != 0 else 0
+
+        # Calculate tilt angle
+        tilt_angle = compute_tilt_angle(velocity, vertical_rate)
+
+        aircraft_id = target_state['icao24'].decode() or "Unknown"
+        source_text = f"Real-time OpenSky data (Aircraft: {aircraft_id})"
+
+        return [
+            {
+                "factor": "Vibration Level",
+                "value": f"{vibration} m/s",
+                "score": round(vibration * 2, 2),
+                "risk_level": "High" if vibration > 2 else "Medium" if vibration > 1 else "Low",
+                "recommendation": "Inspect airframe for stress" if vibration > 2 else "Monitor vibration levels",
+                "source": source_text
+            },
+            {
+                "factor": "Tilt Angle",
+                "value": f"{tilt_angle}°",
+                "score": round(abs(tilt_angle) / 10, 2),
+                "risk_level": "High" if abs(tilt_angle) > 30 else "Medium" if abs(tilt_angle) > 15 else "Low",
+                "recommendation": "Check for abnormal climb/descent" if abs(tilt_angle) > 15 else "Normal flight attitude",
+                "source": source_text
+            },
+            {
+                "factor": "Ground Speed",
+                "value": f"{velocity} m/s" if velocity else "N/A",
+                "score": 0,
+                "risk_level": "Low",
+                "recommendation": "Speed within normal parameters",
+                "source": source_text
+            },
+            {
+                "factor": "Vertical Rate",
+                "value": f"{vertical_rate} m/s" if vertical_rate else "N/A",
+                "score": 0,
+                "risk_level": "Low", 
+                "recommendation": "Vertical movement normal",
+                "source": source_text
+            }
+        ]
+
+    # Without a live snapshot, return simulated data
+    return generate_simulated_safety_metrics("OpenSky snapshot unavailable - using realistic simulation")
 
 def generate_simulated_safety_metrics(reason="Simulation"):
     """Generate simulated safety metrics when real data is unavailable"""
@@ -159,136 +132,35 @@ def generate_simulated_safety_metrics(reason="Simulation"):
 
 def fetch_operational_constraints(hex_code="60006B"):
     """Fetch operational constraints for a specific aircraft"""
+    return fetch_operational_constraints_bulk([hex_code])[hex_code]
+
+def fetch_operational_constraints_bulk(hex_codes):
+    """Operational constraints of many aircraft at once, as {hex code: constraints}"""
     try:
-        # Make hex_code lookup case-insensitive
-        aircraft = AircraftProfile.objects.get(hex_code__iexact=hex_code)
-        constraints = OperationalConstraint.objects.filter(aircraft=aircraft)
-        
-        if constraints.exists():
-            constraints_data = {
-                "aircraft_info": {
-                    "hex_code": aircraft.hex_code,
-                    "type": aircraft.type,
-                    "operator": aircraft.operator,
-                    "registration": aircraft.registration,
-                    "country": aircraft.country
-                },
-                "constraints": []
-            }
-            
-            # Group constraints by category for better organization
-            weight_constraints = []
-            runway_constraints = []
-            performance_constraints = []
-            maintenance_constraints = []
-            other_constraints = []
-            
-            for constraint in constraints:
-                constraint_data = {
-                    "type": constraint.constraint_type,
-                    "value": constraint.value,
-                    "unit": constraint.unit,
-                    "notes": constraint.notes,
-                    "formatted_value": f"{constraint.value} {constraint.unit}"
-                }
-                
-                # Categorize constraints
-                if "Weight" in constraint.constraint_type:
-                    weight_constraints.append(constraint_data)
-                elif "Runway" in constraint.constraint_type:
-                    runway_constraints.append(constraint_data)
-                elif any(term in constraint.constraint_type for term in ["Speed", "Ceiling", "Range", "Fuel"]):
-                    performance_constraints.append(constraint_data)
-                elif "Maintenance" in constraint.constraint_type:
-                    maintenance_constraints.append(constraint_data)
-                else:
-                    other_constraints.append(constraint_data)
-            
-            # Add categorized constraints
-            if weight_constraints:
-                constraints_data["constraints"].append({
-                    "category": "Weight Limitations",
-                    "items": weight_constraints
-                })
-            
-            if runway_constraints:
-                constraints_data["constraints"].append({
-                    "category": "Runway Requirements",
-                    "items": runway_constraints
-                })
-            
-            if performance_constraints:
-                constraints_data["constraints"].append({
-                    "category": "Performance Specifications",
-                    "items": performance_constraints
-                })
-            
-            if maintenance_constraints:
-                constraints_data["constraints"].append({
-                    "category": "Maintenance Schedule",
-                    "items": maintenance_constraints
-                })
-            
-            if other_constraints:
-                constraints_data["constraints"].append({
-                    "category": "Other Constraints",
-                    "items": other_constraints
-                })
-            
-            return constraints_data
-        else:
-            return {"error": f"No operational constraints found for aircraft {hex_code}"}
-            
-    except AircraftProfile.DoesNotExist:
-        return {"error": f"Aircraft profile not found for hex code {hex_code}"}
+        return aircraft_constraints.constraints_for(hex_codes)
     except Exception as e:
-        return {"error": f"Failed to fetch operational constraints: {str(e)}"}
+        return {hex_code: {"error": f"Failed to fetch operational constraints: {str(e)}"} for hex_code in hex_codes}
 
 
 # Aircraft Configuration - Constant ICAO Code
 DEFAULT_AIRCRAFT_ICAO = '60006B'  # Boeing 747SR (uppercase to match database)
 
-# Load airport data
-data_load = 'airports_cleaned.json'
-try:
-    with open(data_load, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-except FileNotFoundError:
-    data = []
 # Main report view
 def report(request):
-    major_airports = [airport.get('code') for airport in data if airport.get('code') ]
+    major_airports = [code for code in get_airport_store().codes() if code]
     airports = Airport.objects.filter(code__in=major_airports).order_by('name')
     if not airports.exists():
         airports = Airport.objects.all().order_by('name')[:100]
     return render(request, 'report.html', {'airports': airports})
 
-AIRPORT_COORDINATES = {
-    airport['code']: {
-        'latitude': airport['latitude'],
-        'longitude': airport['longitude'],
-        'name': airport['name']
-    }
-    for airport in data
-    if airport.get('code') and airport.get('latitude') and airport.get('longitude')
-}
+# code -> {'latitude', 'longitude', 'name'}; the memory-mapped store behind it
+# (compiled by convert_json.py) is only opened on first lookup
+AIRPORT_COORDINATES = AirportCoordinates()
 
 def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    # Earth radius in kilometers
-    R = 6371.0
-    # Convert degrees to radians
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    # Haversine formula
-    a = math.sin(delta_phi / 2)**2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    # Distance in kilometers
-    distance = R * c
-    return round(distance, 2)
+    """Distance in km between two points (or arrays of points), rounded to 10 m"""
+    distance = np.round(geodesy.haversine(lat1, lon1, lat2, lon2), 2)
+    return float(distance) if np.ndim(distance) == 0 else distance
 
 def calculate_distance(origin_code, destination_code):
     """Calculate distance between two airports using Haversine formula"""
@@ -355,117 +227,63 @@ def calculate_distance(origin_code, destination_code):
 
 
 # Weather forecast function using Open-Meteo API
+def _forecast_points(places):
+    """Error entries for unusable airport codes, and (lat, lon, label) of the rest"""
+    forecasts = {}
+    points = {}
+    for place in places:
+        if not place:
+            forecasts[place] = [{"error": "Airport code is missing."}]
+            continue
+        airport_code = place.upper()
+        if airport_code not in AIRPORT_COORDINATES:
+            forecasts[place] = [{"error": f"Airport code {airport_code} not supported. Supported: {', '.join(AIRPORT_COORDINATES.keys())}"}]
+            continue
+        coords = AIRPORT_COORDINATES[airport_code]
+        points[place] = (coords['latitude'], coords['longitude'], f"{coords['name']} ({airport_code})")
+    return forecasts, points
+
+def _forecast_entries(places, forecasts, points, entries):
+    for (place, (_, _, location)), entry in zip(points.items(), entries):
+        if isinstance(entry, weather.WeatherUnavailable):
+            forecasts[place] = [{"error": str(entry)}]
+        elif isinstance(entry, Exception):
+            forecasts[place] = [{"error": f"Weather fetch failed: {str(entry)}"}]
+        else:
+            forecasts[place] = [dict(entry, location=location)]  # Return only current weather
+    return {place: forecasts[place] for place in places}
+
+def fetch_forecasts(places):
+    """Fetch current weather for several airport codes, sharing cached and batched Open-Meteo requests"""
+    forecasts, points = _forecast_points(places)
+    entries = weather.current_weather([(lat, lon) for lat, lon, _ in points.values()])
+    return _forecast_entries(places, forecasts, points, entries)
+
+async def fetch_forecasts_async(places):
+    """fetch_forecasts() for the ASGI views, without holding a thread while Open-Meteo answers"""
+    forecasts, points = _forecast_points(places)
+    entries = await weather.current_weather_async([(lat, lon) for lat, lon, _ in points.values()])
+    return _forecast_entries(places, forecasts, points, entries)
+
 def fetch_forecast(place):
     """Fetch weather forecast for a given airport code using Open-Meteo API"""
-    if not place:
-        return [{"error": "Airport code is missing."}]
-    
-    # Get coordinates for the airport
-    airport_code = place.upper()
-    if airport_code not in AIRPORT_COORDINATES:
-        return [{"error": f"Airport code {airport_code} not supported. Supported: {', '.join(AIRPORT_COORDINATES.keys())}"}]
-    
-    coords = AIRPORT_COORDINATES[airport_code]
-    latitude = coords['latitude']
-    longitude = coords['longitude']
-    airport_name = coords['name']
-    
-    # Open-Meteo API URL - Only fetch current weather data
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m,wind_speed_10m,wind_direction_10m,relative_humidity_2m,surface_pressure,visibility,precipitation,weather_code&timezone=auto"
-    
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract current weather data only
-            current = data.get('current', {})
-            
-            # Format current time properly
-            current_time = current.get('time', 'N/A')
-            if current_time != 'N/A':
-                # Convert ISO format to readable format
-                from datetime import datetime
-                try:
-                    dt = datetime.fromisoformat(current_time.replace('Z', '+00:00'))
-                    current_time = dt.strftime('%Y-%m-%d %H:%M')
-                except:
-                    pass
-            
-            # Weather code descriptions
-            weather_codes = {
-                0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
-                45: "Fog", 48: "Depositing rime fog", 51: "Light drizzle", 53: "Moderate drizzle",
-                55: "Dense drizzle", 56: "Light freezing drizzle", 57: "Dense freezing drizzle",
-                61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain", 66: "Light freezing rain",
-                67: "Heavy freezing rain", 71: "Slight snow", 73: "Moderate snow", 75: "Heavy snow",
-                77: "Snow grains", 80: "Slight rain showers", 81: "Moderate rain showers",
-                82: "Violent rain showers", 85: "Slight snow showers", 86: "Heavy snow showers",
-                95: "Thunderstorm", 96: "Thunderstorm with slight hail", 99: "Thunderstorm with heavy hail"
-            }
-            
-            weather_code = current.get('weather_code', 0)
-            weather_description = weather_codes.get(weather_code, "Unknown")
-            
-            # Only return current weather data
-            current_weather = {
-                "time": current_time,
-                "location": f"{airport_name} ({airport_code})",
-                "temperature": f"{current.get('temperature_2m', 'N/A')}°C",
-                "humidity": f"{current.get('relative_humidity_2m', 'N/A')}%",
-                "pressure": f"{current.get('surface_pressure', 'N/A')} hPa",
-                "wind_speed": f"{current.get('wind_speed_10m', 'N/A')} m/s",
-                "wind_direction": f"{current.get('wind_direction_10m', 'N/A')}°",
-                "visibility": f"{current.get('visibility', 'N/A')} m",
-                "precipitation": f"{current.get('precipitation', 0)} mm",
-                "weather_condition": weather_description,
-                "weather_code": weather_code,
-                "type": "current"
-            }
-            
-            return [current_weather]  # Return only current weather
-            
-        else:
-            return [{"error": f"Open-Meteo API Error {response.status_code}: {response.text[:300]}"}]
-            
-    except Exception as e:
-        return [{"error": f"Weather fetch failed: {str(e)}"}]
+    return fetch_forecasts([place])[place]
 
 # Fuel efficiency function
 def fetch_fuel_efficiency(aircraft_code, distance_miles):
-    """Fetch fuel efficiency data for given aircraft and distance"""
+    """Estimate fuel efficiency for given aircraft and distance from the local fuel-burn model"""
     if not aircraft_code or distance_miles <= 0:
         return {"error": "Missing or invalid parameters."}
-    
-    # Try external API first
-    distance_nm = round(distance_miles / 1.15078, 2)
-    url = f"https://despouy.ca/flight-fuel-api/q/?aircraft={aircraft_code}&distance={distance_nm}"
-    
+
+    # The fuel API only refreshes the model, off the request path
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if data and len(data) > 0:
-                record = data[0]
-                # Check if we have meaningful data
-                if record.get("model") or record.get("fuel"):
-                    result = {}
-                    if record.get("model"):
-                        result["aircraft_type"] = record["model"]
-                    if record.get("fuel"):
-                        result["fuel_consumption"] = f"{record['fuel']} kg"
-                    if record.get("co2"):
-                        result["emissions"] = f"{record['co2']} kg CO₂"
-                    if record.get("distance"):
-                        result["distance"] = f"{record['distance']} NM"
-                    if record.get("icao"):
-                        result["icao_code"] = record["icao"]
-                    if record.get("iata"):
-                        result["code"] = record["iata"]
-                    return result
-    except Exception as e:
-        pass  # Fall through to Boeing 747SR specifications
-    
+        fuel_model.schedule_refresh(aircraft_code, distance_miles)
+    except Exception:
+        pass
+    result = fuel_model.estimate_fuel(aircraft_code, distance_miles)
+    if result is not None:
+        return result
+
     # Fallback to Boeing 747SR specifications
     return generate_boeing_747sr_fuel_data(distance_miles)
 
@@ -497,22 +315,24 @@ def generate_boeing_747sr_fuel_data(distance_miles):
 
 # Route data function
 
+def route_data_from_distance(distance_info):
+    """Build route data from an already computed calculate_distance result"""
+    if not distance_info:
+        return {"error": "Unable to calculate route data"}
+    return {
+        "greatCircleDistance": {"km": distance_info['distance_km']},
+        "realisticFlightTime": {
+            "h": round(distance_info['distance_km'] / 850, 1),  # Assume 850 km/h cruise speed
+            "averageSpeedKph": 850
+        },
+        "origin": distance_info['origin'],
+        "destination": distance_info['destination']
+    }
+
 def get_route_data(origin, destination):
     """Get route data between two airports"""
     try:
-        distance_info = calculate_distance(origin, destination)
-        if distance_info:
-            return {
-                "greatCircleDistance": {"km": distance_info['distance_km']},
-                "realisticFlightTime": {
-                    "h": round(distance_info['distance_km'] / 850, 1),  # Assume 850 km/h cruise speed
-                    "averageSpeedKph": 850
-                },
-                "origin": distance_info['origin'],
-                "destination": distance_info['destination']
-            }
-        else:
-            return {"error": "Unable to calculate route data"}
+        return route_data_from_distance(calculate_distance(origin, destination))
     except Exception as e:
         return {"error": f"Route data calculation failed: {str(e)}"}
 
@@ -611,11 +431,9 @@ def get_fuel_efficiency(request):
 def get_forecast(request):
     city1 = request.GET.get("city1", "").strip()
     city2 = request.GET.get("city2", "").strip()
-    result = {}
+    result = fetch_forecasts([city for city in [city1, city2] if city])
     for city in [city1, city2]:
-        if city:
-            result[city] = fetch_forecast(city)
-        else:
+        if not city:
             result[city] = [{"error": "City name is missing."}]
     return JsonResponse(result)
 
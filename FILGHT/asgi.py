@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FILGHT.settings')
+# Under ASGI, views waiting on upstream APIs use their async versions
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
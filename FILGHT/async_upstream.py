@@ -0,0 +1,140 @@
+"""
+Async counterpart of upstream.py, used by the ASGI views.
+
+One httpx.AsyncClient per event loop keeps a keep-alive pool that every
+request served on that loop shares, so a single ASGI worker can have
+hundreds of upstream calls in flight without a thread for each. Timeouts,
+the retry policy, the circuit breakers and the counters behind
+upstream_metrics() are the same ones the sync client uses.
+"""
+import asyncio
+import weakref
+
+import httpx
+
+from .upstream import (
+    DEFAULT_TIMEOUT, IDEMPOTENT_METHODS, RETRY_STATUSES, UpstreamUnavailable, _backoff, _count, get_breaker,
+)
+
+MAX_CONNECTIONS = 512  # across all hosts; a waiting coroutine costs far less than a thread
+MAX_KEEPALIVE_CONNECTIONS = 64
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> its AsyncClient
+
+
+def get_client():
+    """Pooled client of the running event loop; httpx clients cannot be shared across loops"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+        )
+    return client
+
+
+def _timeout(timeout):
+    """httpx timeout from the (connect, read) pair or single number the sync client takes"""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+async def request(upstream, method, url, timeout=DEFAULT_TIMEOUT, retries=None, **kwargs):
+    """Send a request to a named upstream through the loop's shared pool
+
+    Same contract as upstream.request(): ``retries`` defaults to 2 for
+    idempotent methods and 0 otherwise, and an open breaker raises
+    UpstreamUnavailable without contacting the upstream.
+    """
+    method = method.upper()
+    if retries is None:
+        retries = 2 if method in IDEMPOTENT_METHODS else 0
+    breaker = get_breaker(upstream)
+    if not breaker.allow():
+        _count(upstream, 'short_circuited')
+        raise UpstreamUnavailable(f"{upstream} is unavailable (circuit open)")
+
+    client = get_client()
+    attempt = 0
+    settled = False
+    try:
+        while True:
+            _count(upstream, 'requests')
+            try:
+                response = await client.request(method, url, timeout=_timeout(timeout), **kwargs)
+            except httpx.HTTPError as e:
+                retryable = attempt < retries
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    settled = True
+                    breaker.record_success()
+                    return response
+                if attempt >= retries:
+                    settled = True
+                    _count(upstream, 'failures')
+                    breaker.record_failure()
+                    return response
+                retryable = True
+                error = None
+            if not retryable:
+                settled = True
+                _count(upstream, 'failures')
+                breaker.record_failure()
+                raise error
+            attempt += 1
+            _count(upstream, 'retries')
+            await asyncio.sleep(_backoff(attempt))
+    finally:
+        if not settled:
+            # Cancellation (e.g. the client disconnected, even between retries) or an
+            # unexpected exception: not the upstream's fault, but a half-open breaker
+            # must not wait for this trial forever
+            breaker.release()
+
+
+async def get(upstream, url, **kwargs):
+    return await request(upstream, 'GET', url, **kwargs)
+
+
+async def post(upstream, url, **kwargs):
+    return await request(upstream, 'POST', url, **kwargs)
+
+
+async def send_stream(upstream, method, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """Send a request without retries and return once the headers arrive
+
+    The body is left unread for the caller to iterate; the caller must
+    ``aclose()`` the response.
+    """
+    breaker = get_breaker(upstream)
+    if not breaker.allow():
+        _count(upstream, 'short_circuited')
+        raise UpstreamUnavailable(f"{upstream} is unavailable (circuit open)")
+
+    client = get_client()
+    _count(upstream, 'requests')
+    settled = False
+    try:
+        response = await client.send(
+            client.build_request(method.upper(), url, timeout=_timeout(timeout), **kwargs), stream=True,
+        )
+    except httpx.HTTPError:
+        settled = True
+        _count(upstream, 'failures')
+        breaker.record_failure()
+        raise
+    else:
+        settled = True
+        if response.status_code in RETRY_STATUSES:
+            _count(upstream, 'failures')
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    finally:
+        if not settled:
+            breaker.release()
+    return response
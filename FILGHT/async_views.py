@@ -0,0 +1,221 @@
+"""
+Async versions of the views that wait on upstream APIs, served under ASGI.
+
+Upstream calls go through async_upstream, so a request waiting on Gemini,
+Open-Meteo or the QAOA service holds a coroutine rather than a worker thread.
+Blocking work (ORM queries, the fuel model, route planning) is batched into
+as few sync_to_async hops per request as possible. Responses are the same as
+those of the sync views in views.py, which urls.py keeps using under WSGI.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import async_upstream, chat_pool, chat_stream, upstream, views
+from .api_utils import fetch_aircraft_metrics, fetch_forecasts_async
+from .caching import claim, compute_once, release, swr_lookup, swr_store
+
+WEATHER_SECTIONS = {'origin_weather', 'destination_weather'}
+
+# Sections still running when the deadline passes keep going so their results
+# get cached; holding a reference stops them being garbage collected meanwhile
+_background_tasks = set()
+
+
+def _forget(task):
+    _background_tasks.discard(task)
+    if not task.cancelled():
+        task.exception()  # retrieved, so a late failure is not logged as unhandled
+
+
+def _keep_running(task):
+    _background_tasks.add(task)
+    task.add_done_callback(_forget)
+
+
+def _compute_local(sections, names):
+    """Compute and cache the sections that need no network, in one thread hop"""
+    results, errors = {}, {}
+    # Bounds how long compute_once() waits on sections other workers are computing
+    with upstream.deadline(settings.FULL_REPORT_DEADLINE_SECONDS):
+        for name in names:
+            try:
+                results[name] = compute_once(*sections[name])
+            except Exception as e:
+                errors[name] = e
+    return results, errors, fetch_aircraft_metrics()
+
+
+def _claim_weather(sections, names):
+    """({section: lock token}, {section: (value, age)}) of the missing weather sections
+
+    Sections another worker is fetching get no token; sections it stored
+    since read_sections() looked are returned as values.
+    """
+    tokens = {name: claim(sections[name][0]) for name in names}
+    tokens = {name: token for name, token in tokens.items() if token is not None}
+    stored = swr_lookup([sections[name][0] for name in tokens])
+    found = {}
+    for name in list(tokens):
+        key = sections[name][0]
+        if key in stored:
+            found[name] = stored[key][:2]
+            release(key, tokens.pop(name))
+    return tokens, found
+
+
+def _read_report(sections, route_age):
+    """views.read_sections() and the weather claims, in one thread hop"""
+    results, ages, stale, missing = views.read_sections(sections, route_age)
+    tokens, found = _claim_weather(sections, [name for name in missing if name in WEATHER_SECTIONS])
+    return results, ages, stale, missing, tokens, found
+
+
+def _store_weather(sections, tokens, forecasts, seconds):
+    """Cache the forecasts fetched in ``seconds`` (None if the fetch failed) and release the claims"""
+    for name, token in tokens.items():
+        key, fresh_for, _, place = sections[name]
+        if forecasts is not None:
+            swr_store(key, forecasts[place], fresh_for, seconds)
+        release(key, token)
+
+
+async def _fetch_weather(sections, tokens):
+    """The claimed airports' weather in one batched Open-Meteo request, cached per airport"""
+    places = {name: sections[name][3] for name in tokens}
+    forecasts = None
+    started = time.monotonic()
+    try:
+        forecasts = await fetch_forecasts_async(list(places.values()))
+    finally:
+        # Cache-only, so not queued behind the request's ORM thread
+        await sync_to_async(_store_weather, thread_sensitive=False)(
+            sections, tokens, forecasts, time.monotonic() - started)
+    return {name: forecasts[place] for name, place in places.items()}, {}
+
+
+async def build_full_report(origin, destination, aircraft, route, route_age):
+    """views.build_full_report() with the weather fetched on the event loop"""
+    sections = views.report_sections(origin, destination, aircraft, route['distance_info']['distance_miles'])
+    # Weather another worker is already fetching is waited for by compute_once() instead
+    results, ages, stale, missing, tokens, found = await sync_to_async(_read_report)(sections, route_age)
+    results.update({name: value for name, (value, _) in found.items()})
+    ages.update({name: age for name, (_, age) in found.items()})
+    weather_names = list(tokens)
+    local_names = [name for name in missing if name not in tokens and name not in found]
+    local = asyncio.ensure_future(sync_to_async(_compute_local)(sections, local_names))
+    groups = {local: local_names}
+    if weather_names:
+        groups[asyncio.ensure_future(_fetch_weather(sections, tokens))] = weather_names
+
+    done, pending = await asyncio.wait(groups, timeout=settings.FULL_REPORT_DEADLINE_SECONDS)
+    errors, timed_out, safety_factors = {}, [], None
+    for task, names in groups.items():
+        if task in pending:
+            _keep_running(task)
+            timed_out.extend(names)
+        elif task.exception() is not None:
+            errors.update({name: task.exception() for name in names})
+        else:
+            fetched, failed, *rest = task.result()
+            results.update(fetched)
+            errors.update(failed)
+            ages.update({name: 0.0 for name in fetched})
+            if rest:
+                safety_factors = rest[0]
+    if safety_factors is None:
+        # The local hop missed the deadline or failed; the snapshot read itself is cheap
+        safety_factors = await sync_to_async(fetch_aircraft_metrics)()
+    return views.assemble_report(origin, destination, aircraft, route, results, ages, stale, errors, timed_out, safety_factors)
+
+
+def _report_route(origin, destination, aircraft):
+    """The aircraft check and views.report_route(), in one thread hop; an error response or (route, age)"""
+    if not views.known_aircraft(aircraft):
+        return views.unknown_aircraft_response(aircraft)
+    route, route_age = views.report_route(origin, destination)
+    if route is None:
+        return views.unsupported_route_response()
+    return route, route_age
+
+
+@csrf_exempt
+async def full_report(request):
+    """
+    Comprehensive flight report fetching all data at once
+    Supports both GET and POST methods
+    """
+    origin, destination, aircraft = views.report_params(request)
+    if not origin or not destination:
+        return JsonResponse({"error": "Origin and destination are required."}, status=400)
+    route = await sync_to_async(_report_route)(origin, destination, aircraft)
+    if isinstance(route, JsonResponse):
+        return route
+
+    response = JsonResponse(await build_full_report(origin, destination, aircraft, *route))
+    return views.remember_report(response, origin, destination, aircraft)
+
+
+def _gemini_call(request):
+    """views.gemini_request() and the cached answer to it, in one thread hop"""
+    gemini_call = views.gemini_request(request)
+    if isinstance(gemini_call, JsonResponse):
+        return gemini_call, None
+    return gemini_call, chat_pool.cached_answer(gemini_call[0])
+
+
+@csrf_exempt
+async def chat_gemini_api(request):
+    if request.method == "POST":
+        # Packing the prompt reads the airport index, which may need the ORM,
+        # and the answer cache is in SQLite: neither belongs on the event loop
+        gemini_call, answer = await sync_to_async(_gemini_call)(request)
+        if isinstance(gemini_call, JsonResponse):
+            return gemini_call
+        cache_key, url, payload, stream = gemini_call
+        if answer is not None:
+            if stream:
+                return chat_stream.sse_response(chat_stream.cached_events_async(answer))
+            return JsonResponse({"response": answer, "cached": True})
+        try:
+            ticket = chat_pool.get_chat_pool().admit()
+        except chat_pool.ChatQueueFull as e:
+            return chat_pool.busy_response(e.retry_after)
+        if stream:
+            return chat_stream.sse_response(chat_stream.relay_async(url, payload, ticket, cache_key), ticket)
+        try:
+            if not await ticket.wait_async(settings.CHAT_QUEUE_TIMEOUT_SECONDS):
+                return views.chat_queue_timeout(ticket)
+            response = await async_upstream.post('gemini', url, json=payload, timeout=(3.05, 30))
+            return await sync_to_async(views.gemini_reply)(response, cache_key)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+        finally:
+            ticket.release()
+    return JsonResponse({"error": "POST only"}, status=405)
+
+
+class OptimizeView(views.OptimizeView):
+    async def get(self, request):
+        return await sync_to_async(super().get)(request)
+
+    async def post(self, request):
+        origin_id, destination_id = views.optimize_params(request)
+        origin, destination = await sync_to_async(views.airport_codes)(origin_id, destination_id)
+        if not origin or not destination or origin == destination:
+            return JsonResponse(views.INVALID_ROUTE_RESPONSE)
+
+        try:
+            qaoa_response = await async_upstream.post('qaoa', upstream.url('qaoa', views.QAOA_PREDICT_PATH),
+                                                      json={'qubo_matrix': views.qubo_matrix()}, timeout=(1, 5))
+            qaoa_result = qaoa_response.json()
+        except Exception as e:
+            qaoa_result = {'error': str(e)}
+        # Route planning is CPU-bound NumPy work: keep it off the event loop, and
+        # off the request's ORM thread so other requests' queries are not queued behind it
+        response = await sync_to_async(views.optimize_routes, thread_sensitive=False)(origin, destination, qaoa_result)
+        return JsonResponse(response)
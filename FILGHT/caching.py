@@ -0,0 +1,135 @@
+"""
+Stale-while-revalidate caching on top of the shared Django cache.
+
+Payloads assembled from several sources are cached part by part:
+swr_lookup()/swr_store() keep every part with its own freshness window,
+stale parts are served immediately with their age, and swr_refresh() runs a
+single background refresh per part on the shared thread pool. Parts missing
+altogether go through compute_once(): only the worker holding the part's
+lock computes it while the others wait for its result, so a cold or evicted
+key costs one upstream call rather than one per concurrent request, however
+slow the upstream. Refreshes and cold misses share the lock, so they never
+run side by side either.
+
+Hot parts are refreshed a little before they go stale ("probabilistic early
+expiration", XFetch): every lookup draws whether to refresh now, with a
+probability that rises as the part nears the end of its freshness window
+and with the time the part took to compute. The refresh then usually lands
+before any request sees the part stale.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+from . import upstream
+from .fanout import submit
+
+POLL_SECONDS = 0.05
+EARLY_EXPIRY_BETA = 1.0  # > 1 favours earlier refreshes, < 1 later
+SWR_KEEP_SECONDS = 24 * 3600  # how long past its freshness window a part can still be served
+REFRESH_LOCK_SECONDS = 60  # a crashed lock holder blocks recomputation for at most this long
+
+
+def _seconds(window, value):
+    return window(value) if callable(window) else window
+
+
+def _refresh_early(age, fresh_for, compute_seconds, beta):
+    """XFetch: whether to refresh a part that is still fresh, more likely towards the end of its window"""
+    # -log(U) is exponentially distributed; the compute time scales it
+    return age - compute_seconds * beta * math.log(random.random() or 1e-12) >= fresh_for
+
+
+def swr_lookup(keys, beta=EARLY_EXPIRY_BETA):
+    """{key: (value, age in seconds, whether still fresh, whether to refresh)} for the keys in the cache
+
+    Stale parts are always due a refresh; fresh ones now and then shortly
+    before they go stale.
+    """
+    now = time.time()
+    found = {}
+    for key, (value, stored_at, fresh_for, *rest) in cache.get_many(keys).items():
+        age = now - stored_at
+        compute_seconds = rest[0] if rest else 0.0  # entries stored before compute times were kept
+        fresh = fresh_for is None or age < fresh_for
+        refresh = not fresh or (fresh_for is not None and _refresh_early(age, fresh_for, compute_seconds, beta))
+        found[key] = (value, age, fresh, refresh)
+    return found
+
+
+def swr_store(key, value, fresh_for, compute_seconds=0.0):
+    """Store a part that is fresh for ``fresh_for`` seconds (None: forever)
+
+    ``fresh_for`` may also be a function of the value, e.g. to retry errors
+    sooner. ``compute_seconds``, the time the value took to compute, makes
+    early refreshes start sooner for expensive parts.
+    """
+    fresh_for = _seconds(fresh_for, value)
+    keep_for = None if fresh_for is None else fresh_for + SWR_KEEP_SECONDS
+    cache.set(key, (value, time.time(), fresh_for, compute_seconds), keep_for)
+
+
+def compute_and_store(key, fresh_for, fn, *args):
+    """fn(*args), stored under ``key``; also stores results that arrive after a caller gave up waiting"""
+    started = time.monotonic()
+    value = fn(*args)
+    swr_store(key, value, fresh_for, time.monotonic() - started)
+    return value
+
+
+def claim(key):
+    """Token of the lock for recomputing ``key``, or None while another worker holds it"""
+    token = uuid.uuid4().hex
+    return token if cache.add(f"{key}:refresh", token, REFRESH_LOCK_SECONDS) else None
+
+
+def release(key, token):
+    lock_key = f"{key}:refresh"
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def compute_once(key, fresh_for, fn, *args):
+    """compute_and_store() for a missing part, run only by the worker holding its lock
+
+    The other callers poll for the lock holder's result rather than calling
+    the upstream themselves. They take the lock over if it is given back
+    without a result (the computation failed) or expires (the worker died),
+    and give up with TimeoutError once the caller's upstream.deadline() has
+    passed.
+    """
+    while True:
+        token = claim(key)
+        if token is not None:
+            try:
+                # The previous lock holder may have stored it since the caller looked
+                entry = cache.get(key)
+                return entry[0] if entry is not None else compute_and_store(key, fresh_for, fn, *args)
+            finally:
+                release(key, token)
+        remaining = upstream.time_left()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"{key} is still being computed by another worker")
+        time.sleep(POLL_SECONDS if remaining is None else min(POLL_SECONDS, remaining))
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+
+def _refresh(key, token, fresh_for, fn, args):
+    try:
+        compute_and_store(key, fresh_for, fn, *args)
+    finally:
+        release(key, token)
+
+
+def swr_refresh(key, fresh_for, fn, *args):
+    """Recompute a part due a refresh in the background, once across all workers; True if started"""
+    token = claim(key)
+    if token is None:
+        return False
+    submit(_refresh, key, token, fresh_for, fn, args)
+    return True
@@ -0,0 +1,240 @@
+"""
+Compact flight-data context for chatbot prompts.
+
+Before a chat message goes to Gemini, the airports and stored routes it
+mentions are looked up in an in-memory lexical index (IATA codes written in
+capitals, plus capitalised words matching airport names, cities and
+countries, weighted by how rare they are), and the user's last flight report is read back from the
+report section cache. These facts are packed as short lines into a token
+budget, followed by as much of the recent conversation as still fits, so
+follow-up questions can be answered in one round trip without the user
+pasting report JSON. Tokens are estimated at four characters each.
+"""
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .caching import swr_lookup
+from .models import Airport, Route
+
+CHARS_PER_TOKEN = 4
+INDEX_TTL = 300  # seconds before the index is rebuilt, picking up other processes' changes
+MAX_AIRPORTS = 5
+MAX_ROUTES = 3
+MAX_HISTORY_TURNS = 20
+TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = {
+    'airport', 'airports', 'international', 'intl', 'regional', 'municipal', 'field', 'air', 'base',
+    'the', 'and', 'for', 'from', 'with', 'what', 'which', 'when', 'where', 'how', 'does', 'flight',
+    'flights', 'route', 'routes', 'fly', 'between', 'about', 'weather', 'fuel', 'distance', 'this',
+    'that', 'there', 'are', 'can', 'you', 'please', 'tell', 'show', 'best', 'cost',
+}
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def words(text, proper_only=False):
+    """Lowercase index terms of a text; with ``proper_only``, only of its capitalised words"""
+    tokens = TOKEN_RE.findall(text)
+    if proper_only:
+        # "Good" in "Goroka is a good origin" should not find Fort Good Hope
+        tokens = [token for token in tokens if token[0].isupper()]
+    terms = (token.casefold() for token in tokens if token.isalpha() and len(token) > 2)
+    return [term for term in terms if term not in STOPWORDS]
+
+
+class ChatIndex:
+    """Inverted index over airports, and stored routes by airport code"""
+
+    def __init__(self, airports, routes):
+        self.airports = airports  # [(code, name, city, country, latitude, longitude)]
+        self.by_code = {airport[0]: i for i, airport in enumerate(airports)}
+        self.postings = defaultdict(set)
+        for i, (code, name, city, country, _, _) in enumerate(airports):
+            for word in words(" ".join(filter(None, (name, city, country)))):
+                self.postings[word].add(i)
+        self.routes = defaultdict(list)  # airport code -> route summaries
+        for route in routes:
+            self.routes[route['origin__code']].append(route)
+            self.routes[route['destination__code']].append(route)
+
+    def find_airports(self, text, limit=MAX_AIRPORTS):
+        """Airports a message refers to, best matches first"""
+        scores = defaultdict(float)
+        for token in TOKEN_RE.findall(text):
+            # Only codes written in capitals: "DEL", not the word "del"
+            if token.isupper() and token in self.by_code:
+                scores[self.by_code[token]] += 100.0
+        total = len(self.airports) or 1
+        for word in set(words(text, proper_only=True)):
+            matches = self.postings.get(word, ())
+            if matches:
+                idf = math.log(total / len(matches))
+                for i in matches:
+                    scores[i] += idf
+        ranked = sorted(scores, key=lambda i: (-scores[i], self.airports[i][0]))
+        return [self.airports[i] for i in ranked[:limit]]
+
+    def find_routes(self, codes, limit=MAX_ROUTES):
+        """Stored routes touching the given airports, those linking two of them first"""
+        codes = set(codes)
+        candidates = {route['id']: route for code in codes for route in self.routes.get(code, ())}
+        ranked = sorted(
+            candidates.values(),
+            key=lambda route: -((route['origin__code'] in codes) + (route['destination__code'] in codes)),
+        )
+        return ranked[:limit]
+
+
+def load_chat_index():
+    airports = list(Airport.objects.values_list('code', 'name', 'city', 'country', 'latitude', 'longitude'))
+    routes = list(Route.objects.values(
+        'id', 'name', 'origin__code', 'destination__code', 'total_distance', 'total_duration',
+        'total_cost', 'total_fuel_cost',
+    ))
+    return ChatIndex(airports, routes)
+
+
+_index = None
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_chat_index():
+    """Process-wide index, rebuilt after INDEX_TTL or when airports or routes change"""
+    global _index, _index_loaded_at
+    index = _index
+    if index is None or time.monotonic() - _index_loaded_at > INDEX_TTL:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index_loaded_at > INDEX_TTL:
+                _index, _index_loaded_at = load_chat_index(), time.monotonic()
+            index = _index
+    return index
+
+
+def invalidate_chat_index(**kwargs):
+    global _index
+    _index = None
+
+
+def airport_line(airport):
+    code, name, city, country, latitude, longitude = airport
+    place = ", ".join(filter(None, (city, country)))
+    return f"Airport {code}: {name}" + (f", {place}" if place else "") + f" ({latitude:.2f}, {longitude:.2f})"
+
+
+def route_line(route):
+    return (
+        f"Route {route['name']} {route['origin__code']}->{route['destination__code']}: "
+        f"{route['total_distance']:.0f} mi, {route['total_duration']:.1f} h, "
+        f"cost {route['total_cost']:.0f} (fuel {route['total_fuel_cost']:.0f})"
+    )
+
+
+def report_lines(origin, destination, aircraft, section_keys):
+    """Summary of the cached sections of a flight report; nothing is fetched"""
+    found = swr_lookup(list(section_keys.values()))
+    sections = {name: found[key][0] for name, key in section_keys.items() if key in found}
+    route = sections.get('route')
+    if route is None:
+        return []
+    distance = route['distance_info']
+    lines = [f"Last report {origin}->{destination}, aircraft {aircraft}: "
+             f"{distance['distance_miles']} mi ({distance['distance_km']:.0f} km)"]
+    for name, code in (('origin_weather', origin), ('destination_weather', destination)):
+        forecast = sections.get(name)
+        entry = forecast[0] if isinstance(forecast, list) and forecast else {}
+        if 'weather_condition' in entry:
+            lines.append(f"Weather {code}: {entry['weather_condition']}, {entry['temperature']}, "
+                         f"wind {entry['wind_speed']} {entry['wind_direction']}, visibility {entry['visibility']}")
+    fuel = sections.get('fuel_efficiency')
+    if isinstance(fuel, dict) and 'fuel_consumption' in fuel:
+        lines.append(f"Fuel: {fuel['fuel_consumption']}, {fuel.get('emissions', '')}, "
+                     f"{fuel.get('fuel_efficiency', '')} ({fuel.get('aircraft_type', aircraft)})")
+    constraints = sections.get('operational_constraints')
+    if isinstance(constraints, dict):
+        items = [item for group in constraints.get('constraints', []) for item in group['items']]
+        if items:
+            lines.append("Constraints: " + "; ".join(f"{item['type']} {item['formatted_value']}" for item in items))
+    return lines
+
+
+def compact_message(message, budget):
+    """The user's message, with pasted JSON minified and the whole cut to ``budget`` tokens"""
+    stripped = message.strip()
+    if stripped[:1] in '{[':
+        try:
+            message = json.dumps(json.loads(stripped), separators=(',', ':'), ensure_ascii=False)
+        except ValueError:
+            pass
+    limit = budget * CHARS_PER_TOKEN
+    if len(message) > limit:
+        message = message[:limit] + " [truncated]"
+    return message
+
+
+def take_within(lines, budget):
+    """Leading lines that fit in ``budget`` tokens, and the tokens they use"""
+    taken, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        taken.append(line)
+        used += cost
+    return taken, used
+
+
+def pack_prompt(message, history=(), last_report=None):
+    """Gemini ``contents`` for a message, and the context text that was added
+
+    ``history`` is [{"role": "user"|"model", "text": ...}] oldest first;
+    ``last_report`` is (origin, destination, aircraft, section keys) of the
+    user's last flight report. Budgets come from CHAT_PROMPT_TOKENS and
+    CHAT_CONTEXT_TOKENS.
+    """
+    total = settings.CHAT_PROMPT_TOKENS
+    message = compact_message(message, total // 2)
+    remaining = total - estimate_tokens(message)
+
+    facts = []
+    if last_report is not None:
+        facts.extend(report_lines(*last_report))
+    index = get_chat_index()
+    airports = index.find_airports(message)
+    facts.extend(airport_line(airport) for airport in airports)
+    facts.extend(route_line(route) for route in index.find_routes([airport[0] for airport in airports]))
+    facts, used = take_within(facts, min(settings.CHAT_CONTEXT_TOKENS, remaining))
+    context = "\n".join(facts)
+    remaining -= used
+
+    # Most recent turns first, until the budget runs out; Gemini wants them oldest first
+    turns = []
+    for turn in reversed(list(history)[-MAX_HISTORY_TURNS:]):
+        text = str(turn.get('text', ''))
+        role = 'model' if turn.get('role') == 'model' else 'user'
+        cost = estimate_tokens(text)
+        if not text or cost > remaining:
+            break
+        turns.append({"role": role, "parts": [{"text": text}]})
+        remaining -= cost
+    turns.reverse()
+    while turns and turns[0]["role"] == 'model':
+        turns.pop(0)  # the conversation has to open with a user turn
+
+    text = f"Flight data that may help:\n{context}\n\nQuestion: {message}" if context else message
+    return turns + [{"role": "user", "parts": [{"text": text}]}], context
+
+
+post_save.connect(invalidate_chat_index, sender=Airport, dispatch_uid='chat_index_airport_save')
+post_delete.connect(invalidate_chat_index, sender=Airport, dispatch_uid='chat_index_airport_delete')
+post_save.connect(invalidate_chat_index, sender=Route, dispatch_uid='chat_index_route_save')
+post_delete.connect(invalidate_chat_index, sender=Route, dispatch_uid='chat_index_route_delete')
@@ -0,0 +1,211 @@
+"""
+Admission control for chat requests, and a cache of repeated questions.
+
+Every worker process has a fixed number of chat slots. A chat call runs only
+while holding a slot; further chats wait in a bounded FIFO queue that can
+report each waiter's position and an ETA derived from recent call durations,
+and are refused with 429 straight away once the queue is full. Chat bursts
+therefore occupy at most slots + queue request threads per worker, and the
+optimize and report endpoints keep the rest. Slots are handed over to both
+threads (WSGI) and coroutines (ASGI).
+
+Answers are cached under the normalised question and its flight-data context
+for CHAT_CACHE_SECONDS, so repeated FAQ-style questions are answered without
+Gemini or a slot. Follow-ups within a conversation are never cached.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+SERVICE_TIME_GUESS = 5.0  # seconds per chat until real calls have been timed
+SERVICE_TIME_WEIGHT = 0.2  # weight of the latest call in the moving average
+CACHE_PREFIX = "chat:answer:v2"
+CACHE_MAX_PROMPT_CHARS = 1000  # longer prompts (pasted reports) are too unlikely to repeat
+
+
+class ChatQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Chat queue is full")
+        self.retry_after = retry_after
+
+
+class ChatTicket:
+    """One chat's place in the pool: queued, then running, then done"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.state = 'queued'
+        self.started = None
+        self._granted = threading.Event()
+        self._async_waiters = []  # (loop, future) of coroutines waiting for the slot
+
+    @property
+    def position(self):
+        """1-based place in the queue, 0 once running"""
+        return self.pool.position(self)
+
+    def eta(self):
+        """Seconds until this chat is expected to get its slot"""
+        return self.pool.eta(self.position)
+
+    def _grant(self):
+        # Called with the pool lock held
+        self.state = 'running'
+        self.started = time.monotonic()
+        self._granted.set()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters.clear()
+
+    def wait(self, timeout):
+        """Block until the slot is ours; False if ``timeout`` passed first"""
+        return self._granted.wait(timeout)
+
+    async def wait_async(self, timeout):
+        """wait() for coroutines"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.pool.lock:
+            if self.state != 'queued':
+                return self.state == 'running'
+            self._async_waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # Callers poll with short timeouts; do not pile up stale waiters
+            with self.pool.lock:
+                if (loop, future) in self._async_waiters:
+                    self._async_waiters.remove((loop, future))
+
+    def release(self):
+        """Leave the queue or give the slot back; safe to call more than once"""
+        self.pool.release(self)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class ChatPool:
+    def __init__(self, concurrency, max_queue):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.running = 0
+        self.waiting = deque()
+        self.service_time = SERVICE_TIME_GUESS
+        self.rejected = 0
+
+    def eta(self, position):
+        if position <= 0:
+            return 0
+        return math.ceil(position * self.service_time / self.concurrency)
+
+    def position(self, ticket):
+        with self.lock:
+            if ticket.state != 'queued':
+                return 0
+            return self.waiting.index(ticket) + 1
+
+    def admit(self):
+        """A ticket holding a slot, or queued for one; raises ChatQueueFull"""
+        ticket = ChatTicket(self)
+        with self.lock:
+            if self.running < self.concurrency and not self.waiting:
+                self.running += 1
+                ticket._grant()
+            elif len(self.waiting) >= self.max_queue:
+                self.rejected += 1
+                raise ChatQueueFull(self.eta(len(self.waiting) + 1))
+            else:
+                self.waiting.append(ticket)
+        return ticket
+
+    def release(self, ticket):
+        with self.lock:
+            if ticket.state == 'queued':
+                self.waiting.remove(ticket)
+            elif ticket.state == 'running':
+                elapsed = time.monotonic() - ticket.started
+                self.service_time += SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+                self.running -= 1
+                if self.waiting:
+                    self.running += 1
+                    self.waiting.popleft()._grant()
+            ticket.state = 'done'
+
+    def status(self):
+        with self.lock:
+            return {
+                'slots': self.concurrency,
+                'running': self.running,
+                'queued': len(self.waiting),
+                'queue_limit': self.max_queue,
+                'rejected': self.rejected,
+                'average_seconds': round(self.service_time, 2),
+                'eta_seconds': self.eta(len(self.waiting) + 1) if self.running >= self.concurrency else 0,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_chat_pool():
+    """Process-wide chat pool, recreated after fork"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ChatPool(settings.CHAT_MAX_CONCURRENCY, settings.CHAT_MAX_QUEUE)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def busy_response(retry_after):
+    response = JsonResponse(
+        {"error": "The chat assistant is busy, please try again shortly.", "retry_after": retry_after},
+        status=429,
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def normalize_prompt(message):
+    """Case, spacing and trailing punctuation do not make a question different"""
+    return " ".join(message.casefold().split()).rstrip("?!. ")
+
+
+def answer_key(message, context="", history=()):
+    """Cache key of an answer; None when it depends on the conversation so far
+
+    The flight-data context packed into the prompt is part of the key, so an
+    answer is not reused once the airports, routes or last report change.
+    """
+    normalized = normalize_prompt(message)
+    if history or not normalized or len(normalized) > CACHE_MAX_PROMPT_CHARS:
+        return None
+    digest = hashlib.sha1(f"{normalized}\n{context}".encode('utf-8')).hexdigest()
+    return f"{CACHE_PREFIX}:{digest}"
+
+
+def cached_answer(key):
+    return cache.get(key) if key else None
+
+
+def store_answer(key, text):
+    if key and text:
+        cache.set(key, text, settings.CHAT_CACHE_SECONDS)
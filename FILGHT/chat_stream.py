@@ -0,0 +1,228 @@
+"""
+Gemini answers relayed to the browser as Server-Sent Events.
+
+Gemini's streamGenerateContent endpoint (with ``alt=sse``) sends the answer
+in chunks as it is generated; every chunk's text is forwarded as soon as it
+arrives, as a ``data: {"text": ...}`` event. The stream ends with a ``done``
+event, or an ``error`` event when Gemini fails or the per-request deadline
+passes. A chat waiting for a slot in the chat pool first receives
+``queued`` events with its position and ETA, once a second. When the
+browser goes away the upstream stream is closed and the slot freed right
+away: the sync relay notices on its next write, the async one is cancelled
+by the ASGI server.
+"""
+import asyncio
+import json
+import time
+from contextlib import aclosing
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from . import async_upstream, chat_pool, upstream
+
+STREAM_PATH = "/v1beta/models/gemini-pro:streamGenerateContent"
+STREAM_TIMEOUT = (3.05, 15)  # (connect, longest wait between two chunks) seconds
+QUEUE_UPDATE_SECONDS = 1.0
+
+
+def stream_url(api_key):
+    return upstream.url('gemini', f"{STREAM_PATH}?alt=sse&key={api_key}")
+
+
+def sse_event(data, event=None):
+    """One encoded Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+def chunk_text(line):
+    """(text, finish reason) of one ``data:`` line of Gemini's SSE stream; None for other lines"""
+    if not line.startswith("data:"):
+        return None
+    chunk = json.loads(line[5:])
+    if "error" in chunk:
+        raise ValueError(chunk["error"].get("message", "Gemini stream error"))
+    candidate = (chunk.get("candidates") or [{}])[0]
+    parts = candidate.get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts), candidate.get("finishReason")
+
+
+def iter_lines(raw):
+    """Lines of a urllib3 response as soon as they arrive
+
+    requests' iter_lines() waits for a full read buffer, which can hold back
+    several small chunks; read1() returns whatever the socket has.
+    """
+    pending = b""
+    while True:
+        data = raw.read1(8192, decode_content=True)
+        if not data:
+            break
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode('utf-8')
+    if pending:
+        yield pending.rstrip(b"\r").decode('utf-8')
+
+
+def timed_out_event():
+    return sse_event({"error": "Gemini response timed out", "timed_out": True}, "error")
+
+
+def queued_event(ticket):
+    return sse_event({"position": ticket.position, "eta_seconds": ticket.eta()}, "queued")
+
+
+def busy_event(ticket):
+    return sse_event({"error": "The chat assistant is busy, please try again shortly.",
+                      "retry_after": ticket.eta()}, "error")
+
+
+def cached_events(text):
+    """The events of a stream that was answered from the chat cache"""
+    yield sse_event({"text": text})
+    yield sse_event({"finish_reason": "STOP", "cached": True}, "done")
+
+
+async def cached_events_async(text):
+    for event in cached_events(text):
+        yield event
+
+
+def relay(url, payload, ticket=None, cache_key=None, deadline_seconds=None):
+    """Sync generator of SSE events for one Gemini answer
+
+    With a chat pool ``ticket``, waits for its slot first and frees it at
+    the end; a complete answer is then cached under ``cache_key``.
+    """
+    try:
+        if ticket is not None:
+            queued_until = time.monotonic() + settings.CHAT_QUEUE_TIMEOUT_SECONDS
+            if ticket.position:
+                yield queued_event(ticket)
+            while not ticket.wait(QUEUE_UPDATE_SECONDS):
+                if time.monotonic() > queued_until:
+                    yield busy_event(ticket)
+                    return
+                yield queued_event(ticket)
+        yield from _relay(url, payload, cache_key, deadline_seconds)
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+def _relay(url, payload, cache_key, deadline_seconds):
+    deadline = time.monotonic() + (deadline_seconds or settings.CHAT_STREAM_DEADLINE_SECONDS)
+    try:
+        response = upstream.post('gemini', url, json=payload, timeout=STREAM_TIMEOUT, stream=True)
+    except Exception as e:
+        yield sse_event({"error": str(e)}, "error")
+        return
+    try:
+        if response.status_code != 200:
+            yield sse_event({"error": f"Gemini API error: {response.text[:300]}"}, "error")
+            return
+        finish_reason, answer = None, []
+        for line in iter_lines(response.raw):
+            if time.monotonic() > deadline:
+                yield timed_out_event()
+                return
+            parsed = chunk_text(line)
+            if parsed is None:
+                continue
+            text, finish_reason = parsed
+            if text:
+                answer.append(text)
+                yield sse_event({"text": text})
+        chat_pool.store_answer(cache_key, "".join(answer))
+        yield sse_event({"finish_reason": finish_reason}, "done")
+    except Exception as e:
+        yield sse_event({"error": f"Gemini stream failed: {e}"}, "error")
+    finally:
+        # Also runs when the client disconnects and the server closes this generator
+        response.close()
+
+
+async def relay_async(url, payload, ticket=None, cache_key=None, deadline_seconds=None):
+    """relay() as an async generator"""
+    try:
+        if ticket is not None:
+            loop = asyncio.get_running_loop()
+            queued_until = loop.time() + settings.CHAT_QUEUE_TIMEOUT_SECONDS
+            if ticket.position:
+                yield queued_event(ticket)
+            while not await ticket.wait_async(QUEUE_UPDATE_SECONDS):
+                if loop.time() > queued_until:
+                    yield busy_event(ticket)
+                    return
+                yield queued_event(ticket)
+        async with aclosing(_relay_async(url, payload, cache_key, deadline_seconds)) as events:
+            async for event in events:
+                yield event
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+async def _relay_async(url, payload, cache_key, deadline_seconds):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (deadline_seconds or settings.CHAT_STREAM_DEADLINE_SECONDS)
+    try:
+        response = await async_upstream.send_stream('gemini', 'POST', url, json=payload, timeout=STREAM_TIMEOUT)
+    except Exception as e:
+        yield sse_event({"error": str(e)}, "error")
+        return
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            yield sse_event({"error": f"Gemini API error: {response.text[:300]}"}, "error")
+            return
+        finish_reason, answer = None, []
+        lines = response.aiter_lines()
+        while True:
+            try:
+                line = await asyncio.wait_for(anext(lines), deadline - loop.time())
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                yield timed_out_event()
+                return
+            parsed = chunk_text(line)
+            if parsed is None:
+                continue
+            text, finish_reason = parsed
+            if text:
+                answer.append(text)
+                yield sse_event({"text": text})
+        await sync_to_async(chat_pool.store_answer, thread_sensitive=False)(cache_key, "".join(answer))
+        yield sse_event({"finish_reason": finish_reason}, "done")
+    except Exception as e:
+        yield sse_event({"error": f"Gemini stream failed: {e}"}, "error")
+    finally:
+        # Also runs when the ASGI server cancels the response because the client went away
+        await response.aclose()
+
+
+class SSEResponse(StreamingHttpResponse):
+    """Event stream that frees its chat slot when closed, even if it was never iterated"""
+
+    def __init__(self, events, ticket=None):
+        super().__init__(events, content_type='text/event-stream')
+        self['Cache-Control'] = 'no-cache'
+        self['X-Accel-Buffering'] = 'no'  # tell nginx not to buffer the stream
+        self.ticket = ticket
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.ticket is not None:
+                self.ticket.release()
+
+
+def sse_response(events, ticket=None):
+    """SSEResponse for an (async) iterator of encoded events"""
+    return SSEResponse(events, ticket)
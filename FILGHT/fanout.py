@@ -0,0 +1,71 @@
+"""
+Concurrent fan-out of independent upstream calls under one deadline.
+
+Calls run on a shared thread pool. Whatever has not finished when the
+deadline passes is reported as timed out, so a request waits at most for the
+slowest dependency or the budget, whichever is shorter. The calls' upstream
+requests run under the same deadline, so a slow upstream gives its pool
+thread back soon after the budget instead of holding it for its full
+timeout and retries.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import connections
+
+from . import upstream
+
+MAX_WORKERS = 32
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Shared thread pool, recreated after fork since threads do not survive it"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='fanout')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _call(fn, args, timeout=None):
+    try:
+        if timeout is None:
+            return fn(*args)
+        with upstream.deadline(timeout):
+            return fn(*args)
+    finally:
+        # Pool threads would otherwise keep their own database connections open
+        connections.close_all()
+
+
+def submit(fn, *args):
+    """Run fn(*args) on the shared pool without waiting for it"""
+    return get_executor().submit(_call, fn, args)
+
+
+def fan_out(calls, timeout):
+    """Run ``calls`` ({name: (fn, *args)}) concurrently and wait at most ``timeout`` seconds
+
+    Returns (results, errors, timed_out): values of the calls that finished,
+    exceptions of the calls that raised, and names of the calls still running.
+    """
+    executor = get_executor()
+    futures = {name: executor.submit(_call, call[0], call[1:], timeout) for name, call in calls.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+    results, errors, timed_out = {}, {}, []
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            timed_out.append(name)
+        elif future.exception() is not None:
+            errors[name] = future.exception()
+        else:
+            results[name] = future.result()
+    return results, errors, timed_out
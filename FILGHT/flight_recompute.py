@@ -0,0 +1,136 @@
+"""
+Bulk recomputation of flight distances, durations, fuel and total costs and arrival times.
+
+Flight.calculate_fuel_cost() and friends work on one instance at a time;
+after a fuel-price change or an airport correction every flight would be
+loaded and saved individually. Here the flights are read in primary-key
+chunks with values_list (airport coordinates joined in), each chunk is
+computed with NumPy in one pass using the per-aircraft tables in models.py,
+and only the flights whose values changed are written back, in batches of
+one parameterised UPDATE run with executemany. (bulk_update builds a
+CASE/WHEN expression per row and field in Python, which capped it at about
+1000 rows/s.) Arrival times wrap past midnight like calculate_arrival_time().
+base_cost is left alone and total_cost is kept at base_cost + fuel_cost.
+"""
+import time as clock
+from datetime import time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connections, router, transaction
+
+from . import geodesy
+from .models import (
+    AIRCRAFT_FUEL_PER_MILE, AIRCRAFT_SPEED_MPH, DEFAULT_FUEL_PER_MILE, DEFAULT_FUEL_PRICE_PER_GALLON,
+    DEFAULT_SPEED_MPH, Flight,
+)
+
+CHUNK_SIZE = 20000  # flights read and computed at once
+BATCH_SIZE = 2000  # flights per executemany() call
+UPDATE_FIELDS = ['distance', 'duration', 'fuel_cost', 'total_cost', 'arrival_time']
+CENT = Decimal('0.01')
+MINUTES_PER_DAY = 24 * 60
+
+
+def aircraft_rates(aircraft_types):
+    """(gallons per mile, mph) arrays for a list of aircraft types"""
+    names, inverse = np.unique(np.asarray(aircraft_types, dtype=object), return_inverse=True)
+    fuel = np.array([AIRCRAFT_FUEL_PER_MILE.get(name, DEFAULT_FUEL_PER_MILE) for name in names])
+    speed = np.array([AIRCRAFT_SPEED_MPH.get(name, DEFAULT_SPEED_MPH) for name in names], dtype=float)
+    return fuel[inverse], speed[inverse]
+
+
+def compute_chunk(rows, fuel_price_per_gallon):
+    """(id, {field: value}) of the flights of one chunk whose values changed"""
+    (ids, aircraft_types, departures, origin_lat, origin_lon, destination_lat, destination_lon,
+     distances, durations, base_costs, fuel_costs, total_costs, arrivals) = zip(*rows)
+    fuel_per_mile, speed = aircraft_rates(aircraft_types)
+
+    # Distances and costs are stored to the cent, as DecimalField(decimal_places=2)
+    distance = np.round(geodesy.haversine(
+        np.array(origin_lat), np.array(origin_lon), np.array(destination_lat), np.array(destination_lon),
+        radius=geodesy.EARTH_RADIUS_MILES,
+    ), 2)
+    fuel_cost = np.round(distance * fuel_per_mile * fuel_price_per_gallon, 2)
+    # Summed in cents so the total is exactly base_cost + fuel_cost
+    total_cents = np.array([int(c * 100) for c in base_costs], dtype=np.int64) + np.rint(fuel_cost * 100).astype(np.int64)
+    duration_us = np.rint(distance / speed * 3600e6).astype(np.int64)
+    departure_minutes = np.array([t.hour * 60 + t.minute for t in departures])
+    arrival_minutes = (departure_minutes + duration_us // 60_000_000) % MINUTES_PER_DAY
+
+    old_distance = np.array([float(d) for d in distances])
+    old_fuel_cost = np.array([float(c) for c in fuel_costs])
+    old_total_cents = np.array([int(c * 100) for c in total_costs], dtype=np.int64)
+    old_duration_us = np.array([d // timedelta(microseconds=1) for d in durations], dtype=np.int64)
+    old_arrival_minutes = np.array([t.hour * 60 + t.minute for t in arrivals])
+    changed = np.flatnonzero(
+        (np.rint(distance * 100) != np.rint(old_distance * 100))
+        | (np.rint(fuel_cost * 100) != np.rint(old_fuel_cost * 100))
+        | (total_cents != old_total_cents)
+        | (duration_us != old_duration_us)
+        | (arrival_minutes != old_arrival_minutes)
+    )
+    return [
+        (ids[i], {
+            'distance': Decimal(float(distance[i])).quantize(CENT),
+            'duration': timedelta(microseconds=int(duration_us[i])),
+            'fuel_cost': Decimal(float(fuel_cost[i])).quantize(CENT),
+            'total_cost': Decimal(int(total_cents[i])) * CENT,
+            'arrival_time': time(*divmod(int(arrival_minutes[i]), 60)),
+        })
+        for i in changed
+    ]
+
+
+def write_flights(updates, using, batch_size=BATCH_SIZE):
+    """Save computed values, ``batch_size`` flights per executemany()"""
+    connection = connections[using]
+    fields = [Flight._meta.get_field(name) for name in UPDATE_FIELDS]
+    quote = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        quote(Flight._meta.db_table),
+        ", ".join(f"{quote(field.column)} = %s" for field in fields),
+        quote(Flight._meta.pk.column),
+    )
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for start in range(0, len(updates), batch_size):
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(values[field.name], connection) for field in fields] + [pk]
+                for pk, values in updates[start:start + batch_size]
+            ])
+
+
+def recompute_flights(queryset=None, fuel_price_per_gallon=DEFAULT_FUEL_PRICE_PER_GALLON,
+                      chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """Recompute and save the derived fields of every flight in ``queryset``
+
+    Returns {"rows", "updated", "seconds", "rows_per_second"}.
+    """
+    queryset = (Flight.objects.all() if queryset is None else queryset).order_by('pk')
+    using = router.db_for_write(Flight)
+    columns = queryset.values_list(
+        'id', 'aircraft_type', 'departure_time',
+        'origin__latitude', 'origin__longitude', 'destination__latitude', 'destination__longitude',
+        'distance', 'duration', 'base_cost', 'fuel_cost', 'total_cost', 'arrival_time',
+    )
+    started = clock.perf_counter()
+    rows_seen = updated = 0
+    last_id = None
+    while True:
+        chunk = columns if last_id is None else columns.filter(pk__gt=last_id)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        rows_seen += len(rows)
+        updates = compute_chunk(rows, fuel_price_per_gallon)
+        if updates:
+            write_flights(updates, using, batch_size)
+            updated += len(updates)
+    seconds = clock.perf_counter() - started
+    return {
+        "rows": rows_seen,
+        "updated": updated,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_seen / seconds) if seconds > 0 else rows_seen,
+    }
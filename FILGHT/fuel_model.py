@@ -0,0 +1,248 @@
+"""
+Local fuel-burn model.
+
+Every aircraft has a fuel-vs-distance curve: points stored in the
+FuelEfficiency table, or the bundled fuel_curves.json for aircraft the table
+does not cover yet. Curves are held in memory as NumPy arrays and any
+distance is answered by interpolation, so estimates need neither the network
+nor the database. The external fuel API is only used in the background, to
+harvest points for distance buckets the table lacks or holds stale data for.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+from . import upstream
+from .fanout import get_executor
+from .models import FuelEfficiency
+
+logger = logging.getLogger(__name__)
+
+FUEL_API_PATH = "/flight-fuel-api/q/"
+BUNDLED_CURVES_PATH = os.path.join(settings.BASE_DIR, 'fuel_curves.json')
+KM_PER_MILE = 1.60934
+MILES_PER_NM = 1.15078
+CO2_PER_KG_FUEL = 3.15
+CURVE_TTL = 300  # seconds before curves are re-read, picking up other processes' harvests
+HARVEST_STEP_NM = 250  # upstream points are harvested on this distance grid
+REFRESH_AFTER = 7 * 24 * 3600  # age at which a harvested point is refreshed
+RETRY_AFTER = 3600  # wait before asking the API again for a bucket it had no data for
+
+
+class FuelCurve:
+    """Fuel burn and CO2 of one aircraft as a function of distance in nautical miles"""
+
+    def __init__(self, aircraft_type, points, model='', icao_code='', code='', notes='', harvested=None):
+        points = sorted(points)
+        if not points or points[0][0] > 0:
+            # Anchor the curve at the origin so short distances interpolate towards zero
+            points.insert(0, (0.0, 0.0, 0.0))
+        table = np.array(points, dtype=np.float64)
+        self.aircraft_type = aircraft_type
+        self.distances = table[:, 0]
+        self.fuel = table[:, 1]
+        self.emissions = table[:, 2]
+        self.model = model
+        self.icao_code = icao_code
+        self.code = code
+        self.notes = notes
+        self.harvested = harvested or {}  # distance bucket -> unix time of the upstream point
+
+    def _interpolate(self, values, distances_nm):
+        result = np.interp(distances_nm, self.distances, values)
+        if len(self.distances) > 1:
+            # np.interp clamps; continue the last segment's slope past the end of the table
+            slope = (values[-1] - values[-2]) / (self.distances[-1] - self.distances[-2])
+            beyond = distances_nm > self.distances[-1]
+            result = np.where(beyond, values[-1] + slope * (distances_nm - self.distances[-1]), result)
+        return result
+
+    def fuel_at(self, distances_nm):
+        """Fuel burn in kg for an array of distances"""
+        return self._interpolate(self.fuel, np.asarray(distances_nm, dtype=np.float64))
+
+    def emissions_at(self, distances_nm):
+        """CO2 in kg for an array of distances"""
+        return self._interpolate(self.emissions, np.asarray(distances_nm, dtype=np.float64))
+
+    @property
+    def source(self):
+        return "Fuel API data" if self.harvested else f"{self.model} specifications"
+
+
+def load_bundled_curves(path=BUNDLED_CURVES_PATH):
+    """Read fuel_curves.json into {aircraft: FuelCurve}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read bundled fuel curves from %s: %s", path, e)
+        return {}
+    return {
+        aircraft: FuelCurve(
+            aircraft,
+            [tuple(point) for point in spec['points']],
+            model=spec.get('model', ''),
+            icao_code=spec.get('icao_code', ''),
+            code=spec.get('code', ''),
+            notes=spec.get('notes', ''),
+        )
+        for aircraft, spec in data.items()
+    }
+
+
+def load_stored_curves():
+    """Build curves from the FuelEfficiency table"""
+    rows = {}
+    for row in FuelEfficiency.objects.all():
+        rows.setdefault(row.aircraft_type, []).append(row)
+    curves = {}
+    for aircraft, points in rows.items():
+        latest = max(points, key=lambda row: row.timestamp)
+        curves[aircraft] = FuelCurve(
+            aircraft,
+            [
+                (row.distance, row.fuel_consumption,
+                 row.emissions if row.emissions is not None else row.fuel_consumption * CO2_PER_KG_FUEL)
+                for row in points
+            ],
+            model=latest.model,
+            icao_code=latest.icao_code,
+            code=latest.code,
+            harvested={row.distance: row.timestamp.timestamp() for row in points if row.source == 'upstream'},
+        )
+    return curves
+
+
+_curves = None
+_curves_loaded_at = 0.0
+_curves_lock = threading.Lock()
+
+
+def get_fuel_curves():
+    """In-memory curves per aircraft: stored points where present, bundled ones otherwise"""
+    global _curves, _curves_loaded_at
+    curves = _curves
+    if curves is None or time.monotonic() - _curves_loaded_at > CURVE_TTL:
+        with _curves_lock:
+            if _curves is None or time.monotonic() - _curves_loaded_at > CURVE_TTL:
+                merged = load_bundled_curves()
+                merged.update(load_stored_curves())
+                _curves, _curves_loaded_at = merged, time.monotonic()
+            curves = _curves
+    return curves
+
+
+def invalidate_fuel_curves(**kwargs):
+    global _curves
+    _curves = None
+
+
+def estimate_fuel_many(aircraft_type, distances_miles):
+    """(fuel kg, CO2 kg) arrays for many distances, or None if the aircraft has no curve"""
+    curve = get_fuel_curves().get(aircraft_type)
+    if curve is None:
+        return None
+    distances_nm = np.asarray(distances_miles, dtype=np.float64) / MILES_PER_NM
+    return curve.fuel_at(distances_nm), curve.emissions_at(distances_nm)
+
+
+def estimate_fuel(aircraft_type, distance_miles):
+    """Fuel efficiency report for one distance, or None if the aircraft has no curve"""
+    curve = get_fuel_curves().get(aircraft_type)
+    if curve is None:
+        return None
+    distance_nm = distance_miles / MILES_PER_NM
+    distance_km = distance_miles * KM_PER_MILE
+    fuel_kg = round(float(curve.fuel_at(distance_nm)), 1)
+    co2_kg = round(float(curve.emissions_at(distance_nm)), 1)
+    result = {
+        "aircraft_type": curve.model or aircraft_type,
+        "fuel_consumption": f"{fuel_kg} kg",
+        "emissions": f"{co2_kg} kg CO₂",
+        "distance": f"{round(distance_nm, 1)} NM ({distance_miles} miles)",
+    }
+    if curve.icao_code:
+        result["icao_code"] = curve.icao_code
+    if curve.code:
+        result["code"] = curve.code
+    if distance_km > 0:
+        result["fuel_efficiency"] = f"{round(fuel_kg / distance_km, 2)} kg/km"
+    result["source"] = curve.source
+    if curve.notes:
+        result["notes"] = curve.notes
+    return result
+
+
+def harvest_point(aircraft_type, distance_nm):
+    """Ask the fuel API for one distance and store the answer; returns whether it had data"""
+    response = upstream.get(
+        'fuel-api', upstream.url('fuel-api', FUEL_API_PATH),
+        params={'aircraft': aircraft_type, 'distance': distance_nm}, timeout=(3.05, 10), retries=1,
+    )
+    if response.status_code != 200:
+        return False
+    data = response.json()
+    record = data[0] if isinstance(data, list) and data else None
+    if not record or not record.get("fuel"):
+        return False
+    fuel = float(record["fuel"])
+    FuelEfficiency.objects.update_or_create(
+        aircraft_type=aircraft_type,
+        distance=float(distance_nm),
+        defaults={
+            'fuel_consumption': fuel,
+            'emissions': float(record["co2"]) if record.get("co2") else fuel * CO2_PER_KG_FUEL,
+            'model': record.get("model") or '',
+            'icao_code': record.get("icao") or '',
+            'code': record.get("iata") or '',
+            'source': 'upstream',
+        },
+    )
+    return True
+
+
+def harvest_bucket(distance_miles):
+    """Distance grid point, in nautical miles, that a distance is harvested under"""
+    return max(1, round(distance_miles / MILES_PER_NM / HARVEST_STEP_NM)) * HARVEST_STEP_NM
+
+
+_attempts = {}  # (aircraft, bucket) -> unix time of the last harvest attempt
+_attempts_lock = threading.Lock()
+
+
+def _harvest_in_background(aircraft_type, bucket):
+    try:
+        harvest_point(aircraft_type, bucket)
+    except Exception as e:
+        logger.info("Fuel API harvest for %s at %s NM failed: %s", aircraft_type, bucket, e)
+    finally:
+        connections.close_all()
+
+
+def schedule_refresh(aircraft_type, distance_miles):
+    """Harvest the distance's bucket in the background if it is missing or stale"""
+    bucket = harvest_bucket(distance_miles)
+    curve = get_fuel_curves().get(aircraft_type)
+    now = time.time()
+    harvested_at = curve.harvested.get(float(bucket)) if curve else None
+    if harvested_at is not None and now - harvested_at < REFRESH_AFTER:
+        return False
+    key = (aircraft_type, bucket)
+    with _attempts_lock:
+        if now - _attempts.get(key, 0) < RETRY_AFTER:
+            return False
+        _attempts[key] = now
+    get_executor().submit(_harvest_in_background, aircraft_type, bucket)
+    return True
+
+
+post_save.connect(invalidate_fuel_curves, sender=FuelEfficiency, dispatch_uid='fuel_curves_save')
+post_delete.connect(invalidate_fuel_curves, sender=FuelEfficiency, dispatch_uid='fuel_curves_delete')
@@ -0,0 +1,123 @@
+"""
+Great-circle geometry on a spherical Earth, as NumPy kernels.
+
+Every function takes latitudes and longitudes in degrees as scalars or
+arrays and broadcasts them like NumPy operators do, so a distance between
+two airports, from one airport to all others, or along every leg of a route
+is the same call. Scalar inputs give a Python float back. Distances come in
+kilometres unless another ``radius`` is passed (EARTH_RADIUS_MILES for
+miles); bearings are in degrees clockwise from north.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_MILES = 3959.0
+MILES_PER_KM = 0.621371
+
+
+def _result(values):
+    """Python float for 0-d results, the array otherwise"""
+    return float(values) if np.ndim(values) == 0 else values
+
+
+def central_angle(lat1, lon1, lat2, lon2):
+    """Angle in radians subtended at the Earth's centre (haversine formula)"""
+    phi1, lam1, phi2, lam2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_KM):
+    """Great-circle distance between points, element-wise with broadcasting"""
+    return _result(radius * central_angle(lat1, lon1, lat2, lon2))
+
+
+def distance_matrix(lats1, lons1, lats2=None, lons2=None, radius=EARTH_RADIUS_KM):
+    """len(lats1) x len(lats2) distances between two point sets (the first with itself by default)"""
+    lats1, lons1 = np.asarray(lats1, dtype=float), np.asarray(lons1, dtype=float)
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+    lats2, lons2 = np.asarray(lats2, dtype=float), np.asarray(lons2, dtype=float)
+    return radius * central_angle(lats1[:, None], lons1[:, None], lats2[None, :], lons2[None, :])
+
+
+def leg_lengths(coordinates, radius=EARTH_RADIUS_KM):
+    """Length of every leg of a path given as [[lat, lon], ...]"""
+    points = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(points) < 2:
+        return np.zeros(0)
+    return radius * central_angle(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+
+
+def route_length(coordinates, radius=EARTH_RADIUS_KM):
+    """Total length of a path given as [[lat, lon], ...]"""
+    return float(leg_lengths(coordinates, radius).sum())
+
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    """Initial course from the first point towards the second, in [0, 360)"""
+    phi1, lam1, phi2, lam2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    y = np.sin(lam2 - lam1) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(lam2 - lam1)
+    return _result(np.degrees(np.arctan2(y, x)) % 360.0)
+
+
+def intermediate_points(lat1, lon1, lat2, lon2, fractions):
+    """(lats, lons) of the points at ``fractions`` (0 = start, 1 = end) of one great circle"""
+    fractions = np.asarray(fractions, dtype=float)
+    phi1, lam1, phi2, lam2 = np.radians([lat1, lon1, lat2, lon2])
+    delta = central_angle(lat1, lon1, lat2, lon2)
+    if delta == 0:
+        return np.full(fractions.shape, float(lat1)), np.full(fractions.shape, float(lon1))
+    a = np.sin((1 - fractions) * delta) / np.sin(delta)
+    b = np.sin(fractions * delta) / np.sin(delta)
+    x = a * np.cos(phi1) * np.cos(lam1) + b * np.cos(phi2) * np.cos(lam2)
+    y = a * np.cos(phi1) * np.sin(lam1) + b * np.cos(phi2) * np.sin(lam2)
+    z = a * np.sin(phi1) + b * np.sin(phi2)
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+
+def cross_track_distance(lat, lon, lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_KM):
+    """Signed distance of points from the great circle through two others (negative = left of it)"""
+    delta13 = central_angle(lat1, lon1, lat, lon)
+    theta13 = np.radians(initial_bearing(lat1, lon1, lat, lon))
+    theta12 = np.radians(initial_bearing(lat1, lon1, lat2, lon2))
+    return _result(radius * np.arcsin(np.clip(np.sin(delta13) * np.sin(theta13 - theta12), -1.0, 1.0)))
+
+
+def bounding_box(lat, lon, distance, radius=EARTH_RADIUS_KM):
+    """(min lat, max lat, [(min lon, max lon), ...]) enclosing every point within ``distance``
+
+    The longitude ranges are split in two where the box crosses the
+    antimeridian, and cover all longitudes when it reaches a pole.
+    """
+    angle = np.degrees(distance / radius)
+    min_lat, max_lat = lat - angle, lat + angle
+    if min_lat <= -90 or max_lat >= 90 or angle >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    # Widest longitude span of a circle of that angular radius, at its tangent latitude
+    lon_angle = np.degrees(np.arcsin(min(1.0, np.sin(np.radians(angle)) / np.cos(np.radians(lat)))))
+    min_lon, max_lon = lon - lon_angle, lon + lon_angle
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+class PointSet:
+    """Coordinates prepared once for repeated one-to-all distance queries"""
+
+    def __init__(self, lats, lons):
+        self.phi = np.radians(np.asarray(lats, dtype=float))
+        self.lam = np.radians(np.asarray(lons, dtype=float))
+        self.cos_phi = np.cos(self.phi)
+
+    def __len__(self):
+        return len(self.phi)
+
+    def distances_from(self, i, radius=EARTH_RADIUS_KM):
+        """Distances from point ``i`` to every point"""
+        a = (np.sin((self.phi - self.phi[i]) / 2) ** 2
+             + self.cos_phi[i] * self.cos_phi * np.sin((self.lam - self.lam[i]) / 2) ** 2)
+        return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,66 @@
+"""
+Incremental reader for files holding one large JSON array.
+
+Elements are decoded one at a time from a fixed-size read buffer, so memory
+stays proportional to the largest element rather than to the whole file.
+"""
+import json
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+# Characters that may continue a number cut off at the end of the buffer
+NUMBER_TAIL = '0123456789.eE+-'
+
+
+def iter_json_array(fp, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the elements of the top-level JSON array in a text file object"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    state = 'start'  # start -> first -> (value -> separator)* -> done
+
+    while True:
+        # Skip whitespace, reading more input when the buffer runs dry
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = fp.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of input inside JSON array")
+        char = buffer[pos]
+
+        if state == 'start':
+            if char != '[':
+                raise ValueError("Expected a JSON array")
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'separator') and char == ']':
+            return
+        elif state == 'separator':
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' at offset {pos} of the current buffer")
+            pos += 1
+            state = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number that reaches the end of the buffer may continue in the next chunk
+                complete = eof or (end < len(buffer) and buffer[end] not in NUMBER_TAIL)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = fp.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield value
+            pos = end
+            state = 'separator'
+            if pos >= chunk_size:
+                buffer, pos = buffer[pos:], 0
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from FILGHT.air_traffic import RateLimited, fetch_states, publish_snapshot, snapshot_path
+
+
+class Command(BaseCommand):
+    help = "Poll OpenSky state vectors and publish them as the shared air traffic snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=30, help="seconds between polls")
+        parser.add_argument('--once', action='store_true', help="publish one snapshot and exit")
+        parser.add_argument('--bbox', type=float, nargs=4, metavar=('LAMIN', 'LOMIN', 'LAMAX', 'LOMAX'),
+                            help="only ingest state vectors inside this box")
+
+    def handle(self, *args, **options):
+        # Authenticated OpenSky accounts get a higher rate limit
+        username = os.environ.get('OPENSKY_USERNAME')
+        auth = (username, os.environ.get('OPENSKY_PASSWORD', '')) if username else None
+        interval = options['interval']
+        self.stdout.write(f"Publishing air traffic to {snapshot_path()} every {interval}s")
+        while True:
+            started = time.monotonic()
+            delay = interval
+            try:
+                snapshot_time, states = fetch_states(options['bbox'], auth=auth)
+                publish_snapshot(states, snapshot_time)
+                self.stdout.write(
+                    f"{len(states)} state vectors at {snapshot_time} "
+                    f"({time.monotonic() - started:.2f}s)"
+                )
+            except RateLimited as e:
+                self.stderr.write(str(e))
+                delay = max(interval, e.seconds)
+            except Exception as e:
+                # Keep the previous snapshot; readers see its age grow
+                self.stderr.write(f"Air traffic poll failed: {e}")
+            if options['once']:
+                return
+            time.sleep(max(0.0, delay - (time.monotonic() - started)))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from FILGHT.fuel_model import HARVEST_STEP_NM, harvest_point, load_bundled_curves
+from FILGHT.models import FuelEfficiency
+
+
+class Command(BaseCommand):
+    help = "Load the bundled fuel curves into FuelEfficiency and optionally harvest the fuel API"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aircraft', action='append', help="only this aircraft code (repeatable)")
+        parser.add_argument('--harvest', action='store_true', help="query the fuel API on the distance grid")
+        parser.add_argument('--max-distance', type=float, default=6500, help="harvest up to this many NM")
+
+    def handle(self, *args, **options):
+        curves = load_bundled_curves()
+        aircraft_types = options['aircraft'] or list(curves)
+        for aircraft in aircraft_types:
+            curve = curves.get(aircraft)
+            if curve is not None:
+                self.load_bundled(curve)
+            if options['harvest']:
+                self.harvest(aircraft, options['max_distance'])
+
+    def load_bundled(self, curve):
+        # Points harvested from the API are more accurate than the bundled table; keep them
+        harvested = set(
+            FuelEfficiency.objects.filter(aircraft_type=curve.aircraft_type, source='upstream')
+            .values_list('distance', flat=True)
+        )
+        rows = [
+            FuelEfficiency(
+                aircraft_type=curve.aircraft_type, distance=distance, fuel_consumption=fuel,
+                emissions=emissions, model=curve.model, icao_code=curve.icao_code, code=curve.code,
+                source='bundled',
+            )
+            for distance, fuel, emissions in zip(curve.distances, curve.fuel, curve.emissions)
+            if distance > 0 and distance not in harvested
+        ]
+        FuelEfficiency.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['aircraft_type', 'distance'],
+            update_fields=['fuel_consumption', 'emissions', 'model', 'icao_code', 'code', 'source'],
+        )
+        self.stdout.write(f"{curve.aircraft_type}: loaded {len(rows)} bundled points")
+
+    def harvest(self, aircraft, max_distance):
+        found = 0
+        distance = HARVEST_STEP_NM
+        while distance <= max_distance:
+            try:
+                found += harvest_point(aircraft, distance)
+            except Exception as e:
+                self.stderr.write(f"{aircraft} @ {distance} NM: {e}")
+            distance += HARVEST_STEP_NM
+        self.stdout.write(f"{aircraft}: harvested {found} points from the fuel API")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from FILGHT.flight_recompute import BATCH_SIZE, CHUNK_SIZE, recompute_flights
+from FILGHT.models import DEFAULT_FUEL_PRICE_PER_GALLON, Flight
+
+
+class Command(BaseCommand):
+    help = "Recompute every flight's distance, duration, fuel and total cost and arrival time in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fuel-price', type=float, default=DEFAULT_FUEL_PRICE_PER_GALLON,
+                            help="fuel price per gallon")
+        parser.add_argument('--aircraft', action='append', help="only flights of this aircraft type (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="flights computed at once")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="flights per executemany() call")
+
+    def handle(self, *args, **options):
+        flights = Flight.objects.all()
+        if options['aircraft']:
+            flights = flights.filter(aircraft_type__in=options['aircraft'])
+        stats = recompute_flights(
+            flights, fuel_price_per_gallon=options['fuel_price'],
+            chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            f"{stats['rows']} flights recomputed, {stats['updated']} updated "
+            f"in {stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+        )
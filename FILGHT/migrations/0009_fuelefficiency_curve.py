@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FILGHT', '0008_aircraftprofile_remove_route_fuel_efficiency_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FuelEfficiency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aircraft_type', models.CharField(max_length=50)),
+                ('distance', models.FloatField()),
+                ('fuel_consumption', models.FloatField()),
+                ('emissions', models.FloatField(blank=True, null=True)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('icao_code', models.CharField(blank=True, max_length=10)),
+                ('code', models.CharField(blank=True, max_length=10)),
+                ('source', models.CharField(default='bundled', max_length=20)),
+                ('timestamp', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['aircraft_type', 'distance'],
+                'unique_together': {('aircraft_type', 'distance')},
+            },
+        ),
+    ]
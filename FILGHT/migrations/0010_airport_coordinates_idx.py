@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FILGHT', '0009_fuelefficiency_curve'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airport',
+            index=models.Index(fields=['latitude', 'longitude'], name='airport_coordinates_idx'),
+        ),
+    ]
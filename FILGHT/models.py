@@ -1,7 +1,71 @@
 from django.db import models
 import math
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import ASin, Coalesce, Cos, Least, Power, Radians, Sin, Sqrt
 from datetime import time, timedelta
 
+from . import geodesy
+
+NEAREST_START_KM = 200  # first search radius of AirportQuerySet.nearest(), doubled until enough airports are found
+
+def _coordinates(point):
+    """(latitude, longitude) of an Airport or a (lat, lon) pair"""
+    if isinstance(point, Airport):
+        return point.latitude, point.longitude
+    latitude, longitude = point
+    return float(latitude), float(longitude)
+
+class AirportQuerySet(models.QuerySet):
+    """Distance queries that only read the airports inside a lat/lon bounding box"""
+
+    def in_bounding_box(self, point, distance_km):
+        """Airports in the lat/lon box around every point within ``distance_km``; uses the coordinate index"""
+        latitude, longitude = _coordinates(point)
+        min_lat, max_lat, lon_ranges = geodesy.bounding_box(latitude, longitude, distance_km)
+        queryset = self.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        if lon_ranges != [(-180.0, 180.0)]:
+            spans = Q()
+            for min_lon, max_lon in lon_ranges:
+                spans |= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+            queryset = queryset.filter(spans)
+        return queryset
+
+    def annotate_distance_from(self, point, name='distance'):
+        """Great-circle distance in km from ``point``, computed in SQL as ``name``"""
+        latitude, longitude = _coordinates(point)
+        phi, lam = Radians(F('latitude')), Radians(F('longitude'))
+        phi0, lam0 = math.radians(latitude), math.radians(longitude)
+        a = (Power(Sin((phi - Value(phi0)) / 2), 2)
+             + Value(math.cos(phi0)) * Cos(phi) * Power(Sin((lam - Value(lam0)) / 2), 2))
+        distance = Value(2 * geodesy.EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+        return self.annotate(**{name: distance})
+
+    def within_radius(self, point, distance_km, name='distance'):
+        """Airports at most ``distance_km`` from ``point``, with that distance annotated"""
+        return (self.in_bounding_box(point, distance_km)
+                .annotate_distance_from(point, name)
+                .filter(**{f'{name}__lte': distance_km}))
+
+    def nearest(self, point, k=1, name='distance'):
+        """The ``k`` airports closest to ``point``, nearest first, with their distance annotated
+
+        The search box grows from NEAREST_START_KM until it holds ``k``
+        airports; the k-th of their distances then bounds the exact query.
+        """
+        if k < 1:
+            return self.none()
+        distance_km = NEAREST_START_KM
+        while True:
+            candidates = self.in_bounding_box(point, distance_km)
+            if distance_km >= math.pi * geodesy.EARTH_RADIUS_KM or candidates[k - 1:k].exists():
+                break
+            distance_km *= 2
+        distances = sorted(candidates.annotate_distance_from(point, name).values_list(name, flat=True))
+        if not distances:
+            return self.none()
+        bound = distances[min(k, len(distances)) - 1]
+        return self.within_radius(point, bound, name).order_by(name)[:k]
+
 class Airport(models.Model):
     code = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
@@ -13,23 +77,19 @@ class Airport(models.Model):
     
     type = models.CharField(max_length=50, blank=True)
 
+    objects = AirportQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['latitude', 'longitude'], name='airport_coordinates_idx')]
+
     def __str__(self):
         return f"{self.code} - {self.name}"
     
     def distance_to(self, other_airport):
         """Calculate distance between two airports using Haversine formula"""
-        R = 3959  # Earth's radius in miles
-        
-        lat1, lon1 = math.radians(self.latitude), math.radians(self.longitude)
-        lat2, lon2 = math.radians(other_airport.latitude), math.radians(other_airport.longitude)
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
+        return geodesy.haversine(self.latitude, self.longitude,
+                                 other_airport.latitude, other_airport.longitude,
+                                 radius=geodesy.EARTH_RADIUS_MILES)
 class AircraftProfile(models.Model):
     hex_code = models.CharField(max_length=10, unique=True)
     type = models.CharField(max_length=100)
@@ -49,6 +109,59 @@ class OperationalConstraint(models.Model):
     def __str__(self):
         return f"{self.constraint_type} for {self.aircraft.registration}"
 
+class FuelEfficiency(models.Model):
+    """One point of an aircraft's fuel-vs-distance curve"""
+    aircraft_type = models.CharField(max_length=50)  # code the fuel API is queried with
+    distance = models.FloatField()  # nautical miles
+    fuel_consumption = models.FloatField()  # kg
+    emissions = models.FloatField(null=True, blank=True)  # kg CO2
+    model = models.CharField(max_length=100, blank=True)
+    icao_code = models.CharField(max_length=10, blank=True)
+    code = models.CharField(max_length=10, blank=True)
+    source = models.CharField(max_length=20, default='bundled')  # 'bundled' or 'upstream'
+    timestamp = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.aircraft_type} @ {self.distance} NM: {self.fuel_consumption} kg"
+
+    class Meta:
+        unique_together = ('aircraft_type', 'distance')
+        ordering = ['aircraft_type', 'distance']
+
+# Per-aircraft fuel burn (gallons per mile) and average speed (mph) used to cost
+# and time flights; other aircraft get the defaults
+AIRCRAFT_FUEL_PER_MILE = {
+    'Boeing 737': 0.2,
+    'Airbus A320': 0.18,
+    'Boeing 777': 0.25,
+    'Airbus A380': 0.3,
+}
+DEFAULT_FUEL_PER_MILE = 0.2
+AIRCRAFT_SPEED_MPH = {
+    'Boeing 737': 550,
+    'Airbus A320': 540,
+    'Boeing 777': 560,
+    'Airbus A380': 570,
+}
+DEFAULT_SPEED_MPH = 550
+DEFAULT_FUEL_PRICE_PER_GALLON = 3.50
+
+class FlightQuerySet(models.QuerySet):
+    def with_airports(self):
+        """Flights with their origin and destination airports joined in, for listing many at once"""
+        return self.select_related('origin', 'destination')
+
+    def with_scores(self):
+        """Flights annotated with operational_constraint_score, counted in the same query
+
+        Constraints belong to aircraft profiles, matched on the flight's
+        aircraft type. Weather conditions and safety factors are no longer
+        linked to flights (migration 0008), so they have no score.
+        """
+        constraints = OperationalConstraint.objects.filter(aircraft__type=OuterRef('aircraft_type')).order_by()
+        counts = constraints.values('aircraft__type').annotate(count=Count('id')).values('count')
+        return self.annotate(operational_constraint_score=Coalesce(Subquery(counts), 0))
+
 class Flight(models.Model):
     """Flight model representing flights between airports"""
     flight_number = models.CharField(max_length=10, unique=True)
@@ -65,20 +178,16 @@ class Flight(models.Model):
     airline = models.CharField(max_length=100, default='Generic Airlines')
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     currency = models.CharField(max_length=3, default='USD')
+
+    objects = FlightQuerySet.as_manager()
         
     def __str__(self):
         return f"{self.flight_number}: {self.origin.code} → {self.destination.code}"
     
-    def calculate_fuel_cost(self, fuel_price_per_gallon=3.50):
+    def calculate_fuel_cost(self, fuel_price_per_gallon=DEFAULT_FUEL_PRICE_PER_GALLON):
         """Calculate fuel cost based on distance and aircraft efficiency"""
         # Different aircraft have different fuel efficiency
-        efficiency_map = {
-            'Boeing 737': 0.2,  # gallons per mile
-            'Airbus A320': 0.18,
-            'Boeing 777': 0.25,
-            'Airbus A380': 0.3,
-        }
-        fuel_consumption_per_mile = efficiency_map.get(self.aircraft_type, 0.2)
+        fuel_consumption_per_mile = AIRCRAFT_FUEL_PER_MILE.get(self.aircraft_type, DEFAULT_FUEL_PER_MILE)
         fuel_consumption = self.distance * fuel_consumption_per_mile
         self.fuel_cost = fuel_consumption * fuel_price_per_gallon
         return self.fuel_cost
@@ -86,13 +195,7 @@ class Flight(models.Model):
     def calculate_duration(self):
         """Calculate flight duration based on distance and average speed"""
         # Different aircraft have different speeds
-        speed_map = {
-            'Boeing 737': 550,  # mph
-            'Airbus A320': 540,
-            'Boeing 777': 560,
-            'Airbus A380': 570,
-        }
-        avg_speed = speed_map.get(self.aircraft_type, 550)
+        avg_speed = AIRCRAFT_SPEED_MPH.get(self.aircraft_type, DEFAULT_SPEED_MPH)
         self.duration = self.distance / avg_speed
         return self.duration
     
@@ -123,39 +226,16 @@ class Flight(models.Model):
             'fuel_percentage': (fuel_cost / self.total_cost * 100) if self.total_cost > 0 else 0
         }
     
-    def get_weather_impact_score(self):
-        """Calculate total weather impact score"""
-        total_impact = 0
-        weather_count = self.weather_conditions.count()
-        
-        if weather_count > 0:
-            for weather in self.weather_conditions.all():
-                total_impact += weather.get_impact_score()
-            return total_impact / weather_count
-        return 0
-    
-    def get_safety_risk_score(self):
-        """Calculate total safety risk score"""
-        total_risk = 0
-        safety_count = self.safety_factors.count()
-        
-        if safety_count > 0:
-            for safety in self.safety_factors.all():
-                total_risk += safety.get_risk_score()
-            return total_risk / safety_count
-        return 0
-    
     def get_operational_constraint_score(self):
-        """Calculate total operational constraint impact"""
-        total_impact = 0
-        constraint_count = self.operational_constraints.count()
-        
-        if constraint_count > 0:
-            for constraint in self.operational_constraints.all():
-                if constraint.is_active_now():
-                    total_impact += constraint.impact_score
-            return total_impact / constraint_count
-        return 0
+        """Number of operational constraints on record for this flight's aircraft type
+
+        Flights loaded with with_scores() answer from the annotation instead
+        of a query each.
+        """
+        score = getattr(self, 'operational_constraint_score', None)
+        if score is None:
+            score = OperationalConstraint.objects.filter(aircraft__type=self.aircraft_type).count()
+        return score
     
     def get_complexity_score(self):
         """Calculate overall complexity score for high-dimensional optimization"""
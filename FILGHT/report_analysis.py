@@ -0,0 +1,150 @@
+"""
+Fuel-efficiency summaries and suggestions for flight reports, one or many.
+
+The fuel_efficiency entries of all reports in a request are flattened into
+one list, their numeric fields ("23.5 mpg", "1910.7 kg") are parsed into
+NumPy arrays once, and the threshold test, per-report figures and fleet-wide
+aggregates are computed on whole arrays. A fleet dashboard can therefore
+post hundreds of reports to /api/ask-ai/ in one request, as
+{"reports": [...]} or as NDJSON with one report per line.
+"""
+import json
+import re
+
+import numpy as np
+
+EFFICIENCY_THRESHOLD = 20  # efficiency below this gets the improvement suggestion
+MAX_REPORTS = 5000
+LOW_EFFICIENCY_SUGGESTION = "Consider reducing aircraft weight, optimizing cruise speed, improving engine maintenance, or using more efficient flight paths to increase fuel efficiency."
+GOOD_EFFICIENCY_SUGGESTION = "Fuel efficiency is good. Maintain current operational practices."
+NO_EFFICIENCY_SUGGESTION = "No efficiency figure to compare against the threshold."
+NO_DATA_SUMMARY = "No fuel efficiency data found."
+NO_DATA_SUGGESTION = "No suggestions available for fuel efficiency."
+NUMBER_RE = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+
+def parse_reports(body, content_type=""):
+    """(reports, batch) of an /api/ask-ai/ body: a report, {"reports": [...]} or NDJSON"""
+    if content_type.startswith(('application/x-ndjson', 'application/jsonl')):
+        lines = body.decode('utf-8').splitlines()
+        return [json.loads(line) for line in lines if line.strip()], True
+    data = json.loads(body)
+    if isinstance(data, dict) and isinstance(data.get('reports'), list):
+        return data['reports'], True
+    return [data], False
+
+
+def fuel_entries(report):
+    """The fuel_efficiency entries of one report, as sent by the report page or a client
+
+    Raises ValueError when the report is not shaped like one.
+    """
+    report = report.get('data', report)
+    if not isinstance(report, dict):
+        raise ValueError("Report data must be a JSON object.")
+    entries = report.get('fuel_efficiency') or []
+    if isinstance(entries, dict):
+        entries = [entries]  # full_report gives a single estimate
+    if not isinstance(entries, list):
+        raise ValueError("fuel_efficiency must be an object or a list of objects.")
+    return [entry for entry in entries if isinstance(entry, dict)]
+
+
+def leading_numbers(values, default=np.nan):
+    """Float array of the number each value starts with ("1910.7 kg" -> 1910.7)"""
+    numbers = np.full(len(values), default, dtype=float)
+    for i, value in enumerate(values):
+        if isinstance(value, (int, float)):
+            numbers[i] = value
+        elif isinstance(value, str):
+            match = NUMBER_RE.match(value)
+            if match:
+                numbers[i] = float(match.group(1))
+    return numbers
+
+
+def summary_line(entry):
+    return (
+        f"Aircraft type: {entry.get('aircraft_type', 'N/A')}, "
+        f"Efficiency: {entry.get('efficiency', entry.get('fuel_efficiency', 'N/A'))}, "
+        f"Fuel Consumption: {entry.get('fuel_consumption', 'N/A')}, "
+        f"Emissions: {entry.get('emissions', 'N/A')}"
+    )
+
+
+def _nan_stat(fn, values):
+    values = values[~np.isnan(values)]
+    return round(float(fn(values)), 2) if values.size else None
+
+
+def analyze_reports(reports):
+    """(per-report results, aggregate) of the fuel-efficiency analysis of ``reports``"""
+    results = [None] * len(reports)
+    valid = np.ones(len(reports), dtype=bool)
+    entries, owners = [], []
+    for i, report in enumerate(reports):
+        try:
+            if not isinstance(report, dict):
+                raise ValueError("Report must be a JSON object.")
+            report_entries = fuel_entries(report)
+        except ValueError as e:
+            results[i] = {"error": str(e)}
+            valid[i] = False
+            continue
+        entries.extend(report_entries)
+        owners.extend([i] * len(report_entries))
+
+    owners = np.asarray(owners, dtype=np.intp)
+    efficiency = leading_numbers([entry.get('efficiency') for entry in entries])
+    fuel = leading_numbers([entry.get('fuel_consumption') for entry in entries])
+    emissions = leading_numbers([entry.get('emissions') for entry in entries])
+    # Entries without a readable efficiency (e.g. full_report's kg/km estimate,
+    # whose scale runs the other way) are neither low nor good
+    readable = ~np.isnan(efficiency)
+    low = readable & (np.nan_to_num(efficiency) < EFFICIENCY_THRESHOLD)
+
+    size = len(reports)
+    counts = np.bincount(owners, minlength=size)
+    low_counts = np.bincount(owners, weights=low, minlength=size).astype(int)
+    efficiency_sums = np.bincount(owners[readable], weights=efficiency[readable], minlength=size)
+    efficiency_counts = np.bincount(owners[readable], minlength=size)
+    fuel_totals = np.bincount(owners, weights=np.nan_to_num(fuel), minlength=size)
+    emission_totals = np.bincount(owners, weights=np.nan_to_num(emissions), minlength=size)
+    suggestions = np.where(low, LOW_EFFICIENCY_SUGGESTION,
+                           np.where(readable, GOOD_EFFICIENCY_SUGGESTION, NO_EFFICIENCY_SUGGESTION))
+
+    # Entries are grouped by report in order, so each report's are one slice
+    ends = np.cumsum(counts)
+    for i in range(size):
+        if results[i] is not None:
+            continue
+        start, end = ends[i] - counts[i], ends[i]
+        if start == end:
+            results[i] = {"summary": NO_DATA_SUMMARY, "suggestions": NO_DATA_SUGGESTION}
+            continue
+        results[i] = {
+            "summary": "\n".join(summary_line(entry) for entry in entries[start:end]),
+            "suggestions": "\n".join(suggestions[start:end].tolist()),
+            "entries": int(counts[i]),
+            "low_efficiency_entries": int(low_counts[i]),
+            "mean_efficiency": round(float(efficiency_sums[i] / efficiency_counts[i]), 2) if efficiency_counts[i] else None,
+            "total_fuel_consumption": round(float(fuel_totals[i]), 2),
+            "total_emissions": round(float(emission_totals[i]), 2),
+        }
+
+    aggregate = {
+        "reports": size,
+        "invalid_reports": int(np.count_nonzero(~valid)),
+        "reports_without_data": int(np.count_nonzero((counts == 0) & valid)),
+        "entries": len(entries),
+        "low_efficiency_entries": int(np.count_nonzero(low)),
+        "entries_without_efficiency": int(np.count_nonzero(~readable)),
+        "reports_needing_attention": np.flatnonzero(low_counts).tolist(),
+        "efficiency_threshold": EFFICIENCY_THRESHOLD,
+        "mean_efficiency": _nan_stat(np.mean, efficiency),
+        "min_efficiency": _nan_stat(np.min, efficiency),
+        "max_efficiency": _nan_stat(np.max, efficiency),
+        "total_fuel_consumption": round(float(np.nansum(fuel)), 2),
+        "total_emissions": round(float(np.nansum(emissions)), 2),
+    }
+    return results, aggregate
@@ -85,6 +85,17 @@ DATABASES = {
 }
 
 
+# Shared by all worker processes on the host; see FILGHT/sqlite_cache.py
+CACHES = {
+    'default': {
+        'BACKEND': 'FILGHT.sqlite_cache.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_PATH', str(BASE_DIR / 'cache.sqlite3')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,6 +143,44 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Overall time budget for the upstream calls behind /api/full-report/
+FULL_REPORT_DEADLINE_SECONDS = float(os.environ.get('FULL_REPORT_DEADLINE_SECONDS', 8))
+
+# Longest a streamed chat answer may take before it is cut off with an error event
+CHAT_STREAM_DEADLINE_SECONDS = float(os.environ.get('CHAT_STREAM_DEADLINE_SECONDS', 60))
+
+# Chat slots and queue per worker process. Under threaded WSGI workers keep
+# slots + queue below the thread count, so chat bursts leave threads for the
+# other endpoints; further chats get 429 with a Retry-After estimate.
+CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', 4))
+CHAT_MAX_QUEUE = int(os.environ.get('CHAT_MAX_QUEUE', 16))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('CHAT_QUEUE_TIMEOUT_SECONDS', 30))
+# How long answers to repeated questions are served from the cache
+CHAT_CACHE_SECONDS = int(os.environ.get('CHAT_CACHE_SECONDS', 3600))
+# Estimated token budget of a chat prompt, and the share of it for airport,
+# route and last-report facts; earlier turns of the conversation fill the rest
+CHAT_PROMPT_TOKENS = int(os.environ.get('CHAT_PROMPT_TOKENS', 4000))
+CHAT_CONTEXT_TOKENS = int(os.environ.get('CHAT_CONTEXT_TOKENS', 600))
+
+# Serve the views that wait on upstream APIs from async_views; asgi.py turns this on
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Base URLs of the upstream APIs. Pointing UPSTREAM_STAND_IN_URL at upstream_standin.py
+# routes every upstream through the local record/replay stand-in instead.
+UPSTREAM_BASE_URLS = {
+    'open-meteo': os.environ.get('OPEN_METEO_BASE_URL', 'https://api.open-meteo.com'),
+    'opensky': os.environ.get('OPENSKY_BASE_URL', 'https://opensky-network.org'),
+    'fuel-api': os.environ.get('FUEL_API_BASE_URL', 'https://despouy.ca'),
+    'gemini': os.environ.get('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com'),
+    'qaoa': os.environ.get('QAOA_BASE_URL', 'http://127.0.0.1:8000'),
+}
+UPSTREAM_STAND_IN_URL = os.environ.get('UPSTREAM_STAND_IN_URL')
+if UPSTREAM_STAND_IN_URL:
+    UPSTREAM_BASE_URLS = {name: f"{UPSTREAM_STAND_IN_URL.rstrip('/')}/{name}" for name in UPSTREAM_BASE_URLS}
+
+# Where the ingest_air_traffic command publishes OpenSky state vectors for the web workers
+AIR_TRAFFIC_SNAPSHOT_PATH = os.environ.get('AIR_TRAFFIC_SNAPSHOT_PATH', str(BASE_DIR / 'air_traffic.npz'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
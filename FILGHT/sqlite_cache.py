@@ -0,0 +1,174 @@
+"""
+Django cache backend on a local SQLite file.
+
+Every worker process on the host opens the same file, so cached values are
+shared between workers and survive restarts without running a cache server.
+The file is in WAL mode, so readers never block on a writer. ``add`` is a
+single atomic statement, which makes it usable as a cross-process lock, and
+``incr`` runs in one write transaction, so it can serve as a shared counter.
+
+    CACHES = {'default': {'BACKEND': 'FILGHT.sqlite_cache.SQLiteCache',
+                          'LOCATION': '/path/to/cache.sqlite3'}}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_EVERY = 100  # writes between checks for expired and excess entries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+)
+"""
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = str(location)
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        """One connection per thread, reopened after fork"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _expires(self, timeout):
+        """Absolute expiry time, None for no expiry, or a time in the past for timeout <= 0"""
+        return self.get_backend_timeout(timeout)
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        count = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self._max_entries:
+            # Drop the entries closest to expiry first; entries without expiry go last
+            connection.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)",
+                (max(1, count // self._cull_frequency),),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._connection().execute(
+            f"SELECT key, value, expires FROM cache WHERE key IN ({placeholders})", list(key_map)
+        ).fetchall()
+        now = time.time()
+        return {
+            key_map[key]: pickle.loads(value)
+            for key, value, expires in rows
+            if expires is None or expires > now
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)),
+        )
+        self._after_write()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", rows)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._after_write()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Store only if the key is absent or expired; True if this call stored it"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        cursor = connection.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout), time.time()),
+        )
+        self._after_write()
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Add ``delta`` to a stored number in one write transaction, so concurrent calls never lose a step"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                "UPDATE cache SET value = ? WHERE key = ?", (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self._expires(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
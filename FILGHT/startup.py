@@ -0,0 +1,21 @@
+"""
+Warm-up for the lazily initialized datasets.
+
+Nothing expensive runs at import time: the airport store, coordinate lookups
+and routing graph are built on first use. Under gunicorn with ``preload_app``
+(see gunicorn.conf.py) ``warm_up`` builds them once in the master, so forked
+workers inherit the pages instead of rebuilding them each.
+"""
+from django.db import connections
+
+
+def warm_up():
+    """Build the shared datasets now instead of on the first request"""
+    from .airport_store import get_airport_store
+    from .views import get_route_graph
+
+    store = get_airport_store()
+    get_route_graph()
+    # Never hand an open database connection to forked workers
+    connections.close_all()
+    return len(store)
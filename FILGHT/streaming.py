@@ -0,0 +1,59 @@
+"""
+Incremental JSON serialization for whole-table exports.
+
+Rows are read with ``values_list().iterator()`` and encoded one at a time, so
+neither model instances nor the full encoded document are ever held in memory.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+DEFAULT_CHUNK_SIZE = 2000
+# Encoded rows are buffered up to this size before being handed to the server
+FLUSH_BYTES = 64 * 1024
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def iter_json_rows(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield each row of a queryset as an encoded JSON object
+
+    ``fields`` is either a list of field names or a dict mapping output keys
+    to ORM lookups (e.g. ``{'origin': 'origin__code'}``).
+    """
+    if isinstance(fields, dict):
+        keys, lookups = list(fields.keys()), list(fields.values())
+    else:
+        keys = lookups = list(fields)
+    for row in queryset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        yield _encoder.encode(dict(zip(keys, row)))
+
+
+def iter_json_array(items, wrapper_key=None):
+    """Join encoded JSON items into an array, yielding UTF-8 chunks as they fill up"""
+    if wrapper_key:
+        head, tail = '{' + _encoder.encode(wrapper_key) + ':[', ']}'
+    else:
+        head, tail = '[', ']'
+    # Send the opening bracket straight away so the first byte is not held back
+    yield head.encode('utf-8')
+    buffer = []
+    size = 0
+    first = True
+    for item in items:
+        if not first:
+            buffer.append(',')
+        first = False
+        buffer.append(item)
+        size += len(item) + 1
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    buffer.append(tail)
+    yield ''.join(buffer).encode('utf-8')
+
+
+def streaming_json_response(queryset, fields, wrapper_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """StreamingHttpResponse emitting ``queryset`` as a JSON array in constant memory"""
+    chunks = iter_json_array(iter_json_rows(queryset, fields, chunk_size), wrapper_key)
+    return StreamingHttpResponse(chunks, content_type='application/json')
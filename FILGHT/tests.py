@@ -0,0 +1,67 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+from .flight_recompute import recompute_flights
+from .models import AircraftProfile, Airport, Flight, OperationalConstraint
+from .views import airport_codes
+
+
+class FlightScoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        jfk = Airport.objects.create(code='JFK', name='John F. Kennedy International', latitude=40.6413, longitude=-73.7781)
+        lax = Airport.objects.create(code='LAX', name='Los Angeles International', latitude=33.9416, longitude=-118.4085)
+        for hex_code, aircraft_type, constraints in [('A1B2C3', 'Boeing 737', 2), ('D4E5F6', 'Boeing 737', 1), ('0A0B0C', 'Airbus A320', 1)]:
+            profile = AircraftProfile.objects.create(
+                hex_code=hex_code, type=aircraft_type, operator='Test Air', registration=hex_code, country='US'
+            )
+            for i in range(constraints):
+                OperationalConstraint.objects.create(aircraft=profile, constraint_type=f'Max Weight {i}', value=70000)
+        for i, aircraft_type in enumerate(['Boeing 737', 'Airbus A320', 'Boeing 777'] * 4):
+            Flight.objects.create(
+                flight_number=f'TA{i}', origin=jfk, destination=lax, departure_time=time(8, 0), arrival_time=time(14, 0),
+                duration=timedelta(hours=6), distance=2475, aircraft_type=aircraft_type,
+            )
+
+    def test_listing_flights_with_scores_is_one_query(self):
+        with self.assertNumQueries(1):
+            listed = [
+                (str(flight), flight.get_operational_constraint_score())
+                for flight in Flight.objects.with_airports().with_scores()
+            ]
+        self.assertEqual(len(listed), 12)
+
+    def test_annotated_scores_match_per_flight_scores(self):
+        expected = {'Boeing 737': 3, 'Airbus A320': 1, 'Boeing 777': 0}
+        for flight in Flight.objects.with_scores():
+            self.assertEqual(flight.get_operational_constraint_score(), expected[flight.aircraft_type])
+        for flight in Flight.objects.all():
+            self.assertEqual(flight.get_operational_constraint_score(), expected[flight.aircraft_type])
+
+
+class RecomputeFlightsTests(TestCase):
+    def test_total_cost_follows_recomputed_fuel_cost(self):
+        jfk = Airport.objects.create(code='JFK', name='John F. Kennedy International', latitude=40.6413, longitude=-73.7781)
+        lax = Airport.objects.create(code='LAX', name='Los Angeles International', latitude=33.9416, longitude=-118.4085)
+        flight = Flight.objects.create(
+            flight_number='TA1', origin=jfk, destination=lax, departure_time=time(8, 0), arrival_time=time(8, 0),
+            duration=timedelta(0), distance=0, base_cost=Decimal('1234.56'), fuel_cost=0, total_cost=Decimal('1234.56'),
+        )
+        stats = recompute_flights(fuel_price_per_gallon=3.80)
+        flight.refresh_from_db()
+        self.assertEqual(stats['updated'], 1)
+        self.assertGreater(flight.fuel_cost, 0)
+        self.assertEqual(flight.base_cost, Decimal('1234.56'))
+        self.assertEqual(flight.total_cost, flight.base_cost + flight.fuel_cost)
+        self.assertEqual(recompute_flights(fuel_price_per_gallon=3.80)['updated'], 0)
+
+
+class AirportCodesTests(TestCase):
+    def test_ids_are_parsed_once_and_bounded(self):
+        jfk = Airport.objects.create(code='JFK', name='John F. Kennedy International', latitude=40.6413, longitude=-73.7781)
+        self.assertEqual(airport_codes(jfk.pk, str(jfk.pk)), ('JFK', 'JFK'))
+        self.assertEqual(airport_codes(f'0{jfk.pk}', None), ('JFK', None))
+        for bad in ['99999999999999999999999', '\u00b2', 'abc', '', '-1', None]:
+            self.assertEqual(airport_codes(bad, jfk.pk), (None, 'JFK'))
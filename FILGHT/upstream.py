@@ -0,0 +1,256 @@
+"""
+Shared HTTP client for every upstream API.
+
+One requests.Session per process keeps a keep-alive connection pool per
+host. Calls get a default timeout, bounded retries with jittered exponential
+backoff, and a circuit breaker per upstream: after repeated failures the
+upstream is skipped for a cool-down period and calls fail fast with
+UpstreamUnavailable (a requests.RequestException, so existing handlers still
+apply). Inside deadline(), timeouts and retries are cut short so no call
+outlives its caller's budget. Connection reuse and breaker state are exposed
+through upstream_metrics().
+"""
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+POOL_CONNECTIONS = 16  # hosts kept in the pool manager
+POOL_MAXSIZE = 32  # keep-alive connections per host
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+# Responses worth retrying; other statuses are returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+MIN_ATTEMPT_SECONDS = 0.1  # a retry needs at least this much of the deadline left
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """Raised without contacting the upstream while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half-open'
+            if self.state == 'half-open' and not self._trial_in_flight:
+                # Let exactly one trial call through
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial that was abandoned without an outcome"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_breakers = defaultdict(CircuitBreaker)
+_counters = defaultdict(lambda: defaultdict(int))
+_state_lock = threading.Lock()
+_deadline = threading.local()
+
+
+def get_session():
+    """Process-wide pooled session, recreated after fork so workers never share sockets"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+                _session_pid = os.getpid()
+    return _session
+
+
+def url(upstream, path):
+    """Absolute URL of ``path`` on an upstream, honouring settings.UPSTREAM_BASE_URLS"""
+    return settings.UPSTREAM_BASE_URLS[upstream].rstrip('/') + path
+
+
+def get_breaker(upstream):
+    with _state_lock:
+        return _breakers[upstream]
+
+
+def _count(upstream, counter, amount=1):
+    with _state_lock:
+        _counters[upstream][counter] += amount
+
+
+@contextmanager
+def deadline(seconds):
+    """Cap the timeouts and retries of this thread's upstream calls to ``seconds`` from now"""
+    previous = getattr(_deadline, 'at', None)
+    at = time.monotonic() + seconds
+    _deadline.at = at if previous is None else min(at, previous)
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def time_left():
+    """Seconds until this thread's deadline, or None outside deadline()"""
+    at = getattr(_deadline, 'at', None)
+    return None if at is None else at - time.monotonic()
+
+
+def _capped(timeout, remaining):
+    """``timeout`` (a number or a (connect, read) pair) shortened to ``remaining`` seconds"""
+    if remaining is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _has_time_for_retry():
+    remaining = time_left()
+    return remaining is None or remaining > MIN_ATTEMPT_SECONDS
+
+
+def request(upstream, method, url, timeout=DEFAULT_TIMEOUT, retries=None, **kwargs):
+    """Send a request to a named upstream through the shared pool
+
+    ``retries`` defaults to 2 for idempotent methods and 0 otherwise, so a
+    POST is never sent twice unless the caller asks for it.
+    """
+    method = method.upper()
+    if retries is None:
+        retries = 2 if method in IDEMPOTENT_METHODS else 0
+    breaker = get_breaker(upstream)
+    if not breaker.allow():
+        _count(upstream, 'short_circuited')
+        raise UpstreamUnavailable(f"{upstream} is unavailable (circuit open)")
+
+    session = get_session()
+    attempt = 0
+    settled = False
+    try:
+        while True:
+            remaining = time_left()
+            if remaining is not None and remaining <= 0:
+                # Out of time before the call went out: not the upstream's fault
+                _count(upstream, 'deadline_exceeded')
+                raise requests.Timeout(f"{upstream}: deadline exceeded")
+            _count(upstream, 'requests')
+            try:
+                response = session.request(method, url, timeout=_capped(timeout, remaining), **kwargs)
+            except requests.RequestException as e:
+                retryable = attempt < retries and _has_time_for_retry()
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    settled = True
+                    breaker.record_success()
+                    return response
+                if attempt >= retries or not _has_time_for_retry():
+                    # The upstream answered, but with an overload or server error
+                    settled = True
+                    _count(upstream, 'failures')
+                    breaker.record_failure()
+                    return response
+                retryable = True
+                error = None
+            if not retryable:
+                settled = True
+                _count(upstream, 'failures')
+                breaker.record_failure()
+                raise error
+            attempt += 1
+            _count(upstream, 'retries')
+            pause = _backoff(attempt)
+            remaining = time_left()
+            time.sleep(pause if remaining is None else max(0.0, min(pause, remaining)))
+    finally:
+        if not settled:
+            # Anything else (an unexpected exception, the deadline, an interrupt)
+            # must not leave a half-open breaker waiting for this trial forever
+            breaker.release()
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, 'GET', url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, 'POST', url, **kwargs)
+
+
+def upstream_metrics():
+    """Per-upstream counters and breaker state, plus connection reuse per host"""
+    with _state_lock:
+        upstreams = {
+            name: {
+                **dict(_counters[name]),
+                'breaker': {'state': breaker.state, 'consecutive_failures': breaker.failures},
+            }
+            for name, breaker in _breakers.items()
+        }
+    hosts = {}
+    if _session is not None and _session_pid == os.getpid():
+        pool_manager = _session.get_adapter('https://').poolmanager
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            opened = pool.num_connections
+            sent = pool.num_requests
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'connections_opened': opened,
+                'requests_sent': sent,
+                'connections_reused': max(sent - opened, 0),
+            }
+    return {'upstreams': upstreams, 'hosts': hosts}
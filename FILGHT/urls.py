@@ -14,29 +14,42 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from . import views
 # from django.contrib.auth import views as auth_views
 
+# Views that mostly wait on upstream APIs, async when served under ASGI
+if settings.ASYNC_VIEWS:
+    from . import async_views as upstream_views
+else:
+    upstream_views = views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/all_ airports/', views.api_airports, name='api_airports'),
     path('', views.home, name='home'),
-    path('optimize/', views.OptimizeView.as_view(), name='optimize'),
+    path('optimize/', upstream_views.OptimizeView.as_view(), name='optimize'),
     path('choices/', views.choices_view, name='choices'),
     path('map/', views.map_view, name='map'),
     # path('turbulence/', views.turbulence, name='turbulence'),
     path('api/stops/', views.api_stops, name='api_stops'),
     path('api/all_airports/', views.api_all_airports, name='api_all_airports'),
+    path('api/airports/feed/', views.api_airport_feed, name='api_airport_feed'),
     path('report/', views.report, name='Report'),
-    path('api/full-report/', views.full_report, name='full_report'),
+    path('api/full-report/', upstream_views.full_report, name='full_report'),
 
     path('chat-bot/', views.chat_bot, name='chat_bot'),
-    path('api/chat-gemini/', views.chat_gemini_api, name='chat_gemini_api'),
+    path('api/chat-gemini/', upstream_views.chat_gemini_api, name='chat_gemini_api'),
     path('api/ask-ai/', views.api_ask_ai, name='api_ask_ai'),
+    path('api/chat-queue/', views.api_chat_queue, name='api_chat_queue'),
+
+    path('api/air_traffic/', views.api_air_traffic, name='api_air_traffic'),
+    path('api/upstream-metrics/', views.api_upstream_metrics, name='api_upstream_metrics'),
 
     path('api/qaoa-predict/', views.QAOAPredictView.as_view(), name='api-qaoa-predict'),
     path('api/flights/', views.api_flights, name='api_flights'),
     path('api/flight/', views.api_flights, name='api_flight'),
+    path('api/flights/export/', views.api_flights_export, name='api_flights_export'),
 ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from rest_framework.decorators import api_view
@@ -7,16 +8,24 @@ from rest_framework.response import Response
 from django.shortcuts import render
 from django.http import JsonResponse
 import requests
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import cache_page, never_cache
 from django.views.decorators.http import require_http_methods
 from .models import Airport, Flight
 from .api_utils import (
-    haversine_distance, get_forecast, get_fuel_efficiency, safety_report_view, search_airports,
-    simulate_safety_report, get_route_data, generate_boeing_747sr_fuel_data, fetch_fuel_efficiency,
+    get_forecast, get_fuel_efficiency, safety_report_view, search_airports,
+    simulate_safety_report, generate_boeing_747sr_fuel_data, fetch_fuel_efficiency,
     fetch_forecast, calculate_distance, fetch_aircraft_metrics, fetch_operational_constraints,
-    DEFAULT_AIRCRAFT_ICAO, AIRPORT_COORDINATES
+    DEFAULT_AIRCRAFT_ICAO, AIRPORT_COORDINATES, route_data_from_distance
+)
+from .caching import compute_once, swr_lookup, swr_refresh, swr_store
+from .fanout import fan_out
+from . import air_traffic, aircraft_constraints, chat_context, chat_pool, chat_stream, geodesy, report_analysis, upstream
+from .airport_store import get_airport_store
+from .streaming import streaming_json_response
+from .airport_feed import (
+    get_airport_feed, choose_encoding, feed_etag, feed_url, etag_matches, FEED_CONTENT_TYPE
 )
 from rest_framework.views import APIView
 import json
@@ -30,26 +39,6 @@ import numpy as np
 # import folium
 # from folium.plugins import MeasureControl
 
-# API endpoint for all airports
-@csrf_exempt
-def api_airports(request):
-    if request.method == 'GET':
-        from .models import Airport
-        airports = Airport.objects.all()
-        data = []
-        for airport in airports:
-            data.append({
-                'id': airport.id,
-                'name': airport.name,
-                'code': airport.code,
-                'city': airport.city,
-                'country': airport.country,
-                'latitude': airport.latitude,
-                'longitude': airport.longitude
-            })
-        return JsonResponse(data, safe=False)
-
-
 # API endpoint to return 3 routes: QAOA, Dijkstra, Alternative
 @api_view(['GET'])
 def api_flights(request):
@@ -79,17 +68,7 @@ def api_flights(request):
 
 def calculate_route_distance(route_coordinates):
     """Calculate total distance for a route"""
-    total_distance = 0
-    for i in range(len(route_coordinates) - 1):
-        lat1, lon1 = route_coordinates[i]
-        lat2, lon2 = route_coordinates[i + 1]
-        distance = haversine_distance(lat1, lon1, lat2, lon2)
-        total_distance += distance
-    return total_distance
-
-def api_stops(request):
-    stops = list(Airport.objects.all().values('code', 'name', 'latitude', 'longitude', 'country'))
-    return JsonResponse({'stops': stops})
+    return geodesy.route_length(route_coordinates)
 
 def estimate_flight_time(distance_km, avg_speed_kmh=800):
     """Estimate flight time based on distance and average speed"""
@@ -112,38 +91,55 @@ def calculate_total_cost(distance_km, base_cost_per_km=1.2):
     total_cost = fuel_cost + operational_cost
     return total_cost, fuel_cost
 
-AIRPORTS_JSON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'airports_cleaned.json')
-with open(AIRPORTS_JSON_PATH, 'r', encoding='utf-8') as f:
-    AIRPORTS = json.load(f)
-AIRPORT_CODES = [a['code'] for a in AIRPORTS]
-
-DIST_MATRIX = {}
-for a in AIRPORTS:
-    for b in AIRPORTS:
-        if a['code'] != b['code']:
-            dist = math.sqrt((a['latitude'] - b['latitude']) ** 2 + (a['longitude'] - b['longitude']) ** 2)
-            DIST_MATRIX[(a['code'], b['code'])] = dist
+_route_graph = None
+
+def get_route_graph():
+    """Airport codes, code index, coordinate columns and prepared points used for routing, built on first use"""
+    global _route_graph
+    if _route_graph is None:
+        store = get_airport_store()
+        codes = store.codes()
+        _route_graph = {
+            'codes': codes,
+            'index': {code: i for i, code in enumerate(codes)},
+            'latitudes': store.latitudes,
+            'longitudes': store.longitudes,
+            'points': geodesy.PointSet(store.latitudes, store.longitudes),
+        }
+    return _route_graph
 
 def home(request):
     return render(request, 'home.html')
 
-def dijkstra(start, end, codes, dist_matrix):
-    import heapq
-    graph = {code: [] for code in codes}
-    for (a, b), d in dist_matrix.items():
-        graph[a].append((b, d))
-    queue = [(0, start, [start])]
-    visited = set()
-    while queue:
-        cost, node, path = heapq.heappop(queue)
-        if node == end:
-            return path
-        if node in visited:
-            continue
-        visited.add(node)
-        for neighbor, weight in graph[node]:
-            if neighbor not in visited:
-                heapq.heappush(queue, (cost + weight, neighbor, path + [neighbor]))
+def dijkstra(start, end, graph):
+    """Shortest great-circle path over the complete airport graph, computing each node's edges on demand"""
+    index = graph['index']
+    if start not in index or end not in index:
+        return [start, end]
+    codes = graph['codes']
+    points = graph['points']
+    source, target = index[start], index[end]
+    dist = np.full(len(codes), np.inf)
+    prev = np.full(len(codes), -1)
+    visited = np.zeros(len(codes), dtype=bool)
+    dist[source] = 0.0
+    # Great-circle distance to the target never overestimates, so expanding by
+    # dist + remaining (A*) finds the same shortest path after far fewer nodes
+    remaining = points.distances_from(target)
+    for _ in range(len(codes)):
+        node = int(np.argmin(np.where(visited, np.inf, dist + remaining)))
+        if visited[node] or not np.isfinite(dist[node]):
+            break
+        if node == target:
+            path = [node]
+            while path[-1] != source:
+                path.append(int(prev[path[-1]]))
+            return [codes[i] for i in reversed(path)]
+        visited[node] = True
+        candidate = dist[node] + points.distances_from(node)
+        improved = ~visited & (candidate < dist)
+        dist[improved] = candidate[improved]
+        prev[improved] = node
     return [start, end]
 
 def find_alternatives(main_path, codes):
@@ -160,118 +156,140 @@ from django.views import View
 
 class OptimizeView(View):
     def get(self, request):
-        airports = Airport.objects.all()
-        return render(request, 'optimize.html', {'airports': airports})
+        # Airport options are filled client-side from the browser-cached airport feed
+        return render(request, 'optimize.html', {'airport_feed_url': feed_url(get_airport_feed())})
 
     def post(self, request):
-        if request.content_type == 'application/json':
-            data = json.loads(request.body)
-            origin_id = data.get('origin')
-            destination_id = data.get('destination')
-        else:
-            origin_id = request.POST.get('origin')
-            destination_id = request.POST.get('destination')
-
-        airports = Airport.objects.all()
-        airport_id_map = {str(a.id): a.code for a in airports}
-        origin = airport_id_map.get(origin_id)
-        destination = airport_id_map.get(destination_id)
-        
+        origin_id, destination_id = optimize_params(request)
+        origin, destination = airport_codes(origin_id, destination_id)
         if not origin or not destination or origin == destination:
-            response = {
-                'error': 'Invalid origin or destination',
-                'all_routes': [],
-            }
-            return JsonResponse(response)
+            return JsonResponse(INVALID_ROUTE_RESPONSE)
 
-        qubo_matrix = [[0]*8 for _ in range(8)]
-        api_url = 'http://127.0.0.1:8000/api/qaoa-predict/'
         try:
-            qaoa_response = requests.post(api_url, json={'qubo_matrix': qubo_matrix})
+            qaoa_response = upstream.post('qaoa', upstream.url('qaoa', QAOA_PREDICT_PATH), json={'qubo_matrix': qubo_matrix()}, timeout=(1, 5))
             qaoa_result = qaoa_response.json()
         except Exception as e:
             qaoa_result = {'error': str(e)}
-        main_path = dijkstra(origin, destination, AIRPORT_CODES, DIST_MATRIX)
-        alt_paths = find_alternatives(main_path, AIRPORT_CODES)
-        airport_dict = {a['code']: a for a in AIRPORTS}
-        def build_route_obj(codes):
-            coords = [[airport_dict[code]['latitude'], airport_dict[code]['longitude']] for code in codes if code in airport_dict]
-            path = ' → '.join(codes)
-            return {'coordinates': coords, 'path': path}
-        all_routes = [build_route_obj(main_path)] + [build_route_obj(alt) for alt in alt_paths]
-
-        main_route = all_routes[0] if all_routes else None
-        if main_route and main_route['coordinates']:
-            total_distance_km = calculate_route_distance(main_route['coordinates'])
-            total_distance_miles = total_distance_km * 0.621371
-            hours, minutes = estimate_flight_time(total_distance_km)
-            total_cost, fuel_cost = calculate_total_cost(total_distance_km)
-            timing_data = {
-                'estimated_duration_hours': hours,
-                'estimated_duration_minutes': minutes,
-                'total_distance_miles': round(total_distance_miles, 2),
-                'total_distance_km': round(total_distance_km, 2),
-            }
-            cost_data = {
-                'total_cost': round(total_cost, 2),
-                'total_fuel_cost': round(fuel_cost, 2),
-            }
-            optimization_data = {
-                'method': 'QAOA',
-                'total_distance': round(total_distance_miles, 2),
+        return JsonResponse(optimize_routes(origin, destination, qaoa_result))
+
+INVALID_ROUTE_RESPONSE = {
+    'error': 'Invalid origin or destination',
+    'all_routes': [],
+}
+QAOA_PREDICT_PATH = '/api/qaoa-predict/'
+
+def optimize_params(request):
+    """(origin id, destination id) from a JSON or form POST"""
+    if request.content_type == 'application/json':
+        data = json.loads(request.body)
+        return data.get('origin'), data.get('destination')
+    return request.POST.get('origin'), request.POST.get('destination')
+
+MAX_AIRPORT_ID = 2 ** 63 - 1  # largest 64-bit database integer
+
+def airport_id(value):
+    """``value`` parsed as an airport primary key, None if it cannot be one"""
+    try:
+        pk = int(value)
+    except (TypeError, ValueError):
+        return None
+    return pk if 0 < pk <= MAX_AIRPORT_ID else None
+
+def airport_codes(origin_id, destination_id):
+    """Airport codes of the two ids, None where an id is unknown"""
+    # Two primary-key lookups in one query, however many airports there are
+    ids = [airport_id(origin_id), airport_id(destination_id)]
+    found = Airport.objects.filter(pk__in=[pk for pk in ids if pk is not None]).values_list('id', 'code')
+    codes = dict(found)
+    return codes.get(ids[0]), codes.get(ids[1])
+
+def qubo_matrix():
+    return [[0]*8 for _ in range(8)]
+
+def optimize_routes(origin, destination, qaoa_result):
+    """Main and alternative routes between two airport codes with their timing and costs"""
+    graph = get_route_graph()
+    main_path = dijkstra(origin, destination, graph)
+    alt_paths = find_alternatives(main_path, graph['codes'])
+    def build_route_obj(codes):
+        points = [AIRPORT_COORDINATES.get(code) for code in codes]
+        coords = [[p['latitude'], p['longitude']] for p in points if p]
+        path = ' → '.join(codes)
+        return {'coordinates': coords, 'path': path}
+    all_routes = [build_route_obj(main_path)] + [build_route_obj(alt) for alt in alt_paths]
+
+    main_route = all_routes[0] if all_routes else None
+    if main_route and main_route['coordinates']:
+        total_distance_km = calculate_route_distance(main_route['coordinates'])
+        total_distance_miles = total_distance_km * 0.621371
+        hours, minutes = estimate_flight_time(total_distance_km)
+        total_cost, fuel_cost = calculate_total_cost(total_distance_km)
+        timing_data = {
+            'estimated_duration_hours': hours,
+            'estimated_duration_minutes': minutes,
+            'total_distance_miles': round(total_distance_miles, 2),
+            'total_distance_km': round(total_distance_km, 2),
+        }
+        cost_data = {
+            'total_cost': round(total_cost, 2),
+            'total_fuel_cost': round(fuel_cost, 2),
+        }
+        optimization_data = {
+            'method': 'QAOA',
+            'total_distance': round(total_distance_miles, 2),
+            'total_cost': round(total_cost, 2),
+            'path': main_route['path'],
+        }
+    else:
+        timing_data = {
+            'estimated_duration_hours': 0,
+            'estimated_duration_minutes': 0,
+            'total_distance_miles': 0,
+            'total_distance_km': 0,
+        }
+        cost_data = {
+            'total_cost': 0,
+            'total_fuel_cost': 0,
+        }
+        optimization_data = {
+            'method': 'QAOA',
+            'total_distance': 0,
+            'total_cost': 0,
+            'path': '',
+        }
+
+    all_routes_data = []
+    for route in all_routes:
+        if route and route['coordinates']:
+            distance_km = calculate_route_distance(route['coordinates'])
+            distance_miles = distance_km * 0.621371
+            hours, minutes = estimate_flight_time(distance_km)
+            total_cost, fuel_cost = calculate_total_cost(distance_km)
+            route_data = {
+                **route,
+                'distance_km': round(distance_km, 2),
+                'distance_miles': round(distance_miles, 2),
+                'duration_hours': hours,
+                'duration_minutes': minutes,
                 'total_cost': round(total_cost, 2),
-                'path': main_route['path'],
+                'fuel_cost': round(fuel_cost, 2),
             }
+            all_routes_data.append(route_data)
         else:
-            timing_data = {
-                'estimated_duration_hours': 0,
-                'estimated_duration_minutes': 0,
-                'total_distance_miles': 0,
-                'total_distance_km': 0,
-            }
-            cost_data = {
-                'total_cost': 0,
-                'total_fuel_cost': 0,
-            }
-            optimization_data = {
-                'method': 'QAOA',
-                'total_distance': 0,
-                'total_cost': 0,
-                'path': '',
-            }
-
-        all_routes_data = []
-        for route in all_routes:
-            if route and route['coordinates']:
-                distance_km = calculate_route_distance(route['coordinates'])
-                distance_miles = distance_km * 0.621371
-                hours, minutes = estimate_flight_time(distance_km)
-                total_cost, fuel_cost = calculate_total_cost(distance_km)
-                route_data = {
-                    **route,
-                    'distance_km': round(distance_km, 2),
-                    'distance_miles': round(distance_miles, 2),
-                    'duration_hours': hours,
-                    'duration_minutes': minutes,
-                    'total_cost': round(total_cost, 2),
-                    'fuel_cost': round(fuel_cost, 2),
-                }
-                all_routes_data.append(route_data)
-            else:
-                all_routes_data.append(route)
-
-        response = {
-            'all_routes': all_routes_data,
-            'route': {
-                'path': main_route['path'] if main_route else '',
-                'timing': timing_data,
-                'total_cost': cost_data['total_cost'],
-                'total_fuel_cost': cost_data['total_fuel_cost'],
-            },
-            'optimization_results': optimization_data,
-            'qaoa_result': qaoa_result,
-        }
-        return JsonResponse(response)
+            all_routes_data.append(route)
+
+    response = {
+        'all_routes': all_routes_data,
+        'route': {
+            'path': main_route['path'] if main_route else '',
+            'timing': timing_data,
+            'total_cost': cost_data['total_cost'],
+            'total_fuel_cost': cost_data['total_fuel_cost'],
+        },
+        'optimization_results': optimization_data,
+        'qaoa_result': qaoa_result,
+    }
+    return response
 
 def choices_view(request):
     airports = Airport.objects.all()
@@ -282,20 +300,64 @@ def choices_view(request):
     })
 
 def map_view(request):
-    return render(request, 'map.html')
+    return render(request, 'map.html', {'airport_feed_url': feed_url(get_airport_feed())})
+
+@require_http_methods(["GET", "HEAD"])
+def api_airport_feed(request):
+    """Columnar airport dataset, pre-compressed once per dataset version"""
+    feed = get_airport_feed()
+    encoding = choose_encoding(feed, request.META.get('HTTP_ACCEPT_ENCODING'))
+    if etag_matches(feed, request.META.get('HTTP_IF_NONE_MATCH')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(feed['bodies'][encoding], content_type=FEED_CONTENT_TYPE)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    if request.GET.get('v') == feed['version']:
+        # Versioned URL: the content behind it never changes
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, no-cache'
+    response['ETag'] = feed_etag(feed, encoding)
+    response['Vary'] = 'Accept-Encoding'
+    response['X-Dataset-Version'] = feed['version']
+    return response
 
 def api_airports(request):
-    airports = list(Airport.objects.all().values('code', 'name', 'latitude', 'longitude'))
-    return JsonResponse({"airports": airports})
+    return streaming_json_response(
+        Airport.objects.all(), ['code', 'name', 'latitude', 'longitude'], wrapper_key='airports'
+    )
 
 def api_stops(request):
-    stops = list(Airport.objects.all().values('code', 'name', 'latitude', 'longitude', 'country'))
-    return JsonResponse({'stops': stops})
+    return streaming_json_response(
+        Airport.objects.all(), ['code', 'name', 'latitude', 'longitude', 'country'], wrapper_key='stops'
+    )
+
+def api_flights_export(request):
+    """Export every flight as JSON, streamed row by row"""
+    return streaming_json_response(
+        Flight.objects.all(),
+        {
+            'flight_number': 'flight_number',
+            'origin': 'origin__code',
+            'destination': 'destination__code',
+            'departure_time': 'departure_time',
+            'arrival_time': 'arrival_time',
+            'duration': 'duration',
+            'distance': 'distance',
+            'fuel_cost': 'fuel_cost',
+            'base_cost': 'base_cost',
+            'total_cost': 'total_cost',
+            'aircraft_type': 'aircraft_type',
+            'airline': 'airline',
+            'price': 'price',
+            'currency': 'currency',
+        },
+        wrapper_key='flights',
+    )
 
 def api_all_airports(request):
-    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'airports_cleaned.json')
-    with open(data_path, 'r', encoding='utf-8') as f:
-        airports = json.load(f)
+    airports = get_airport_store()
     country = request.GET.get('country', '').strip().lower()
     city = request.GET.get('city', '').strip().lower()
     code = request.GET.get('code', '').strip().upper()
@@ -309,68 +371,189 @@ def api_all_airports(request):
         if code:
             matches = matches and code == airport.get('code', '').upper()
         return matches
+    if code and not (country or city):
+        # Exact code lookups go straight through the store's hash table
+        airport = airports.get(code)
+        return JsonResponse({'airports': [airport] if airport else []})
     if country or city or code:
         airports = [a for a in airports if match(a)]
+    else:
+        airports = list(airports)
     return JsonResponse({'airports': airports})
 
+METERS_TO_FEET = 3.28084
+MS_TO_KNOTS = 1.94384
+
+def api_air_traffic(request):
+    """Aircraft positions from the shared OpenSky snapshot, optionally inside ?lamin=&lomin=&lamax=&lomax="""
+    try:
+        limit = min(int(request.GET.get('limit', 500)), 5000)
+        box = [request.GET.get(name) for name in ('lamin', 'lomin', 'lamax', 'lomax')]
+        box = [float(value) for value in box] if all(box) else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit or bounding box."}, status=400)
+    if box and not all(math.isfinite(value) for value in box):
+        return JsonResponse({"error": "Invalid limit or bounding box."}, status=400)
+
+    snapshot = air_traffic.get_live_snapshot()
+    if snapshot is None:
+        return JsonResponse({'air_traffic': [], 'time': None})
+    if box:
+        states = snapshot.in_box(*box, limit=limit)
+    else:
+        states = snapshot.positioned()[:limit]
+    altitude = np.round(states['baro_altitude'] * METERS_TO_FEET)
+    speed = np.round(states['velocity'] * MS_TO_KNOTS)
+    traffic = [
+        {
+            'icao24': icao24.decode(),
+            'callsign': callsign.decode(),
+            'latitude': latitude,
+            'longitude': longitude,
+            'altitude': None if math.isnan(alt) else int(alt),
+            'speed': None if math.isnan(spd) else int(spd),
+            'heading': None if math.isnan(track) else round(track, 1),
+        }
+        for icao24, callsign, latitude, longitude, alt, spd, track in zip(
+            states['icao24'].tolist(), states['callsign'].tolist(), states['latitude'].tolist(),
+            states['longitude'].tolist(), altitude.tolist(), speed.tolist(), states['true_track'].tolist(),
+        )
+    ]
+    return JsonResponse({'air_traffic': traffic, 'time': snapshot.time})
+
+def api_upstream_metrics(request):
+    """Connection reuse and circuit breaker state of the upstream HTTP client"""
+    return JsonResponse(upstream.upstream_metrics())
+
 def chat_bot(request):
     return render(request, 'chat_bot.html')
 
+GEMINI_GENERATE_PATH = "/v1beta/models/gemini-pro:generateContent"
+
+LAST_REPORT_COOKIE = "last_report"
+LAST_REPORT_MAX_AGE = 24 * 3600
+
+def remember_report(response, origin, destination, aircraft):
+    """Note the report in a cookie, so the chatbot can answer questions about it"""
+    response.set_cookie(LAST_REPORT_COOKIE, f"{origin}:{destination}:{aircraft}",
+                        max_age=LAST_REPORT_MAX_AGE, samesite='Lax')
+    return response
+
+def last_report(request):
+    """(origin, destination, aircraft, {section: cache key}) of the user's last report, or None"""
+    parts = request.COOKIES.get(LAST_REPORT_COOKIE, "").split(":")
+    if len(parts) != 3 or not all(part.isalnum() for part in parts):
+        return None
+    origin, destination, aircraft = parts
+    # Any positive distance: the section keys do not depend on it
+    keys = {name: spec[0] for name, spec in report_sections(origin, destination, aircraft, 1).items()}
+    keys['route'] = f"report:route:{origin}:{destination}"
+    return origin, destination, aircraft, keys
+
+def chat_history(data):
+    """Earlier turns sent by the chat page, as [{"role", "text"}] oldest first"""
+    history = data.get("history")
+    if not isinstance(history, list):
+        return []
+    return [turn for turn in history if isinstance(turn, dict) and isinstance(turn.get("text"), str)]
+
+def gemini_request(request):
+    """(cache key, url, payload, stream) of the Gemini call for a chat message, or an error JsonResponse
+
+    The prompt carries the conversation so far and the flight data the
+    message refers to, packed by chat_context. ``stream`` is set when the
+    client asked for the answer as Server-Sent Events (``"stream": true`` in
+    the body, or ``?stream=1``).
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+    user_message = data.get("message", "") if isinstance(data, dict) else None
+    if not isinstance(user_message, str):
+        return JsonResponse({"error": "message must be a string."}, status=400)
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    if not gemini_api_key:
+        return JsonResponse({"error": "Gemini API key not set."}, status=500)
+    stream = bool(data.get("stream")) or request.GET.get("stream") == "1"
+    if stream:
+        url = chat_stream.stream_url(gemini_api_key)
+    else:
+        url = upstream.url('gemini', GEMINI_GENERATE_PATH + "?key=" + gemini_api_key)
+    history = chat_history(data)
+    contents, context = chat_context.pack_prompt(user_message, history, last_report(request))
+    payload = {"contents": contents}
+    return chat_pool.answer_key(user_message, context, history), url, payload, stream
+
+def gemini_reply(response, cache_key):
+    """JsonResponse with the text of a Gemini generateContent response, caching the answer"""
+    if response.status_code == 200:
+        result = response.json()
+        ai_text = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "No response from Gemini.")
+        chat_pool.store_answer(cache_key, ai_text)
+        return JsonResponse({"response": ai_text})
+    return JsonResponse({"error": f"Gemini API error: {response.text}"}, status=500)
+
+def chat_queue_timeout(ticket):
+    # The ETA needs the ticket's place in the queue, which release() gives up
+    retry_after = max(ticket.eta(), ticket.pool.eta(1))
+    ticket.release()
+    return chat_pool.busy_response(retry_after)
+
 @csrf_exempt
 def chat_gemini_api(request):
     if request.method == "POST":
-        data = json.loads(request.body)
-        user_message = data.get("message", "")
-        gemini_api_key = os.environ.get("GEMINI_API_KEY")
-        if not gemini_api_key:
-            return JsonResponse({"error": "Gemini API key not set."}, status=500)
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key=" + gemini_api_key
-        payload = {
-            "contents": [{"parts": [{"text": user_message}]}]
-        }
+        gemini_call = gemini_request(request)
+        if isinstance(gemini_call, JsonResponse):
+            return gemini_call
+        cache_key, url, payload, stream = gemini_call
+        answer = chat_pool.cached_answer(cache_key)
+        if answer is not None:
+            if stream:
+                return chat_stream.sse_response(chat_stream.cached_events(answer))
+            return JsonResponse({"response": answer, "cached": True})
+        # Chats take a slot in the chat pool, or are turned away while its queue is full
+        try:
+            ticket = chat_pool.get_chat_pool().admit()
+        except chat_pool.ChatQueueFull as e:
+            return chat_pool.busy_response(e.retry_after)
+        if stream:
+            return chat_stream.sse_response(chat_stream.relay(url, payload, ticket, cache_key), ticket)
+        if not ticket.wait(settings.CHAT_QUEUE_TIMEOUT_SECONDS):
+            return chat_queue_timeout(ticket)
         try:
-            response = requests.post(url, json=payload)
-            if response.status_code == 200:
-                result = response.json()
-                ai_text = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "No response from Gemini.")
-                return JsonResponse({"response": ai_text})
-            else:
-                return JsonResponse({"error": f"Gemini API error: {response.text}"}, status=500)
+            response = upstream.post('gemini', url, json=payload, timeout=(3.05, 30))
+            return gemini_reply(response, cache_key)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
+        finally:
+            ticket.release()
     return JsonResponse({"error": "POST only"}, status=405)
 
+def api_chat_queue(request):
+    """Slots, queue length and expected wait of this worker's chat pool"""
+    return JsonResponse(chat_pool.get_chat_pool().status())
+
 @csrf_exempt
 def api_ask_ai(request):
+    """Fuel-efficiency summary and suggestions for a report, or for a batch of them
+
+    A batch is {"reports": [...]} or NDJSON (application/x-ndjson) and gets
+    per-report results plus fleet-wide aggregates.
+    """
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            report = data.get('data', data)
-            summary = []
-            suggestions = []
-            fuel_eff = report.get('fuel_efficiency', [])
-            if fuel_eff:
-                for entry in fuel_eff:
-                    summary.append(
-                        f"Aircraft type: {entry.get('aircraft_type', 'N/A')}, "
-                        f"Efficiency: {entry.get('efficiency', 'N/A')}, "
-                        f"Fuel Consumption: {entry.get('fuel_consumption', 'N/A')}, "
-                        f"Emissions: {entry.get('emissions', 'N/A')}"
-                    )
-                    try:
-                        eff_val = float(str(entry.get('efficiency', '0')).split()[0])
-                    except Exception:
-                        eff_val = 0
-                    if eff_val < 20:
-                        suggestions.append("Consider reducing aircraft weight, optimizing cruise speed, improving engine maintenance, or using more efficient flight paths to increase fuel efficiency.")
-                    else:
-                        suggestions.append("Fuel efficiency is good. Maintain current operational practices.")
-            else:
-                summary.append("No fuel efficiency data found.")
-                suggestions.append("No suggestions available for fuel efficiency.")
+            reports, batch = report_analysis.parse_reports(request.body, request.content_type or "")
+            if len(reports) > report_analysis.MAX_REPORTS:
+                return JsonResponse({"error": f"At most {report_analysis.MAX_REPORTS} reports per request."}, status=400)
+            results, aggregate = report_analysis.analyze_reports(reports)
+            if batch:
+                return JsonResponse({"reports": results, "aggregate": aggregate})
+            if "error" in results[0]:
+                return JsonResponse(results[0], status=400)
             return JsonResponse({
-                "summary": "\n".join(summary),
-                "suggestions": "\n".join(suggestions)
+                "summary": results[0]["summary"],
+                "suggestions": results[0]["suggestions"]
             })
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -426,77 +609,179 @@ def report(request):
         'destination': destination,
         # Add other context variables as needed
     })
+# Freshness windows of the report sections, in seconds (None: never goes stale)
+WEATHER_FRESH_SECONDS = 5 * 60
+FUEL_FRESH_SECONDS = 6 * 3600
+CONSTRAINTS_FRESH_SECONDS = 3600
+ROUTE_FRESH_SECONDS = None
+# Failed sections are retried soon instead of being kept for the full window
+ERROR_FRESH_SECONDS = 30
+
+def is_error_section(value):
+    first = value[0] if isinstance(value, list) and value else value
+    return isinstance(first, dict) and "error" in first
+
+def freshness(seconds):
+    return lambda value: ERROR_FRESH_SECONDS if is_error_section(value) else seconds
+
+def route_section(origin, destination):
+    distance_info = calculate_distance(origin, destination)
+    if distance_info is None:
+        return None
+    return {'distance_info': distance_info, 'route_data': route_data_from_distance(distance_info)}
+
+def report_route(origin, destination):
+    """(route section, age) of a report, cached; (None, 0.0) for unsupported airports"""
+    route_key = f"report:route:{origin}:{destination}"
+    cached_route = swr_lookup([route_key]).get(route_key)
+    if cached_route is not None:
+        return cached_route[0], cached_route[1]
+    route = route_section(origin, destination)
+    if route is not None:
+        swr_store(route_key, route, ROUTE_FRESH_SECONDS)
+    return route, 0.0
+
+def report_params(request):
+    """(origin, destination, aircraft) of a report request, from POST or GET"""
+    params = request.POST if request.method == 'POST' else request.GET
+    origin = params.get('origin', '').strip().upper()
+    destination = params.get('destination', '').strip().upper()
+    aircraft = params.get('aircraft', '').strip().upper() or DEFAULT_AIRCRAFT_ICAO
+    return origin, destination, aircraft
+
+def known_aircraft(aircraft):
+    """Whether reports may be built for ``aircraft``: the default or the hex code of a known profile
+
+    The code keys cached sections and fuel-model harvests, so arbitrary
+    strings must not get that far.
+    """
+    return aircraft == DEFAULT_AIRCRAFT_ICAO or aircraft in aircraft_constraints.get_constraints()
+
+def unknown_aircraft_response(aircraft):
+    return JsonResponse({"error": f"Unknown aircraft hex code {aircraft}."}, status=400)
+
+def unsupported_route_response():
+    return JsonResponse({"error": f"Unsupported airport codes. Supported: {', '.join(AIRPORT_COORDINATES.keys())}"}, status=400)
+
 @csrf_exempt
 def full_report(request):
     """
     Comprehensive flight report fetching all data at once
     Supports both GET and POST methods
     """
-    if request.method == 'POST':
-        origin = request.POST.get('origin', '').strip().upper()
-        destination = request.POST.get('destination', '').strip().upper()
-    else:
-        origin = request.GET.get('origin', '').strip().upper()
-        destination = request.GET.get('destination', '').strip().upper()
-    
+    origin, destination, aircraft = report_params(request)
     if not origin or not destination:
         return JsonResponse({"error": "Origin and destination are required."}, status=400)
-    
-    distance_info = calculate_distance(origin, destination)
-    if distance_info is None:
-        return JsonResponse({"error": f"Unsupported airport codes. Supported: {', '.join(AIRPORT_COORDINATES.keys())}"}, status=400)
-    
+    if not known_aircraft(aircraft):
+        return unknown_aircraft_response(aircraft)
+    route, route_age = report_route(origin, destination)
+    if route is None:
+        return unsupported_route_response()
+
+    response = JsonResponse(build_full_report(origin, destination, aircraft, route, route_age))
+    return remember_report(response, origin, destination, aircraft)
+
+def report_sections(origin, destination, aircraft, distance_miles):
+    """{section: (cache key, freshness, fn, *args)} of the cacheable report sections"""
+    # Sections are keyed by their own inputs, so e.g. an airport's weather
+    # is shared by every route that starts or ends there
+    sections = {
+        'origin_weather': (f"report:weather:{origin}", freshness(WEATHER_FRESH_SECONDS), fetch_forecast, origin),
+        'destination_weather': (f"report:weather:{destination}", freshness(WEATHER_FRESH_SECONDS), fetch_forecast, destination),
+        'operational_constraints': (f"report:constraints:{aircraft}", freshness(CONSTRAINTS_FRESH_SECONDS), fetch_operational_constraints, aircraft),
+    }
+    if distance_miles > 0:
+        sections['fuel_efficiency'] = (f"report:fuel:{aircraft}:{origin}:{destination}", freshness(FUEL_FRESH_SECONDS), fetch_fuel_efficiency, aircraft, distance_miles)
+    return sections
+
+def read_sections(sections, route_age):
+    """(results, ages, stale, missing) of the sections, refreshing stale ones in the background"""
+    cached_sections = swr_lookup([spec[0] for spec in sections.values()])
+    results, ages, stale, missing = {}, {'route_data': route_age}, [], []
+    for name, (key, fresh_for, fn, *args) in sections.items():
+        if key in cached_sections:
+            results[name], ages[name], fresh, refresh = cached_sections[key]
+            if not fresh:
+                stale.append(name)
+            if refresh:
+                # Serve the cached copy now; one worker refreshes it in the background,
+                # hot sections usually before they go stale
+                swr_refresh(key, fresh_for, fn, *args)
+        else:
+            missing.append(name)
+    return results, ages, stale, missing
+
+def build_full_report(origin, destination, aircraft, route, route_age):
+    """Assemble the flight report from cached sections, fetching only what is missing"""
+    sections = report_sections(origin, destination, aircraft, route['distance_info']['distance_miles'])
+    results, ages, stale, missing = read_sections(sections, route_age)
+
+    # Missing sections are independent of each other, so fetch them concurrently
+    # under one deadline, each by one worker at a time; late results are still
+    # cached for the next request
+    errors, timed_out = {}, []
+    if missing:
+        calls = {name: (compute_once, *sections[name]) for name in missing}
+        fetched, errors, timed_out = fan_out(calls, timeout=settings.FULL_REPORT_DEADLINE_SECONDS)
+        results.update(fetched)
+        ages.update({name: 0.0 for name in fetched})
+
+    # Read from the local air traffic snapshot on every request
+    safety_factors = fetch_aircraft_metrics()
+    return assemble_report(origin, destination, aircraft, route, results, ages, stale, errors, timed_out, safety_factors)
+
+def assemble_report(origin, destination, aircraft, route, results, ages, stale, errors, timed_out, safety_factors):
+    """Report payload from the section results, the failed and the timed out sections"""
+    distance_info = route['distance_info']
     distance_miles = distance_info['distance_miles']
     distance_km = distance_info['distance_km']
 
-    try:
-        origin_weather = fetch_forecast(origin)
-        destination_weather = fetch_forecast(destination)
-        weather_data = {
-            'origin': {'city': origin, 'forecast': origin_weather},
-            'destination': {'city': destination, 'forecast': destination_weather}
-        }
-    except Exception as e:
-        weather_data = {"error": f"Weather fetch failed: {str(e)}"}
+    def section(name, label):
+        if name in timed_out:
+            return {"error": f"{label} timed out", "timed_out": True}
+        if name in errors:
+            return {"error": f"{label} fetch failed: {str(errors[name])}"}
+        return results[name]
+
+    def forecast(name):
+        result = section(name, "Weather")
+        return [result] if isinstance(result, dict) else result
+
+    weather_data = {
+        'origin': {'city': origin, 'forecast': forecast('origin_weather')},
+        'destination': {'city': destination, 'forecast': forecast('destination_weather')}
+    }
 
     if distance_miles > 0:
-        try:
-            fuel_efficiency = fetch_fuel_efficiency(DEFAULT_AIRCRAFT_ICAO, distance_miles)
-        except Exception as e:
-            fuel_efficiency = {"error": f"Fuel efficiency fetch failed: {str(e)}"}
+        fuel_efficiency = section('fuel_efficiency', "Fuel efficiency")
     else:
         fuel_efficiency = {"error": "Distance required for fuel efficiency calculation"}
 
-    try:
-        safety_factors = fetch_aircraft_metrics()
-        if isinstance(safety_factors, list) and len(safety_factors) > 0:
-            if "error" in safety_factors[0]:
-                safety_factors = {"error": safety_factors[0]["error"]}
-            else:
-                safety_factors = {"factors": safety_factors}
-        route_data = get_route_data(origin, destination)
-    except Exception as e:
-        safety_factors = {"error": f"Safety factors fetch failed: {str(e)}"}
-        route_data = {"error": f"Route data fetch failed: {str(e)}"}
+    ages['safety_factors'] = 0.0
+    if isinstance(safety_factors, list) and len(safety_factors) > 0:
+        if "error" in safety_factors[0]:
+            safety_factors = {"error": safety_factors[0]["error"]}
+        else:
+            safety_factors = {"factors": safety_factors}
 
-    try:
-        operational_constraints = fetch_operational_constraints(DEFAULT_AIRCRAFT_ICAO)
-    except Exception as e:
-        operational_constraints = {"error": f"Operational constraints fetch failed: {str(e)}"}
+    operational_constraints = section('operational_constraints', "Operational constraints")
 
     report_data = {
         "origin": origin,
         "destination": destination,
+        "aircraft": aircraft,
         "distance_miles": distance_miles,
         "distance_km": distance_km,
         "weather": weather_data,
         "fuel_efficiency": fuel_efficiency,
         "safety_factors": safety_factors,
-        "route_data": route_data,
+        "route_data": route['route_data'],
         "operational_constraints": operational_constraints,
+        "timed_out_sections": timed_out,
+        "stale_sections": stale,
+        "section_ages": {name: round(age, 1) for name, age in ages.items()},
     }
-
-    return JsonResponse(report_data)
+    return report_data
 
 # AIRPORT_COORDS = {
 #     "BLR": (77.7100, 12.9500),   # (longitude, latitude)
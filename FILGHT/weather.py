@@ -0,0 +1,273 @@
+"""
+Cached current weather from Open-Meteo.
+
+Coordinates are snapped to a grid cell, so airports a few kilometres apart
+share one cache entry, and entries expire when Open-Meteo publishes its next
+15-minute update. Cache misses that arrive within a short window of each
+other are collapsed into a single multi-location Open-Meteo request, by a
+leader thread for the sync views and by a task per event loop for the async
+ones. Values are decoded and formatted once when fetched, not on every read.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from . import async_upstream, upstream
+
+FORECAST_PATH = "/v1/forecast"
+CURRENT_FIELDS = (
+    "temperature_2m,wind_speed_10m,wind_direction_10m,relative_humidity_2m,"
+    "surface_pressure,visibility,precipitation,weather_code"
+)
+GRID_DEGREES = 0.1  # about 11 km, close to the resolution of the weather models
+UPDATE_INTERVAL = 900  # Open-Meteo refreshes current conditions every 15 minutes
+MIN_TTL = 60
+BATCH_WINDOW = 0.02  # seconds a miss waits for other misses to join its request
+MAX_LOCATIONS = 100  # per Open-Meteo request, keeps the URL short
+WAIT_TIMEOUT = 20
+CACHE_PREFIX = "weather:v1"
+
+WEATHER_CODES = {
+    0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
+    45: "Fog", 48: "Depositing rime fog", 51: "Light drizzle", 53: "Moderate drizzle",
+    55: "Dense drizzle", 56: "Light freezing drizzle", 57: "Dense freezing drizzle",
+    61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain", 66: "Light freezing rain",
+    67: "Heavy freezing rain", 71: "Slight snow", 73: "Moderate snow", 75: "Heavy snow",
+    77: "Snow grains", 80: "Slight rain showers", 81: "Moderate rain showers",
+    82: "Violent rain showers", 85: "Slight snow showers", 86: "Heavy snow showers",
+    95: "Thunderstorm", 96: "Thunderstorm with slight hail", 99: "Thunderstorm with heavy hail"
+}
+
+
+class WeatherUnavailable(Exception):
+    """Open-Meteo answered, but not with usable data"""
+
+
+def grid_cell(latitude, longitude):
+    """Integer grid cell containing a coordinate"""
+    return round(latitude / GRID_DEGREES), round(longitude / GRID_DEGREES)
+
+
+def cell_center(cell):
+    return round(cell[0] * GRID_DEGREES, 4), round(cell[1] * GRID_DEGREES, 4)
+
+
+def cache_key(cell):
+    return f"{CACHE_PREFIX}:{cell[0]}:{cell[1]}"
+
+
+def format_current(location_data):
+    """Decode one Open-Meteo location into the display fields of a forecast entry"""
+    current = location_data.get('current', {})
+    offset = location_data.get('utc_offset_seconds', 0)
+    timestamp = current.get('time')
+    if timestamp is None:
+        current_time = 'N/A'
+    else:
+        # Unix time shifted by the location's UTC offset gives its local wall clock
+        current_time = datetime.fromtimestamp(timestamp + offset, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    weather_code = current.get('weather_code', 0)
+    return {
+        "time": current_time,
+        "location": None,  # filled in per airport
+        "temperature": f"{current.get('temperature_2m', 'N/A')}°C",
+        "humidity": f"{current.get('relative_humidity_2m', 'N/A')}%",
+        "pressure": f"{current.get('surface_pressure', 'N/A')} hPa",
+        "wind_speed": f"{current.get('wind_speed_10m', 'N/A')} m/s",
+        "wind_direction": f"{current.get('wind_direction_10m', 'N/A')}°",
+        "visibility": f"{current.get('visibility', 'N/A')} m",
+        "precipitation": f"{current.get('precipitation', 0)} mm",
+        "weather_condition": WEATHER_CODES.get(weather_code, "Unknown"),
+        "weather_code": weather_code,
+        "type": "current"
+    }
+
+
+def time_to_live(location_data):
+    """Seconds until Open-Meteo publishes the next update for this location"""
+    current = location_data.get('current', {})
+    interval = current.get('interval') or UPDATE_INTERVAL
+    if current.get('time') is None:
+        return MIN_TTL
+    return int(min(max(current['time'] + interval - time.time(), MIN_TTL), interval))
+
+
+def forecast_params(cells):
+    """Open-Meteo query for the centres of several grid cells"""
+    centers = [cell_center(cell) for cell in cells]
+    return {
+        'latitude': ",".join(str(lat) for lat, _ in centers),
+        'longitude': ",".join(str(lon) for _, lon in centers),
+        'current': CURRENT_FIELDS,
+        'timezone': 'auto',
+        'timeformat': 'unixtime',
+    }
+
+
+def store_response(cells, response):
+    """Format and cache an Open-Meteo response for ``cells``; returns the entries in order"""
+    if response.status_code != 200:
+        raise WeatherUnavailable(f"Open-Meteo API Error {response.status_code}: {response.text[:300]}")
+    data = response.json()
+    # A single location comes back as an object, several as a list
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(cells):
+        raise WeatherUnavailable(f"Open-Meteo returned {len(locations)} locations for {len(cells)} requested")
+    entries = [format_current(location) for location in locations]
+    for cell, location, entry in zip(cells, locations, entries):
+        cache.set(cache_key(cell), entry, time_to_live(location))
+    return entries
+
+
+def fetch_cells(cells):
+    """One Open-Meteo request for several grid cells; returns formatted entries in order"""
+    response = upstream.get('open-meteo', upstream.url('open-meteo', FORECAST_PATH),
+                            params=forecast_params(cells), timeout=(3.05, 10), retries=1)
+    return store_response(cells, response)
+
+
+async def fetch_cells_async(cells):
+    """fetch_cells() on the event loop's shared async client"""
+    response = await async_upstream.get('open-meteo', upstream.url('open-meteo', FORECAST_PATH),
+                                        params=forecast_params(cells), timeout=(3.05, 10), retries=1)
+    return await sync_to_async(store_response, thread_sensitive=False)(cells, response)
+
+
+_lock = threading.Lock()
+_in_flight = {}  # cell -> Future of its formatted entry
+_queued = []  # cells waiting for the next batch
+_leader_waiting = False
+
+
+def _drain():
+    """Send every queued cell to Open-Meteo and resolve the waiting futures"""
+    global _leader_waiting
+    with _lock:
+        cells = list(_queued)
+        _queued.clear()
+        _leader_waiting = False
+    for start in range(0, len(cells), MAX_LOCATIONS):
+        chunk = cells[start:start + MAX_LOCATIONS]
+        try:
+            entries = fetch_cells(chunk)
+            error = None
+        except Exception as e:
+            entries, error = [None] * len(chunk), e
+        with _lock:
+            futures = [_in_flight.pop(cell) for cell in chunk]
+        for future, entry in zip(futures, entries):
+            if error is None:
+                future.set_result(entry)
+            else:
+                future.set_exception(error)
+
+
+def _request_cells(cells):
+    """Futures for cells missing from the cache, joining requests already in flight"""
+    global _leader_waiting
+    futures = {}
+    with _lock:
+        for cell in cells:
+            future = _in_flight.get(cell)
+            if future is None:
+                future = _in_flight[cell] = Future()
+                _queued.append(cell)
+            futures[cell] = future
+        # The first miss of a window sends the batch; later ones just wait for it
+        leader = bool(_queued) and not _leader_waiting
+        if leader:
+            _leader_waiting = True
+    if leader:
+        time.sleep(BATCH_WINDOW)
+        _drain()
+    return futures
+
+
+def _cached_cells(points):
+    """(grid cell per point, cached entries, cells missing from the cache)"""
+    cells = [grid_cell(lat, lon) for lat, lon in points]
+    unique = list(dict.fromkeys(cells))
+    cached = cache.get_many([cache_key(cell) for cell in unique])
+    entries = {cell: cached[cache_key(cell)] for cell in unique if cache_key(cell) in cached}
+    return cells, entries, [cell for cell in unique if cell not in entries]
+
+
+def current_weather(points):
+    """Current weather for (latitude, longitude) points
+
+    Returns one entry per point: a formatted weather dict (with ``location``
+    still None), or the exception raised while fetching it.
+    """
+    cells, entries, missing = _cached_cells(points)
+    if missing:
+        for cell, future in _request_cells(missing).items():
+            try:
+                entries[cell] = future.result(timeout=WAIT_TIMEOUT)
+            except Exception as e:
+                entries[cell] = e
+    return [entries[cell] for cell in cells]
+
+
+class _LoopBatches:
+    """In-flight cells and the pending batch of one event loop"""
+
+    def __init__(self):
+        self.in_flight = {}  # cell -> asyncio.Future of its formatted entry
+        self.queued = []
+        self.drain_task = None
+
+
+_loop_batches = weakref.WeakKeyDictionary()  # event loop -> _LoopBatches
+
+
+async def _drain_async(batches):
+    await asyncio.sleep(BATCH_WINDOW)
+    cells = list(batches.queued)
+    batches.queued.clear()
+    batches.drain_task = None
+    for start in range(0, len(cells), MAX_LOCATIONS):
+        chunk = cells[start:start + MAX_LOCATIONS]
+        try:
+            entries = await fetch_cells_async(chunk)
+            error = None
+        except Exception as e:
+            entries, error = [None] * len(chunk), e
+        for cell, entry in zip(chunk, entries):
+            future = batches.in_flight.pop(cell)
+            if error is None:
+                future.set_result(entry)
+            else:
+                future.set_exception(error)
+
+
+async def current_weather_async(points):
+    """current_weather() for the ASGI views: misses on one event loop share batched requests"""
+    # Cache reads are SQLite I/O: off the event loop, but not queued behind the request's ORM thread
+    cells, entries, missing = await sync_to_async(_cached_cells, thread_sensitive=False)(points)
+    if missing:
+        loop = asyncio.get_running_loop()
+        batches = _loop_batches.get(loop)
+        if batches is None:
+            batches = _loop_batches[loop] = _LoopBatches()
+        futures = {}
+        for cell in missing:
+            future = batches.in_flight.get(cell)
+            if future is None:
+                future = batches.in_flight[cell] = loop.create_future()
+                batches.queued.append(cell)
+            futures[cell] = future
+        if batches.queued and batches.drain_task is None:
+            batches.drain_task = loop.create_task(_drain_async(batches))
+        for cell, future in futures.items():
+            try:
+                # Shielded: a caller giving up must not cancel the entry for everyone else
+                entries[cell] = await asyncio.wait_for(asyncio.shield(future), WAIT_TIMEOUT)
+            except Exception as e:
+                entries[cell] = e
+    return [entries[cell] for cell in cells]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Throughput benchmark: WSGI (sync views, threaded gunicorn workers) against
+ASGI (async views, uvicorn workers under gunicorn) while the upstream APIs
+are slow.
+
+    python bench_asgi.py                                  # 0.5 s upstream latency
+    python bench_asgi.py --latency fixed:2 --concurrency 400 --requests 4000
+    python bench_asgi.py --workers 2 --threads 16 --only asgi
+
+Upstreams are replaced by upstream_standin.py serving a canned Gemini reply
+after the injected latency, and the load hits /api/chat-gemini/, which waits
+on Gemini for every request. With W workers of T threads, WSGI can have at
+most W*T upstream calls in flight; an ASGI worker is limited by its
+connection pool instead. The stand-in, the load generator and the server
+share this machine, so on few cores the ASGI figure ends up bounded by CPU
+rather than by the upstream wait.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+GEMINI_PATH = '/v1beta/models/gemini-pro:generateContent'
+
+SERVERS = {
+    'wsgi': ['FILGHT.wsgi:application', '--worker-class', 'gthread', '--threads', '{threads}'],
+    'asgi': ['FILGHT.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_fixtures(directory):
+    """A canned Gemini answer, served by the stand-in for any generateContent call"""
+    folder = os.path.join(directory, 'gemini')
+    os.makedirs(folder)
+    body = {'candidates': [{'content': {'parts': [{'text': 'Benchmark reply.'}]}}]}
+    fixture = {
+        'key': 'benchmark',
+        'request': {'method': 'POST', 'path': GEMINI_PATH, 'query': ''},
+        'status': 200,
+        'content_type': 'application/json',
+        'body': json.dumps(body),
+    }
+    with open(os.path.join(folder, 'benchmark.json'), 'w', encoding='utf-8') as f:
+        json.dump(fixture, f)
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_load(url, total, concurrency):
+    """POST ``total`` chat messages with ``concurrency`` in flight; (seconds, latencies, statuses)"""
+    latencies, statuses = [], Counter()
+    queue = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        for _ in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json={'message': 'benchmark'})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies, statuses
+
+
+def bench_server(kind, args, env):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn'] + [
+        part.format(threads=args.threads) for part in SERVERS[kind]
+    ] + ['--workers', str(args.workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=PROJECT_DIR, env=env)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        wait_until_up(base + '/api/upstream-metrics/')
+        url = base + '/api/chat-gemini/'
+        asyncio.run(run_load(url, min(args.concurrency, args.requests), args.concurrency))  # warm-up
+        elapsed, latencies, statuses = asyncio.run(run_load(url, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    return {
+        'server': kind,
+        'requests_per_second': round(args.requests / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000),
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WSGI vs ASGI throughput under slow upstreams")
+    parser.add_argument('--latency', default='fixed:0.5', help="upstream latency, as for upstream_standin.py")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="threads per WSGI worker")
+    parser.add_argument('--only', choices=sorted(SERVERS))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_asgi_')
+    fixtures = os.path.join(workdir, 'fixtures')
+    write_fixtures(fixtures)
+    standin_port = free_port()
+    standin = subprocess.Popen([
+        sys.executable, os.path.join(PROJECT_DIR, 'upstream_standin.py'), '--port', str(standin_port),
+        '--fixtures', fixtures, '--latency', args.latency, '--quiet',
+    ], stdout=subprocess.DEVNULL)
+    env = dict(
+        os.environ,
+        UPSTREAM_STAND_IN_URL=f'http://127.0.0.1:{standin_port}',
+        GEMINI_API_KEY='benchmark',
+        CACHE_PATH=os.path.join(workdir, 'cache.sqlite3'),
+    )
+    env.pop('ASYNC_VIEWS', None)  # each entry point picks its own views
+    try:
+        wait_until_up(f'http://127.0.0.1:{standin_port}/_stats')
+        print(f"{args.requests} requests, {args.concurrency} concurrent, upstream latency {args.latency}, "
+              f"{args.workers} workers ({args.threads} threads each under WSGI)")
+        for kind in [args.only] if args.only else sorted(SERVERS, reverse=True):
+            print(json.dumps(bench_server(kind, args, env)))
+    finally:
+        standin.terminate()
+        standin.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
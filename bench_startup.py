@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Startup benchmark: cold import time of the Django app and per-worker memory.
+
+    python bench_startup.py                 # cold import only
+    python bench_startup.py --workers 4     # plus forked workers, like gunicorn --preload
+    python bench_startup.py --no-preload    # workers build the datasets themselves
+
+Each measurement runs in a fresh interpreter so earlier imports do not skew it.
+Worker memory is read from /proc/<pid>/smaps_rollup (Linux only): RSS counts
+shared pages in every worker, Private is what each worker adds on its own.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COLD_IMPORT = """
+import json, os, resource, sys, time
+sys.path.insert(0, {project_dir!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FILGHT.settings')
+start = time.perf_counter()
+import django
+django.setup()
+import FILGHT.urls
+elapsed = time.perf_counter() - start
+print(json.dumps({{'import_seconds': elapsed, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+FORKED_WORKERS = """
+import json, os, sys, time
+sys.path.insert(0, {project_dir!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FILGHT.settings')
+import django
+django.setup()
+import FILGHT.urls
+
+def memory_kb():
+    fields = {{}}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {{
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }}
+
+def first_request():
+    # What the first optimize/report request touches
+    from FILGHT.views import dijkstra, get_route_graph
+    from FILGHT.api_utils import AIRPORT_COORDINATES
+    start = time.perf_counter()
+    dijkstra('BLR', 'DEL', get_route_graph())
+    AIRPORT_COORDINATES.get('BLR')
+    return time.perf_counter() - start
+
+if {preload!r}:
+    from FILGHT.startup import warm_up
+    warm_up()
+
+results = []
+read_fd, write_fd = os.pipe()
+pids = []
+for _ in range({workers}):
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        stats = {{'first_request_seconds': first_request()}}
+        stats.update(memory_kb())
+        os.write(write_fd, (json.dumps(stats) + '\\n').encode())
+        os._exit(0)
+    pids.append(pid)
+os.close(write_fd)
+for pid in pids:
+    os.waitpid(pid, 0)
+with os.fdopen(read_fd) as pipe:
+    results = [json.loads(line) for line in pipe]
+print(json.dumps({{'master': memory_kb(), 'workers': results}}))
+"""
+
+
+def run(script):
+    output = subprocess.run(
+        [sys.executable, '-c', script], capture_output=True, text=True, check=True, cwd=PROJECT_DIR
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--project-dir', default=PROJECT_DIR,
+                        help="checkout to measure, e.g. a worktree of an older commit")
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--no-preload', action='store_true')
+    args = parser.parse_args()
+
+    cold = run(COLD_IMPORT.format(project_dir=args.project_dir))
+    print(f"Cold import: {cold['import_seconds']:.2f}s, max RSS {cold['max_rss_kb'] / 1024:.1f} MB")
+
+    if args.workers:
+        forked = run(FORKED_WORKERS.format(
+            project_dir=args.project_dir, workers=args.workers, preload=not args.no_preload
+        ))
+        master = forked['master']
+        print(f"Master after warm-up: RSS {master['rss_kb'] / 1024:.1f} MB")
+        for i, worker in enumerate(forked['workers'], 1):
+            print(
+                f"Worker {i}: first request {worker['first_request_seconds'] * 1000:.1f} ms, "
+                f"RSS {worker['rss_kb'] / 1024:.1f} MB, PSS {worker['pss_kb'] / 1024:.1f} MB, "
+                f"private {worker['private_kb'] / 1024:.1f} MB"
+            )
+
+
+if __name__ == '__main__':
+    main()
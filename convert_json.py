@@ -1,36 +1,220 @@
+"""
+Convert airports_locations.json into the cleaned airport dataset.
+
+The input is parsed as a stream. Every record is validated and normalized,
+duplicates are dropped, and the result is written both as
+airports_cleaned.json and as the compiled, memory-mappable
+airports_cleaned.bin. Validation can be sharded across a process pool for
+large global datasets:
+
+    python convert_json.py [--input PATH] [--output PATH] [--binary PATH] [--workers N]
+
+Memory stays bounded by the batch size and the set of codes already seen,
+not by the size of the input file.
+"""
+import argparse
 import json
+import math
+import os
+import tempfile
+import textwrap
+import time
+from collections import Counter, deque
+from multiprocessing import Pool
+
+from FILGHT.airport_store import AirportStoreWriter
+from FILGHT.json_stream import iter_json_array
 
 # Input and output file paths
 input_file = "airports_locations.json"
 output_file = "airports_cleaned.json"
+# Compiled, memory-mappable copy loaded by the web workers
+binary_file = "airports_cleaned.bin"
+
+BATCH_SIZE = 2000
+
+
+def normalize_code(value, length):
+    """Upper-cased airport code if it has the expected length, else ''"""
+    code = str(value or '').strip().upper()
+    return code if len(code) == length and code.isalnum() else ''
+
+
+def clean_airport(airport):
+    """Validate one input record
+
+    Returns (cleaned record, icao, None) or (None, None, rejection reason).
+    """
+    # IATA codes take precedence; ICAO covers airports that have none
+    iata = normalize_code(airport.get("iata") or airport.get("code"), 3)
+    icao = normalize_code(airport.get("icao"), 4)
+    code = iata or icao
+    if not code:
+        return None, None, "missing code"
+    name = (airport.get("name") or "").strip()
+    if not name:
+        return None, None, "missing name"
+    try:
+        latitude = float(airport["latitude"])
+        longitude = float(airport["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None, None, "missing coordinates"
+    if not (math.isfinite(latitude) and math.isfinite(longitude)
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None, "coordinates out of range"
+    if latitude == 0 and longitude == 0:
+        return None, None, "placeholder coordinates"
 
-with open(input_file, "r", encoding="utf-8") as f:
-    airports = json.load(f)
-
-cleaned = []
-for airport in airports:
-    # Use IATA code as 'code', skip if missing
-    code = airport.get("iata") or airport.get("code")
-    if not code or not airport.get("name") or not airport.get("latitude") or not airport.get("longitude"):
-        continue
-    # Determine type
-    name = airport["name"]
-    place = airport["country"]
-    city = airport["city"]
     airport_type = "international" if "international" in name.lower() else "domestic"
-    cleaned.append({
+    return {
         "name": name,
         "code": code,
-        "latitude": float(airport["latitude"]),
-        "longitude": float(airport["longitude"]),
+        "latitude": latitude,
+        "longitude": longitude,
         "type": airport_type,
-        "location": {   
-            "country": place,
-            "city": city,
+        "location": {
+            "country": airport.get("country"),
+            "city": airport.get("city"),
         },
-    })
+    }, icao, None
+
+
+def clean_batch(batch):
+    return [clean_airport(airport) for airport in batch]
+
+
+def iter_batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_cleaned(records, workers=1, batch_size=BATCH_SIZE):
+    """Yield clean_airport results in input order, optionally validated in a process pool"""
+    batches = iter_batches(records, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            yield from clean_batch(batch)
+        return
+    with Pool(workers) as pool:
+        # Keep a bounded number of batches in flight so memory does not grow with the input
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(clean_batch, (batch,)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def iter_deduplicated(results, stats):
+    """Drop rejected and duplicate records
+
+    An airport listed under an IATA code wins over the same airport (same
+    ICAO code) listed without one, wherever the two appear in the input, so
+    ICAO-only records are held back until the end, spooled to a temporary
+    file as JSON lines rather than kept in memory.
+    """
+    seen_codes = set()
+    seen_icao = set()
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as icao_only:
+        for record, icao, reason in results:
+            stats["read"] += 1
+            if reason:
+                stats[reason] += 1
+            elif len(record["code"]) == 4:
+                icao_only.write(json.dumps(record) + "\n")
+            elif record["code"] in seen_codes or (icao and icao in seen_icao):
+                stats["duplicate"] += 1
+            else:
+                seen_codes.add(record["code"])
+                if icao:
+                    seen_icao.add(icao)
+                yield record
+        icao_only.seek(0)
+        for line in icao_only:
+            record = json.loads(line)
+            if record["code"] in seen_icao or record["code"] in seen_codes:
+                stats["duplicate"] += 1
+            else:
+                seen_codes.add(record["code"])
+                yield record
+
+
+class JsonArrayWriter:
+    """Writes records one by one in the same layout as json.dump(records, f, indent=2)"""
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._count = 0
+
+    def write(self, record):
+        self._fp.write("[\n" if self._count == 0 else ",\n")
+        self._fp.write(textwrap.indent(json.dumps(record, indent=2), "  "))
+        self._count += 1
+
+    def close(self):
+        self._fp.write("\n]" if self._count else "[]")
+
+
+def convert(input_path, output_path, binary_path, workers=1, batch_size=BATCH_SIZE):
+    """Run the conversion pipeline and return its statistics"""
+    stats = Counter()
+    start = time.perf_counter()
+    store = AirportStoreWriter()
+    tmp_output = f"{output_path}.tmp"
+    with open(input_path, "r", encoding="utf-8") as source, \
+            open(tmp_output, "w", encoding="utf-8") as target:
+        writer = JsonArrayWriter(target)
+        results = iter_cleaned(iter_json_array(source), workers=workers, batch_size=batch_size)
+        for record in iter_deduplicated(results, stats):
+            writer.write(record)
+            store.add(record)
+            stats["written"] += 1
+        writer.close()
+    os.replace(tmp_output, output_path)
+    stats["binary_bytes"] = store.save(binary_path)
+    store.close()
+    stats["input_bytes"] = os.path.getsize(input_path)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def print_report(stats, output_path, binary_path):
+    print(f"Converted {stats['written']} airports to {output_path}")
+    print(f"Compiled {stats['written']} airports to {binary_path} ({stats['binary_bytes']} bytes)")
+    seconds = max(stats["seconds"], 1e-9)
+    print(
+        f"Read {stats['read']} records ({stats['input_bytes'] / 1e6:.1f} MB) in {seconds:.2f}s: "
+        f"{stats['read'] / seconds:,.0f} records/s, {stats['input_bytes'] / 1e6 / seconds:.1f} MB/s"
+    )
+    rejected = {
+        reason: stats[reason]
+        for reason in ("missing code", "missing name", "missing coordinates",
+                       "coordinates out of range", "placeholder coordinates", "duplicate")
+        if stats[reason]
+    }
+    if rejected:
+        print("Dropped: " + ", ".join(f"{count} {reason}" for reason, count in rejected.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean airports_locations.json into airports_cleaned.json/.bin")
+    parser.add_argument("--input", default=input_file)
+    parser.add_argument("--output", default=output_file)
+    parser.add_argument("--binary", default=binary_file)
+    parser.add_argument("--workers", type=int, default=1, help="validation processes (1 = inline)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    stats = convert(args.input, args.output, args.binary, workers=args.workers, batch_size=args.batch_size)
+    print_report(stats, args.output, args.binary)
 
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(cleaned, f, indent=2)
 
-print(f"Converted {len(cleaned)} airports to {output_file}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
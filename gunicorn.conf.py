@@ -0,0 +1,11 @@
+# Gunicorn configuration, picked up automatically from the working directory.
+# The app is imported once in the master and its datasets warmed before the
+# workers fork, so every worker shares the same copy.
+preload_app = True
+
+
+def when_ready(server):
+    from FILGHT.startup import warm_up
+
+    count = warm_up()
+    server.log.info("Warmed airport datasets (%s airports) before forking workers", count)
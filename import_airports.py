@@ -1,93 +1,189 @@
 #!/usr/bin/env python
 """
 Import airports from airports_cleaned.json into Django database
+
+The input is read as a stream and diffed against the airports already in the
+database (fetched in one query). New and changed airports are upserted in
+batched transactions, so re-running the import is idempotent and only touches
+rows whose data actually changed.
+
+    python import_airports.py [--file PATH] [--batch-size N] [--dry-run]
 """
 import os
 import sys
-import json
+import time
+import argparse
 import django
-from decimal import Decimal
 
 # Setup Django
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FILGHT.settings')
 django.setup()
 
+from django.db import connection, transaction
+from FILGHT.airport_feed import bump_airport_feed_version
 from FILGHT.models import Airport
+from FILGHT.json_stream import iter_json_array
+
+DEFAULT_JSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'airports_cleaned.json')
+DEFAULT_BATCH_SIZE = 500
+# Columns compared and written by the import, in values_list order after 'code'
+IMPORT_FIELDS = ['name', 'latitude', 'longitude', 'timezone', 'country', 'city', 'type']
+
+
+def airport_values(airport_data):
+    """Map a JSON record onto IMPORT_FIELDS values, or None if it is missing required fields or malformed"""
+    try:
+        if not airport_data.get('code') or not airport_data.get('name'):
+            return None
+        location = airport_data.get('location', {})
+        return (
+            airport_data['name'],
+            float(airport_data.get('latitude', 0)),
+            float(airport_data.get('longitude', 0)),
+            airport_data.get('timezone', 'UTC'),
+            location.get('country', ''),  # 'place' is used as country
+            location.get('city', ''),     # 'city' is used as city
+            airport_data.get('type', ''),
+        )
+    except (TypeError, ValueError, AttributeError):
+        # e.g. a non-numeric or null coordinate, or a record or location that is not an object
+        return None
+
+
+def diff_airports(records, existing):
+    """Yield ('create' | 'update' | 'skip' | 'invalid', code, old values, new values) per record"""
+    seen = {}
+    for airport_data in records:
+        values = airport_values(airport_data)
+        if values is None:
+            code = airport_data.get('code', 'Unknown') if isinstance(airport_data, dict) else 'Unknown'
+            yield 'invalid', code, None, None
+            continue
+        code = airport_data['code']
+        # Duplicates in the input: the last record wins, as it would with repeated saves
+        old = seen.get(code, existing.get(code))
+        seen[code] = values
+        if old is None:
+            yield 'create', code, None, values
+        elif old != values:
+            yield 'update', code, old, values
+        else:
+            yield 'skip', code, old, values
+
+
+def apply_batch(batch):
+    """Upsert one batch of (code, values) pairs inside a single transaction"""
+    airports = [Airport(code=code, **dict(zip(IMPORT_FIELDS, values))) for code, values in batch]
+    with transaction.atomic():
+        if connection.features.supports_update_conflicts_with_target:
+            Airport.objects.bulk_create(
+                airports, update_conflicts=True, unique_fields=['code'], update_fields=IMPORT_FIELDS
+            )
+        else:
+            codes = [airport.code for airport in airports]
+            ids = dict(Airport.objects.filter(code__in=codes).values_list('code', 'id'))
+            to_update = [airport for airport in airports if airport.code in ids]
+            for airport in to_update:
+                airport.id = ids[airport.code]
+            Airport.objects.bulk_update(to_update, IMPORT_FIELDS)
+            Airport.objects.bulk_create([airport for airport in airports if airport.code not in ids])
+
+
+def format_change(code, old, new):
+    changes = [
+        f"{field}: {old_value!r} -> {new_value!r}"
+        for field, old_value, new_value in zip(IMPORT_FIELDS, old, new)
+        if old_value != new_value
+    ]
+    return f"  ~ {code}: " + ", ".join(changes)
 
-def import_airports_from_json():
+
+def import_airports_from_json(json_path=DEFAULT_JSON_PATH, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, report_limit=20):
     """Import airports from airports_cleaned.json"""
-    json_path = os.path.join(os.path.dirname(__file__), 'airports_cleaned.json')
-    
     print(f"Loading airports from: {json_path}")
-    
+    start = time.perf_counter()
+
+    existing = {
+        row[0]: tuple(row[1:])
+        for row in Airport.objects.values_list('code', *IMPORT_FIELDS)
+    }
+    print(f"Found {len(existing)} airports in database")
+
+    counts = {'create': 0, 'update': 0, 'skip': 0, 'invalid': 0}
+    report = []
+    batch = []
+    batch_codes = set()
     try:
         with open(json_path, 'r', encoding='utf-8') as f:
-            airports_data = json.load(f)
-        
-        print(f"Found {len(airports_data)} airports in JSON file")
-        
-        airports_created = 0
-        airports_skipped = 0
-        
-        for airport_data in airports_data:
-            try:
-                # Defensive: skip if required fields are missing
-                if not airport_data.get('code') or not airport_data.get('name'):
-                    airports_skipped += 1
+            for action, code, old, new in diff_airports(iter_json_array(f), existing):
+                counts[action] += 1
+                if action == 'invalid':
+                    print(f"Skipping airport {code}: missing or malformed fields")
                     continue
-                
-                location = airport_data.get('location', {})
-                
-                # Check if airport already exists
-                existing_airport = Airport.objects.filter(code=airport_data['code']).first()
-                
-                if existing_airport:
-                    airports_skipped += 1
+                if action == 'skip':
                     continue
-                
-                # Map 'country' to 'place' and 'city' to 'city' for template compatibility
-                airport = Airport.objects.create(
-                    code=airport_data['code'],
-                    name=airport_data['name'],
-                    latitude=Decimal(str(airport_data.get('latitude', 0))),
-                    longitude=Decimal(str(airport_data.get('longitude', 0))),
-                    timezone=airport_data.get('timezone', 'UTC'),
-                    country=location.get('country', ''),  # 'place' is used as country
-                    city=location.get('city', ''),      # 'city' is used as city
-                    type=airport_data.get('type', ''),
-                    # elevation = airport_data.get('elevation'),
-                )
-                
-                airports_created += 1
-                
-                if airports_created % 100 == 0:
-                    print(f"Created {airports_created} airports...")
-                    
-            except Exception as e:
-                print(f"Error creating airport {airport_data.get('code', 'Unknown')}: {e}")
-                continue
-        
-        print(f"\nImport completed!")
-        print(f"Airports created: {airports_created}")
-        print(f"Airports skipped (already exist): {airports_skipped}")
-        print(f"Total airports in database: {Airport.objects.count()}")
-        
+                if dry_run:
+                    if len(report) < report_limit:
+                        report.append(f"  + {code}: {new[0]}" if action == 'create' else format_change(code, old, new))
+                    continue
+                if code in batch_codes:
+                    # One upsert statement cannot touch the same row twice
+                    apply_batch(batch)
+                    batch, batch_codes = [], set()
+                batch.append((code, new))
+                batch_codes.add(code)
+                if len(batch) >= batch_size:
+                    apply_batch(batch)
+                    batch, batch_codes = [], set()
+        if batch:
+            apply_batch(batch)
     except FileNotFoundError:
         print(f"Error: File not found at {json_path}")
-    except Exception as e:
+        return counts
+    except ValueError as e:
         print(f"Error loading JSON file: {e}")
+        return counts
+    finally:
+        # Upserts send no signals; batches written before an error count too
+        if not dry_run and (counts['create'] or counts['update']):
+            bump_airport_feed_version()
+
+    elapsed = time.perf_counter() - start
+    if dry_run:
+        print("\nDry run - no changes written")
+        for line in report:
+            print(line)
+        hidden = counts['create'] + counts['update'] - len(report)
+        if hidden > 0:
+            print(f"  ... and {hidden} more")
+    else:
+        print(f"\nImport completed!")
+    print(f"Airports created: {counts['create']}")
+    print(f"Airports updated: {counts['update']}")
+    print(f"Airports unchanged: {counts['skip']}")
+    print(f"Airports skipped (invalid): {counts['invalid']}")
+    print(f"Total airports in database: {Airport.objects.count()}")
+    print(f"Finished in {elapsed:.2f}s")
+    return counts
+
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Import airports from airports_cleaned.json")
+    parser.add_argument('--file', default=DEFAULT_JSON_PATH, help="JSON array of cleaned airports")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="report the diff without writing")
+    args = parser.parse_args()
+
     print("Importing airports from airports_cleaned.json...")
     print("=" * 50)
-    
-    import_airports_from_json()
-    
+
+    import_airports_from_json(args.file, batch_size=args.batch_size, dry_run=args.dry_run)
+
     print("\n" + "=" * 50)
     print("Airport import completed!")
     print("You can now use these airports in your flight search!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
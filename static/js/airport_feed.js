@@ -0,0 +1,67 @@
+// airport_feed.js
+// Decodes the columnar airport feed served by /api/airports/feed/
+// The feed URL carries the dataset version, so the browser cache serves repeat loads
+
+function decodeAirportFeed(buffer) {
+    var view = new DataView(buffer);
+    var magic = String.fromCharCode(
+        view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+    );
+    if (magic !== 'APF1') {
+        throw new Error('Unsupported airport feed format');
+    }
+    var count = view.getUint32(4, true);
+    var offset = 12;
+
+    var lat = new Float32Array(buffer, offset, count);
+    offset += count * 4;
+    var lon = new Float32Array(buffer, offset, count);
+    offset += count * 4;
+    var ids = new Uint32Array(buffer, offset, count);
+    offset += count * 4;
+    var countryIdx = new Uint16Array(buffer, offset, count);
+    offset += count * 2;
+    var typeIdx = new Uint8Array(buffer, offset, count);
+    offset += count;
+    offset += (4 - (offset % 4)) % 4;
+
+    var decoder = new TextDecoder('utf-8');
+    function readStrings() {
+        var length = view.getUint32(offset, true);
+        offset += 4;
+        var text = decoder.decode(new Uint8Array(buffer, offset, length));
+        offset += length;
+        return text.split('\0');
+    }
+    var codes = readStrings();
+    var names = readStrings();
+    var cities = readStrings();
+    var countries = readStrings();
+    var types = readStrings();
+
+    var airports = new Array(count);
+    for (var i = 0; i < count; i++) {
+        airports[i] = {
+            id: ids[i],
+            code: codes[i],
+            name: names[i],
+            city: cities[i],
+            country: countries[countryIdx[i]],
+            type: types[typeIdx[i]],
+            latitude: lat[i],
+            longitude: lon[i]
+        };
+    }
+    return airports;
+}
+
+function loadAirportFeed(url) {
+    return fetch(url)
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error('Airport feed request failed: ' + response.status);
+            }
+            return response.arrayBuffer();
+        })
+        .then(decodeAirportFeed);
+}
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the upstream APIs (Open-Meteo, OpenSky, the fuel API,
+Gemini, the QAOA service), for load testing without touching the real services.
+
+Requests arrive as /<upstream>/<original path>, which is what the app sends
+when started with UPSTREAM_STAND_IN_URL pointing here. In record mode they
+are forwarded to the real upstream and the responses saved as fixtures; in
+replay mode (the default) the fixtures are served back, after an injected
+latency and subject to injected errors and throttling:
+
+    python upstream_standin.py --record                      # capture fixtures
+    python upstream_standin.py --latency lognormal:0.2,0.5 --error-rate 0.05 --rate-limit 20
+    UPSTREAM_STAND_IN_URL=http://127.0.0.1:8900 python manage.py runserver
+
+Per-upstream settings can be given in a JSON profile (--profile), e.g.
+{"default": {"latency": "fixed:0.05"}, "opensky": {"rate_limit": 1, "burst": 2}}.
+GET /_stats returns request counts per upstream and status.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+UPSTREAMS = {
+    'open-meteo': 'https://api.open-meteo.com',
+    'opensky': 'https://opensky-network.org',
+    'fuel-api': 'https://despouy.ca',
+    'gemini': 'https://generativelanguage.googleapis.com',
+    'qaoa': 'http://127.0.0.1:8000',
+}
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstream')
+# Credentials are forwarded while recording but never written to fixtures
+SECRET_PARAMS = {'key', 'apikey', 'api_key', 'access_token'}
+FORWARD_HEADERS = {'accept', 'content-type', 'authorization', 'user-agent'}
+
+
+def parse_latency(spec):
+    """Sampler for 'none', 'fixed:S', 'uniform:A,B', 'exponential:MEAN' or 'lognormal:MEDIAN,SIGMA' (seconds)"""
+    name, _, args = (spec or 'none').partition(':')
+    values = [float(value) for value in args.split(',') if value]
+    if name == 'none':
+        return lambda: 0.0
+    if name == 'fixed':
+        return lambda: values[0]
+    if name == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if name == 'exponential':
+        return lambda: random.expovariate(1 / values[0])
+    if name == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class TokenBucket:
+    """``rate`` requests per second with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """(allowed, seconds until the next token)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0
+            return False, math.ceil((1 - self.tokens) / self.rate)
+
+
+class Behaviour:
+    """Latency, error and throttling settings for one upstream"""
+
+    def __init__(self, latency='none', error_rate=0.0, error_status=503, rate_limit=0, burst=None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.bucket = TokenBucket(rate_limit, burst or rate_limit) if rate_limit else None
+
+
+class Fixtures:
+    """Recorded responses on disk, one JSON file per distinct request"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.exact = {}
+        self.by_path = {}
+        self.lock = threading.Lock()
+        for upstream in os.listdir(directory) if os.path.isdir(directory) else []:
+            folder = os.path.join(directory, upstream)
+            for name in sorted(os.listdir(folder)):
+                if name.endswith('.json'):
+                    with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                        self._index(upstream, json.load(f))
+
+    @staticmethod
+    def request_key(upstream, method, path, query, body):
+        digest = hashlib.sha1(f"{upstream} {method} {path}?{query}\n".encode() + (body or b'')).hexdigest()
+        return digest[:16]
+
+    def _index(self, upstream, fixture):
+        request = fixture['request']
+        self.exact[fixture['key']] = fixture
+        self.by_path.setdefault((upstream, request['method'], request['path']), []).append(fixture)
+
+    def find(self, upstream, method, path, query, body):
+        """The fixture recorded for this exact request, else any recorded for the same path"""
+        fixture = self.exact.get(self.request_key(upstream, method, path, query, body))
+        if fixture is None:
+            candidates = self.by_path.get((upstream, method, path))
+            fixture = random.choice(candidates) if candidates else None
+        return fixture
+
+    def save(self, upstream, method, path, query, body, status, content_type, payload):
+        key = self.request_key(upstream, method, path, query, body)
+        fixture = {
+            'key': key,
+            'request': {'method': method, 'path': path, 'query': query},
+            'status': status,
+            'content_type': content_type,
+            'body': payload.decode('utf-8', 'replace'),
+        }
+        folder = os.path.join(self.directory, upstream)
+        os.makedirs(folder, exist_ok=True)
+        with self.lock:
+            with open(os.path.join(folder, f"{key}.json"), 'w', encoding='utf-8') as f:
+                json.dump(fixture, f, indent=2)
+            self._index(upstream, fixture)
+
+
+def public_query(query):
+    """Query string without credentials, in a stable order"""
+    return urlencode(sorted((name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+                            if name.lower() not in SECRET_PARAMS))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'UpstreamStandIn/1.0'
+
+    def do_GET(self):
+        self.handle_upstream('GET')
+
+    def do_POST(self):
+        self.handle_upstream('POST')
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, payload, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def handle_upstream(self, method):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path == '/_stats':
+            stats = {f"{upstream} {status}": count for (upstream, status), count in sorted(server.stats.items())}
+            return self.send_body(200, json.dumps(stats).encode())
+        upstream, _, rest = parts.path.lstrip('/').partition('/')
+        path = '/' + rest
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)) or None
+        if upstream not in UPSTREAMS:
+            return self.reply(upstream, 404, {'error': f"Unknown upstream '{upstream}'"})
+
+        behaviour = server.behaviours[upstream]
+        if behaviour.bucket is not None:
+            allowed, retry_after = behaviour.bucket.take()
+            if not allowed:
+                return self.reply(upstream, 429, {'error': 'Too many requests'}, headers={
+                    'Retry-After': str(retry_after), 'X-Rate-Limit-Retry-After-Seconds': str(retry_after),
+                })
+        time.sleep(max(0.0, behaviour.latency()))
+        if behaviour.error_rate and random.random() < behaviour.error_rate:
+            return self.reply(upstream, behaviour.error_status, {'error': 'Injected upstream failure'})
+
+        query = public_query(parts.query)
+        if server.record:
+            return self.record(upstream, method, path, parts.query, query, body)
+        fixture = server.fixtures.find(upstream, method, path, query, body)
+        if fixture is None:
+            return self.reply(upstream, 502, {'error': f"No recorded response for {method} {upstream}{path}"})
+        server.count(upstream, fixture['status'])
+        self.send_body(fixture['status'], fixture['body'].encode('utf-8'), fixture['content_type'])
+
+    def record(self, upstream, method, path, raw_query, query, body):
+        headers = {name: value for name, value in self.headers.items() if name.lower() in FORWARD_HEADERS}
+        url = UPSTREAMS[upstream] + path + (f"?{raw_query}" if raw_query else '')
+        try:
+            response = requests.request(method, url, data=body, headers=headers, timeout=60)
+        except requests.RequestException as e:
+            return self.reply(upstream, 502, {'error': f"Recording failed: {e}"})
+        content_type = response.headers.get('Content-Type', 'application/json')
+        self.server.fixtures.save(upstream, method, path, query, body, response.status_code,
+                                  content_type, response.content)
+        self.server.count(upstream, response.status_code)
+        self.send_body(response.status_code, response.content, content_type)
+
+    def reply(self, upstream, status, data, headers=None):
+        self.server.count(upstream, status)
+        self.send_body(status, json.dumps(data).encode(), headers=headers)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops connections under load
+
+    def __init__(self, address, fixtures, behaviours, record=False, quiet=False):
+        super().__init__(address, StandInHandler)
+        self.fixtures = fixtures
+        self.behaviours = behaviours
+        self.record = record
+        self.quiet = quiet
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    def count(self, upstream, status):
+        with self.stats_lock:
+            self.stats[(upstream, status)] += 1
+
+
+def load_behaviours(args):
+    defaults = {
+        'latency': args.latency, 'error_rate': args.error_rate,
+        'error_status': args.error_status, 'rate_limit': args.rate_limit,
+    }
+    profile = {}
+    if args.profile:
+        with open(args.profile, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    defaults.update(profile.get('default', {}))
+    # One Behaviour, and so one rate-limit bucket, per upstream
+    return {upstream: Behaviour(**{**defaults, **profile.get(upstream, {})}) for upstream in UPSTREAMS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the upstream APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument('--record', action='store_true', help="forward to the real upstreams and save responses")
+    parser.add_argument('--profile', help="JSON file with per-upstream behaviour")
+    parser.add_argument('--latency', default='none', help="e.g. fixed:0.1, uniform:0.05,0.3, lognormal:0.2,0.5")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--rate-limit', type=float, default=0, help="requests per second per upstream (0 = off)")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), Fixtures(args.fixtures), load_behaviours(args),
+                           record=args.record, quiet=args.quiet)
+    mode = "Recording into" if args.record else "Replaying from"
+    print(f"{mode} {args.fixtures} on http://{args.host}:{args.port}")
+    print(f"Start the app with UPSTREAM_STAND_IN_URL=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for (upstream, status), count in sorted(server.stats.items()):
+            print(f"{upstream:12} {status}: {count}")
+
+
+if __name__ == '__main__':
+    main()